@@ -15,9 +15,9 @@ class PersonalizationTab(BoxLayout):
         super().__init__(**kwargs)
         self.color_settings = {}
 
-        # 延迟添加测试按钮，确保界面已加载
+        # 下一帧添加测试按钮，确保界面已加载
         from kivy.clock import Clock
-        Clock.schedule_once(self.add_test_buttons, 0.5)
+        Clock.schedule_once(self.add_test_buttons)
 
     def add_test_buttons(self, dt):
         """添加测试主题切换的按钮"""
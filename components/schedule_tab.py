@@ -1,11 +1,19 @@
 from kivy.uix.boxlayout import BoxLayout
-from kivy.properties import ObjectProperty
+from kivy.properties import ObjectProperty, StringProperty
 from kivy.uix.label import Label
 from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle
 from kivy.utils import get_color_from_hex
 import datetime
 import json
+import time
+import uuid
+
+from utils.activity_archive import ActivityArchive, ActivityTimeline, compact_activities, day_bounds
+from utils.event_bus import StayEnded
+from utils.records import Activity
+from utils.reminders import ReminderScheduler
+from utils.watchdog import measure
 
 
 class ScheduleTab(BoxLayout):
@@ -13,37 +21,90 @@ class ScheduleTab(BoxLayout):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.activities = []
+        self.activities = ActivityTimeline()  # 按开始时间排序
+        self.rollups = {}  # 已归档日期的每日汇总
+        self.undated_activities = []  # 没有有效日期的旧记录，原样保留，不显示也不归档
+        self.archive = ActivityArchive()
         self.current_activity = None
         self.activity_start_time = None
 
         # 初始化活动数据
         self.load_activities()
 
-        # 延迟更新显示，确保界面已加载
-        Clock.schedule_once(self.update_alarm_display, 0.1)
-        Clock.schedule_once(self.update_activities_display, 0.2)
+        # 行程提醒（只有最近一条提醒持有定时器）
+        self.reminders = ReminderScheduler(on_fire=self.on_reminder)
+        self.reminders.load()
+
+        # 下一帧更新显示（kv规则应用后ids才可用）
+        Clock.schedule_once(self.update_alarm_display)
+        Clock.schedule_once(self.show_initial_activities)
+        Clock.schedule_once(self.check_reminders)
 
     def load_activities(self):
         """加载活动数据"""
         try:
             with open('activities.json', 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                self.activities = data.get('activities', [])
+                # 旧格式的HH:MM记录在这里转换为时间戳，下次保存时写回新格式
+                activities, self.undated_activities = [], []
+                for item in data.get('activities', []):
+                    try:
+                        activities.append(Activity.from_dict(item))
+                    except ValueError:
+                        self.undated_activities.append(item)
+                self.activities = ActivityTimeline(activities)
+                self.rollups = data.get('rollups', {})
+            if self.undated_activities:
+                print(f"Kept {len(self.undated_activities)} legacy activities without a valid date as-is")
+            # 旧记录补充id，供备注关联；立即保存，否则重启后id会变，备注就找不到活动了
+            missing = [a for a in self.activities if not a.id]
+            for activity in missing:
+                activity.id = uuid.uuid4().hex
+            if missing:
+                self.save_activities()
         except FileNotFoundError:
-            self.activities = []
+            self.activities = ActivityTimeline()
         except Exception as e:
             print(f"fail: {e}")
-            self.activities = []
+            self.activities = ActivityTimeline()
 
     def save_activities(self):
         """保存活动数据"""
         try:
             with open('activities.json', 'w', encoding='utf-8') as f:
-                json.dump({'activities': self.activities}, f, ensure_ascii=False, indent=2)
+                activities = [a.to_dict() for a in self.activities] + self.undated_activities
+                json.dump({'activities': activities, 'rollups': self.rollups},
+                          f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"fail: {e}")
 
+    def compact_history(self, horizon_days=30):
+        """把超过保留天数的活动归档为按月压缩文件，活动文件只保留最近的记录"""
+        try:
+            old_rollups = self.rollups
+            recent, self.rollups, archived = compact_activities(
+                self.activities, self.rollups, self.archive, horizon_days
+            )
+            if archived:
+                self.activities = ActivityTimeline(recent)
+                self.save_activities()
+                for date, summary in self.rollups.items():
+                    if date not in old_rollups or old_rollups[date] != summary:
+                        self.record_change('rollup', date, date, summary)
+                print(f"Archived {archived} activities older than {horizon_days} days")
+        except Exception as e:
+            print(f"Failed to compact activities: {e}")
+
+    def query_activities(self, start_date, end_date):
+        """查询日期范围内的活动（包括已归档的月份）"""
+        result = list(self.archive.query(start_date, end_date))
+        result.extend(self.activities.on_dates(start_date, end_date))
+        return result
+
+    def activities_between(self, start_ts, end_ts):
+        """与时间段重叠的活动（只查热数据）"""
+        return self.activities.between(start_ts, end_ts)
+
     def update_alarm_display(self, dt=None):
         """更新闹钟显示"""
         if hasattr(self, 'ids') and hasattr(self, 'app'):
@@ -56,22 +117,53 @@ class ScheduleTab(BoxLayout):
             except Exception as e:
                 print(f"fail: {e}")
 
+    def today_activities(self):
+        """今天的活动（按开始时间排序）
+
+        一天从起床算到次日起床，窗口由闹钟时间表预先计算；熬夜到凌晨的活动算前一天。
+        """
+        today = datetime.date.today()
+        get_day_window = getattr(self.app, 'get_day_window', None)
+        window = get_day_window(today) if get_day_window else day_bounds(today, today)
+        return self.activities.between(*window)
+
+    def snapshot_rows(self, count=10):
+        """今天显示的活动行和备注文字（写入启动快照）"""
+        return [{'activity': a.to_dict(), 'notes': [n.text for n in self.get_activity_notes(a)]}
+                for a in reversed(self.today_activities()[-count:])]
+
+    def show_initial_activities(self, dt=None):
+        """第一帧：有启动快照时直接显示快照中的活动行，下一帧再换成实时数据（含缩略图）"""
+        rows = (getattr(self.app, 'startup_state', None) or {}).get('activity_rows')
+        activity_container = self.ids.get('activity_container') if hasattr(self, 'ids') else None
+        if not rows or not activity_container:
+            self.update_activities_display()
+            return
+        try:
+            activity_container.clear_widgets()
+            for row in rows:
+                self.add_activity_to_display(Activity.from_dict(row['activity']))
+                for text in row.get('notes', []):
+                    activity_container.add_widget(NoteItem(note_text=text))
+        except Exception as e:
+            print(f"fail: {e}")
+        Clock.schedule_once(self.update_activities_display)
+
     def update_activities_display(self, dt=None):
         """更新活动显示"""
         if hasattr(self, 'ids'):
             try:
                 activity_container = self.ids.get('activity_container')
                 if activity_container:
-                    # 清空现有活动显示
-                    activity_container.clear_widgets()
+                    with measure('ScheduleTab.update_activities_display'):
+                        # 清空现有活动显示
+                        activity_container.clear_widgets()
 
-                    # 添加今天的活动记录（按时间倒序）
-                    today = datetime.datetime.now().strftime('%Y-%m-%d')
-                    today_activities = [a for a in self.activities if a.get('date', '') == today]
-                    today_activities.sort(key=lambda x: x.get('start_time', ''), reverse=True)
-
-                    for activity in today_activities[:10]:  # 只显示最近10条
-                        self.add_activity_to_display(activity)
+                        # 添加今天的活动记录（已按开始时间排序，倒序取最近10条）
+                        for activity in reversed(self.today_activities()[-10:]):
+                            self.add_activity_to_display(activity)
+                            for note in self.get_activity_notes(activity):
+                                self.add_note_to_display(note)
             except Exception as e:
                 print(f"更新活动显示失败: {e}")
 
@@ -81,32 +173,54 @@ class ScheduleTab(BoxLayout):
             try:
                 activity_container = self.ids.get('activity_container')
                 if activity_container:
-                    # 创建活动项
-                    activity_item = ActivityItem(
-                        location=activity.get('location', 'unknown'),
-                        event_type=activity.get('event_type', 'unknown'),
-                        start_time=activity.get('start_time', '--:--'),
-                        end_time=activity.get('end_time', '--:--'),
-                        duration=activity.get('duration', 0)
-                    )
+                    # 创建活动项（直接引用记录，不复制字段）
+                    activity_item = ActivityItem(record=activity)
                     activity_container.add_widget(activity_item)
             except Exception as e:
                 print(f"fail: {e}")
 
-    def record_activity(self, location, event_type, duration):
-        """记录活动"""
+    def get_activity_notes(self, activity):
+        """获取某条活动的备注"""
+        notes_store = getattr(self.app, 'notes_store', None)
+        if not notes_store or not activity.id:
+            return []
+        return notes_store.for_activity(activity.id)
+
+    def add_note_to_display(self, note):
+        """添加备注到显示（图片只加载缩略图）"""
+        if hasattr(self, 'ids'):
+            try:
+                activity_container = self.ids.get('activity_container')
+                if activity_container:
+                    note_item = NoteItem(note_text=note.text)
+                    activity_container.add_widget(note_item)
+
+                    # 缩略图由后台线程生成，完成后再显示
+                    store = getattr(self.app, 'attachment_store', None)
+                    if note.image and store:
+                        store.get_thumbnail(
+                            note.image,
+                            lambda path: setattr(note_item, 'thumbnail', path or '')
+                        )
+            except Exception as e:
+                print(f"fail: {e}")
+
+    def record_activity(self, location, event_type, duration, end_ts=None):
+        """记录活动（end_ts默认为现在）"""
         try:
-            activity_record = {
-                'location': location,
-                'event_type': event_type,
-                'start_time': (datetime.datetime.now() - datetime.timedelta(seconds=duration)).strftime('%H:%M'),
-                'end_time': datetime.datetime.now().strftime('%H:%M'),
-                'duration': duration,
-                'date': datetime.datetime.now().strftime('%Y-%m-%d')
-            }
-
-            self.activities.append(activity_record)
+            end_ts = end_ts if end_ts is not None else time.time()
+            activity_record = Activity(
+                id=uuid.uuid4().hex,
+                location=location,
+                event_type=event_type,
+                start_ts=end_ts - duration,
+                end_ts=end_ts
+            )
+
+            self.activities.insert(activity_record)
             self.save_activities()
+            self.record_change('activity', activity_record.id, activity_record.date,
+                               activity_record.to_dict())
 
             # 更新显示
             self.update_activities_display()
@@ -116,9 +230,84 @@ class ScheduleTab(BoxLayout):
         except Exception as e:
             print(f"fail: {e}")
 
+    def subscribe_events(self, events):
+        """订阅位置事件：停留结束时记录活动"""
+        events.subscribe(StayEnded, self.on_stays_ended, batch=True)
+
+    def on_stays_ended(self, events):
+        """记录一帧内结束的预设地点停留（只保存一次）"""
+        try:
+            recorded = 0
+            for event in events:
+                if event.location is None:
+                    continue  # 地点以外的停留只显示在跟踪日志中
+                activity_record = Activity(uuid.uuid4().hex, event.name, event.event_type,
+                                           event.start_ts, event.end_ts)
+                self.activities.insert(activity_record)
+                self.record_change('activity', activity_record.id, activity_record.date,
+                                   activity_record.to_dict())
+                recorded += 1
+                print(f"记录活动: at{event.name} {event.event_type} for{activity_record.duration} seconds")
+            if recorded:
+                self.save_activities()
+                self.update_activities_display()
+        except Exception as e:
+            print(f"fail: {e}")
+
+    def add_reminder(self, title, time_text, repeat='none', note=''):
+        """添加提醒，time_text为"HH:MM"（今天已过则从明天开始）"""
+        try:
+            hour, minute = map(int, time_text.split(':'))
+            now = datetime.datetime.now()
+            due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if due <= now:
+                due += datetime.timedelta(days=1)
+            reminder = self.reminders.add(title, due.timestamp(), repeat, note)
+            self.update_reminder_display()
+            return reminder
+        except Exception as e:
+            print(f"Failed to add reminder: {e}")
+
+    def check_reminders(self, dt=None):
+        """补发错过的提醒并重新设置定时器（启动和恢复运行时调用）"""
+        self.reminders.check()
+        self.update_reminder_display()
+
+    def on_reminder(self, reminder, missed):
+        """提醒触发"""
+        message = f"{'Missed: ' if missed else ''}{reminder.title}"
+        print(f"Reminder: {message}")
+        try:
+            from plyer import notification
+            notification.notify(title='DailyTracker', message=message)
+        except Exception as e:
+            print(f"Notification unavailable: {e}")
+        self.update_reminder_display()
+
+    def update_reminder_display(self, dt=None):
+        """显示下一条提醒"""
+        if hasattr(self, 'ids'):
+            label = self.ids.get('next_reminder_label')
+            if label:
+                reminder = self.reminders.next_due()
+                if reminder:
+                    due = datetime.datetime.fromtimestamp(reminder.due)
+                    label.text = f"{due.strftime('%m-%d %H:%M')}  {reminder.title}"
+                else:
+                    label.text = 'No reminders'
+
+    def record_change(self, kind, item_id, day, data=None, op='put'):
+        """把改动记录到同步队列"""
+        sync_client = getattr(self.app, 'sync_client', None)
+        if sync_client is not None:
+            sync_client.record(kind, item_id, day, data, op)
+
     def clear_activities(self):
         """清空活动"""
-        self.activities = []
+        for activity in self.activities:
+            self.record_change('activity', activity.id, activity.date, op='delete')
+        self.activities = ActivityTimeline()
+        self.undated_activities = []
         self.save_activities()
         self.update_activities_display()
 
@@ -145,11 +334,14 @@ class ScheduleTab(BoxLayout):
             print(f"ScheduleTab theme update failed: {e}")
 
 class ActivityItem(BoxLayout):
-    def __init__(self, location="", event_type="", start_time="", end_time="", duration=0, **kwargs):
-        super().__init__(**kwargs)
-        self.location = location
-        self.event_type = event_type
-        self.start_time = start_time
+    record = ObjectProperty(None)  # 活动记录，通过 ActivityItem(record=...) 传入，kv规则应用前即可读取
+
 
-        self.end_time = end_time
-        self.duration = duration
\ No newline at end of file
+class NoteItem(BoxLayout):
+    note_text = StringProperty("")
+    thumbnail = StringProperty("")
+
+    def __init__(self, note_text="", thumbnail="", **kwargs):
+        super().__init__(**kwargs)
+        self.note_text = note_text
+        self.thumbnail = thumbnail
\ No newline at end of file
@@ -2,11 +2,13 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.properties import StringProperty, ObjectProperty
 from kivy.clock import Clock
-from kivy.graphics import Color, Rectangle
+from kivy.graphics import Color, Line, Rectangle
 from kivy.utils import get_color_from_hex
 import datetime
 import math
 
+from utils.event_bus import RunEnded, RunStarted, SpeedChanged, StayEnded
+
 
 class LocationLogEntry(BoxLayout):
     location_text = StringProperty("")
@@ -31,9 +33,13 @@ class TrackingTab(BoxLayout):
         self.current_location = None
         self.location_start_time = None
         self.speed_threshold = 5.0
+        self.heatmap = None  # 停留时间网格（行0为最南）
+
+        # 速度曲线最多每5秒重绘一次
+        self.refresh_speed_chart = Clock.create_trigger(self.render_speed_chart, 5)
 
-        # 延迟初始化
-        Clock.schedule_once(self.initialize_display, 0.1)
+        # 下一帧初始化（kv规则应用后ids才可用）
+        Clock.schedule_once(self.initialize_display)
 
     def initialize_display(self, dt=None):
         """初始化显示"""
@@ -45,15 +51,29 @@ class TrackingTab(BoxLayout):
                     speed_slider.value = self.app.user_data.get('speed_threshold', 5.0)
                     self.speed_threshold = speed_slider.value
 
-                # 更新速度显示
-                self.update_current_speed(0.0)
+                # 有启动快照时直接显示上次的速度和日志，否则显示示例
+                tracking = (getattr(self.app, 'startup_state', None) or {}).get('tracking') or {}
+                self.update_current_speed(tracking.get('speed', 0.0))
+                self.render_speed_chart()
+                self.show_route_map()
 
-                # 添加一些示例日志
-                self.add_sample_logs()
+                if tracking.get('logs'):
+                    for texts in tracking['logs']:
+                        self.add_log_entry(LocationLogEntry(*texts))
+                else:
+                    # 添加一些示例日志
+                    self.add_sample_logs()
 
             except Exception as e:
                 print(f"fail: {e}")
 
+    def subscribe_events(self, events):
+        """订阅位置事件"""
+        events.subscribe(SpeedChanged, lambda e: self.update_current_speed(e.speed))
+        events.subscribe(RunStarted, lambda e: self.add_running_start_log(e.speed))
+        events.subscribe(RunEnded, lambda e: self.add_running_end_log(e.duration, e.average_speed))
+        events.subscribe(StayEnded, lambda e: self.add_location_log(e.name, e.duration))
+
     def update_current_speed(self, speed):
         """更新当前速度显示"""
         self.current_speed = speed
@@ -67,9 +87,57 @@ class TrackingTab(BoxLayout):
                         speed_label.color = (0.8, 0.2, 0.2, 1)  # 红色
                     else:
                         speed_label.color = (0.2, 0.8, 0.2, 1)  # 绿色
+                self.refresh_speed_chart()
             except Exception as e:
                 print(f"fail: {e}")
 
+    def show_route_map(self):
+        """显示地点地图（瓦片通过磁盘缓存加载，没有mapview时不显示）"""
+        container = self.ids.get('route_map') if hasattr(self, 'ids') else None
+        fetcher = getattr(self.app, 'tile_fetcher', None)
+        if container is None or fetcher is None or container.children:
+            return
+        try:
+            from utils.map_source import create_map_view
+            container.add_widget(create_map_view(fetcher, self.app.user_data.get('locations', {})))
+        except Exception as e:
+            print(f"Route map unavailable: {e}")
+            container.height = 0
+
+    def render_speed_chart(self, dt=None, date=None):
+        """绘制某天（默认今天）的速度曲线和速度阈值线"""
+        if not hasattr(self, 'ids') or not self.app:
+            return
+        chart = self.ids.get('speed_chart')
+        series = getattr(self.app, 'speed_series', None)
+        if chart is None or series is None or chart.width < 10:
+            return
+        try:
+            date = date or datetime.date.today()
+            width = max(3, int(chart.width) // 2)  # 每2像素一个点
+            points = series.day_points(date, width)
+
+            day_start = datetime.datetime.combine(date, datetime.time()).timestamp()
+            top = max([v for _, v in points] + [self.speed_threshold]) * 1.2 or 1.0
+            scale_x = chart.width / 86400
+            scale_y = chart.height / top
+
+            chart.canvas.clear()
+            with chart.canvas:
+                # 速度阈值线
+                Color(0.8, 0.2, 0.2, 1)
+                threshold_y = chart.y + self.speed_threshold * scale_y
+                Line(points=[chart.x, threshold_y, chart.right, threshold_y], dash_length=4, dash_offset=4)
+
+                if len(points) >= 2:
+                    Color(0.2, 0.6, 0.8, 1)
+                    line = []
+                    for t, v in points:
+                        line.extend((chart.x + (t - day_start) * scale_x, chart.y + v * scale_y))
+                    Line(points=line, width=1.1)
+        except Exception as e:
+            print(f"Speed chart render failed: {e}")
+
     def add_running_start_log(self, speed):
         """添加跑步开始日志"""
         try:
@@ -130,6 +198,15 @@ class TrackingTab(BoxLayout):
             except Exception as e:
                 print(f"fail: {e}")
 
+    def snapshot_state(self, count=10):
+        """当前速度和最近的日志（写入启动快照，日志按时间正序）"""
+        logs = []
+        location_logs = self.ids.get('location_logs') if hasattr(self, 'ids') else None
+        if location_logs:
+            for entry in reversed(location_logs.children[:count]):
+                logs.append([entry.location_text, entry.duration_text, entry.activity_text])
+        return {'speed': self.current_speed, 'logs': logs}
+
     def add_sample_logs(self):
         """添加示例日志（用于测试）"""
         try:
@@ -147,6 +224,33 @@ class TrackingTab(BoxLayout):
         except Exception as e:
             print(f"fail: {e}")
 
+    def render_heatmap(self, grid=None):
+        """绘制停留时间热力图（对数缩放，只画有数据的格子）"""
+        if grid is not None:
+            self.heatmap = grid
+        if self.heatmap is None or not hasattr(self, 'ids'):
+            return
+        view = self.ids.get('heatmap_view')
+        if view is None:
+            return
+        try:
+            import numpy as np
+            grid = self.heatmap
+            rows, cols = grid.shape
+            levels = np.log1p(grid / 60.0)  # 按分钟取对数，短暂经过的地方也能看到
+            peak = levels.max()
+            view.canvas.clear()
+            if peak <= 0:
+                return
+            cell_w, cell_h = view.width / cols, view.height / rows
+            with view.canvas:
+                for row, col in zip(*np.nonzero(levels)):
+                    Color(0.9, 0.2, 0.1, 0.15 + 0.85 * float(levels[row, col] / peak))
+                    Rectangle(pos=(view.x + col * cell_w, view.y + row * cell_h),
+                              size=(cell_w, cell_h))
+        except Exception as e:
+            print(f"Heatmap render failed: {e}")
+
     def update_theme(self, colors):
         """更新主题"""
         try:
@@ -1,8 +1,13 @@
 # main.py - Complete English Version with Component Integration
 import os
 import sys
+import asyncio
+import contextlib
 import json
 import datetime
+import time
+
+LAUNCH_TIME = time.perf_counter()  # 进程启动时间，用于统计冷启动到第一帧的耗时
 
 # ========== Import Kivy and other modules ==========
 from kivy import platform  # 检测当前平台(Android/iOS/桌面)
@@ -21,6 +26,18 @@ from kivy.uix.slider import Slider  # 滑块
 from kivy.uix.spinner import Spinner  # 下拉选择器
 from kivy.uix.popup import Popup  # 弹出窗口
 
+# ========== 主循环卡顿监控（可选） ==========
+try:
+    from utils.watchdog import StallWatchdog, measure
+except ImportError as e:
+    print(f"Watchdog unavailable: {e}")
+    StallWatchdog = None
+
+    @contextlib.contextmanager
+    def measure(name):
+        """监控不可用时不统计"""
+        yield
+
 # ========== 尝试导入组件 ==========
 try:
     # 尝试从组件模块导入各功能标签页
@@ -131,14 +148,70 @@ class DailyTracker(TabbedPanel):
         self.current_theme = 'sunny'  # 当前主题默认晴天
 
         # ========== 初始化数据文件 ==========
-        self.data_file = "user_data.json"  # 用户数据存储文件
+        self.data_file = "user_data.json"  # 旧版用户数据文件（启动时迁移为分区文件）
         self.load_user_data()  # 加载用户数据
 
+        # 启动快照：第一帧直接显示上次的主题、今天的活动和跟踪统计，新数据准备好后再替换
+        from utils.startup_snapshot import StartupSnapshot
+        self.startup_snapshot = StartupSnapshot()
+        self.startup_state = self.startup_snapshot.load()
+        self.startup_times = {}  # 启动阶段 -> 距进程启动的毫秒数
+        self.snapshot_theme = None  # 第一帧使用的快照主题
+        self.theme_applied = False
+
+        # 备注图片按内容哈希存储，列表只显示缩略图
+        try:
+            from utils.attachment_store import AttachmentStore
+            self.attachment_store = AttachmentStore()
+        except Exception as e:
+            print(f"Attachment store initialization failed: {e}")
+            self.attachment_store = None
+
+        # 按天保存的定位轨迹历史
+        from utils.track_store import TrackStore
+        self.track_store = TrackStore()
+
+        # 地图瓦片磁盘缓存（tile_url可设置为自建瓦片服务器）
+        try:
+            from utils.tile_cache import DEFAULT_TILE_URL, TileCache, TileFetcher
+            self.tile_fetcher = TileFetcher(TileCache(), self.user_data.get('tile_url') or DEFAULT_TILE_URL)
+        except Exception as e:
+            print(f"Tile cache initialization failed: {e}")
+            self.tile_fetcher = None
+
+        # 每日速度曲线（LTTB降采样，供跟踪页图表使用）
+        from utils.speed_series import SpeedSeries
+        self.speed_series = SpeedSeries(self.track_store)
+
+        # 按天预先计算的停留时间热力图（需要numpy）
+        from utils.heatmap import HeatmapStore
+        self.heatmap_store = HeatmapStore(self.track_store, self.user_data.get('locations', {}))
+
+        # 活动、备注和汇总的改动记录，设置了sync_url时在后台增量上传
+        from utils.sync_client import SyncClient
+        self.sync_client = SyncClient(self.user_data.get('sync_url'))
+
+        # 备注单独存储并建立全文索引
+        try:
+            from utils.notes_store import NotesStore
+            self.notes_store = NotesStore()
+        except Exception as e:
+            print(f"Notes store initialization failed: {e}")
+            self.notes_store = None
+
+        # 位置事件总线（每帧批量分发给标签页）
+        from utils.event_bus import EventBus
+        self.events = EventBus()
+
         # 创建标签页
         self.create_tabs()
+        self.apply_snapshot_theme()
+
+        # 旧备注要按活动字段找到活动id，需要在计划页加载活动之后迁移
+        self.migrate_legacy_notes()
 
-        # 延迟1秒启动服务（等待UI初始化完成）
-        Clock.schedule_once(self.init_services, 1)
+        # 后台服务在App.on_start中启动（见start_services）
+        self.services = None
 
     def create_tabs(self):
         """创建应用程序的标签页"""
@@ -148,6 +221,8 @@ class DailyTracker(TabbedPanel):
         else:
             self.schedule_tab = ScheduleTab()  # 使用回退实现
         self.schedule_tab.app = self  # 设置对主应用的引用
+        if hasattr(self.schedule_tab, 'subscribe_events'):
+            self.schedule_tab.subscribe_events(self.events)
         tab1 = TabbedPanelItem(text='Schedule')  # 创建标签项
         tab1.add_widget(self.schedule_tab)       # 将标签页添加到标签项
         self.add_widget(tab1)                    # 将标签项添加到主面板
@@ -158,6 +233,8 @@ class DailyTracker(TabbedPanel):
         else:
             self.tracking_tab = TrackingTab()
         self.tracking_tab.app = self
+        if hasattr(self.tracking_tab, 'subscribe_events'):
+            self.tracking_tab.subscribe_events(self.events)
         tab2 = TabbedPanelItem(text='Tracking')
         tab2.add_widget(self.tracking_tab)
         self.add_widget(tab2)
@@ -172,10 +249,43 @@ class DailyTracker(TabbedPanel):
         tab3.add_widget(self.personalization_tab)
         self.add_widget(tab3)
 
+    def start_services(self):
+        """在asyncio事件循环上启动后台服务；没有运行中的事件循环时退回同步初始化"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 直接用App.run()启动时没有事件循环
+            Clock.schedule_once(self.init_services)
+            return
+
+        from utils.services import ServiceManager
+        if self.services is None:
+            self.services = ServiceManager(self)
+        loop.create_task(self.services.start())
+
+    def stop_services(self):
+        """取消后台服务"""
+        if self.services:
+            self.services.stop()
+
+    def request_save(self):
+        """请求保存用户数据（服务运行时在后台线程写入）"""
+        if self.services:
+            self.services.request_save()
+        else:
+            self.save_user_data()
+
     def init_services(self, dt):
-        """初始化所有服务"""
+        """同步初始化所有服务（没有asyncio事件循环时使用）"""
         print("Initializing application services...")
 
+        # ========== 归档过期的活动历史 ==========
+        if hasattr(self.schedule_tab, 'compact_history'):
+            self.schedule_tab.compact_history(self.user_data.get('retention_days', 30))
+
+        # 压缩已结束日期的轨迹
+        self.track_store.archive_closed_days()
+
         # ========== 初始化天气服务 ==========
         try:
             from utils.weather_api import WeatherManager
@@ -215,18 +325,19 @@ class DailyTracker(TabbedPanel):
         try:
             # 更新UI显示
             if hasattr(self, 'schedule_tab'):
-                Clock.schedule_once(lambda dt: self.schedule_tab.update_alarm_display(), 0.5)
+                Clock.schedule_once(lambda dt: self.schedule_tab.update_alarm_display())
 
         except Exception as e:
             print(f"Desktop simulation setup failed: {e}")
 
     def load_user_data(self):
-        """加载用户数据"""
+        """加载用户数据（设置和地点立即加载，历史记录首次访问时加载）"""
+        from utils.user_store import SectionedUserData
+        self.user_data = SectionedUserData(legacy_file=self.data_file)
         try:
-            if os.path.exists(self.data_file):
-                # 从文件读取JSON数据
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.user_data = json.load(f)
+            if self.user_data.exists():
+                # 读取分区文件（旧版单文件会自动迁移）
+                self.user_data.load()
                 print("User data loaded successfully")
             else:
                 # 文件不存在则创建默认数据
@@ -237,7 +348,8 @@ class DailyTracker(TabbedPanel):
 
     def create_default_data(self):
         """创建默认用户数据"""
-        self.user_data = {
+        from utils.fix_pipeline import DEFAULT_PIPELINE
+        self.user_data.replace({
             'sleep_time': "23:00",  # 默认睡眠时间
             'wake_time': "07:00",   # 默认唤醒时间
             'locations': {  # 预设位置数据
@@ -259,29 +371,68 @@ class DailyTracker(TabbedPanel):
                 'library': {
                     'name': 'Library',
                     'events': ['Learning', 'Rest'],
-                    'coords': [31.0262, 121.4378]
+                    'coords': [31.0262, 121.4378],
+                    'radius': 15  # 自定义半径(米)，不与相距约29米的食堂重叠
                 },
                 'sports': {
                     'name': 'Sports Field',
                     'events': ['Exercise', 'Running'],
-                    'coords': [31.0268, 121.4390]
+                    'coords': [31.0268, 121.4390],
+                    # 也可以用多边形描述场地: [[lat, lon], ...]
+                    'polygon': [
+                        [31.0263, 121.4384], [31.0273, 121.4384],
+                        [31.0273, 121.4396], [31.0263, 121.4396]
+                    ]
                 }
             },
             'speed_threshold': 5.0,   # 移动速度阈值(m/s)
             'running_threshold': 3.0, # 跑步速度阈值(m/s)
             'stay_threshold': 60,     # 停留时间阈值(秒)
+            'retention_days': 30,     # 活动历史保留天数，更早的按月归档
+            'fix_pipeline': [dict(stage) for stage in DEFAULT_PIPELINE],  # 定位点预处理链，按顺序执行
             'personalization': {},    # 个性化设置
-            'notes': [],              # 笔记列表
             'activities': []          # 活动列表
-        }
+        })
         self.save_user_data()  # 保存默认数据
         print("Default user data created")
 
+    def migrate_legacy_notes(self):
+        """把旧版保存在user_data中的备注迁移到备注库"""
+        if self.notes_store is None:
+            return  # 备注库不可用时保留旧备注，下次启动再迁移
+        legacy_notes = self.user_data.pop('notes', None)
+        if legacy_notes:
+            try:
+                self.notes_store.import_legacy(legacy_notes, self.find_legacy_activity_id)
+                print(f"Migrated {len(legacy_notes)} notes to notes store")
+            except Exception as e:
+                print(f"Failed to migrate notes: {e}")
+                self.user_data['notes'] = legacy_notes
+                return
+        if legacy_notes is not None:
+            self.save_user_data()
+
+    def find_legacy_activity_id(self, activity_data):
+        """按旧版备注中的活动字段（日期、结束时间、地点、事件）查找活动id"""
+        try:
+            date = datetime.date.fromisoformat(activity_data.get('date') or '')
+        except ValueError:
+            return None
+        if not hasattr(self.schedule_tab, 'query_activities'):
+            return None
+        fields = [f for f in ('end_time', 'location', 'event_type') if f in activity_data]
+        if not fields:
+            return None
+        for activity in self.schedule_tab.query_activities(date, date):
+            if all(getattr(activity, f) == activity_data[f] for f in fields):
+                return activity.id
+        return None
+
     def save_user_data(self):
-        """保存用户数据到文件"""
+        """保存用户数据（只写入有改动的分区）"""
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.user_data, f, indent=2, ensure_ascii=False)
+            with measure('DailyTracker.save_user_data'):
+                self.user_data.save()
         except Exception as e:
             print(f"Failed to save user data: {e}")
 
@@ -289,28 +440,109 @@ class DailyTracker(TabbedPanel):
         """更新闹钟信息"""
         if hasattr(self, 'alarm_reader'):
             try:
-                # 获取所有闹钟
-                alarms = self.alarm_reader.get_alarms()
-                if alarms:
-                    # 使用最早闹钟作为唤醒时间
-                    self.user_data['wake_time'] = min(alarms)
-                    # 使用最晚闹钟作为睡眠时间
-                    self.user_data['sleep_time'] = max(alarms)
-                    self.save_user_data()  # 保存更新
-
-                    # 更新UI显示
-                    if hasattr(self, 'schedule_tab'):
-                        self.schedule_tab.update_alarm_display()
-
-                    print(f"Alarm data updated: Wake up {self.user_data['wake_time']}, Sleep {self.user_data['sleep_time']}")
+                # 按星期生成起床/睡觉时间表
+                self.apply_alarm_timeline(self.alarm_reader.get_timeline())
             except Exception as e:
                 print(f"Failed to read alarms: {e}")
 
+    def apply_alarm_timeline(self, timeline):
+        """应用闹钟时间表（只有闹钟或今天的起床/睡觉时间变化时才保存和刷新界面）"""
+        self.alarm_timeline = timeline
+
+        weekday = datetime.date.today().weekday()
+        wake_time = timeline.wake_time(weekday)
+        sleep_time = timeline.sleep_time(weekday)
+        if (timeline.fingerprint == self.user_data.get('alarm_fingerprint')
+                and wake_time == self.user_data.get('wake_time')
+                and sleep_time == self.user_data.get('sleep_time')):
+            return
+
+        self.user_data['wake_time'] = wake_time
+        self.user_data['sleep_time'] = sleep_time
+        self.user_data['alarm_timeline'] = timeline.to_dict()
+        self.user_data['alarm_fingerprint'] = timeline.fingerprint
+        self.request_save()  # 保存更新
+
+        # 更新UI显示
+        if hasattr(self, 'schedule_tab'):
+            self.schedule_tab.update_alarm_display()
+
+        print(f"Alarm data updated: Wake up {wake_time}, Sleep {sleep_time}")
+
+    def get_day_window(self, date=None):
+        """某天从起床到次日起床的时间戳范围(开始, 结束)"""
+        timeline = getattr(self, 'alarm_timeline', None)
+        if timeline is None:
+            from utils.alarm_reader import AlarmTimeline
+            saved = self.user_data.get('alarm_timeline')
+            if saved:
+                timeline = AlarmTimeline.from_dict(saved)
+            else:
+                # 没有闹钟数据时使用设置中的起床/睡觉时间
+                timeline = AlarmTimeline.from_alarms([
+                    {'time': self.user_data.get('wake_time', '07:00'), 'days': []},
+                    {'time': self.user_data.get('sleep_time', '23:00'), 'days': []},
+                ])
+            timeline.precompute_windows()
+            self.alarm_timeline = timeline
+        return timeline.day_window(date)
+
+    def apply_snapshot_theme(self):
+        """直接应用快照中的主题颜色（不闪屏）"""
+        state = self.startup_state
+        if not state or state.get('theme') not in self.theme_colors or not state.get('colors'):
+            return
+        self.current_theme = state['theme']
+        self.snapshot_theme = state['theme']
+        self.apply_final_theme(state['theme'], state['colors'], fresh=False)
+
+    def save_snapshot(self):
+        """暂停/退出时写出启动快照"""
+        try:
+            state = {
+                'theme': self.current_theme,
+                'colors': self.theme_colors[self.current_theme],
+                'activity_rows': [],
+                'tracking': {},
+                'last_startup': self.startup_times,
+            }
+            if hasattr(self.schedule_tab, 'snapshot_rows'):
+                state['activity_rows'] = self.schedule_tab.snapshot_rows()
+            if hasattr(self.tracking_tab, 'snapshot_state'):
+                state['tracking'] = self.tracking_tab.snapshot_state()
+            self.startup_snapshot.save(state)
+        except Exception as e:
+            print(f"Failed to save startup snapshot: {e}")
+
+    def mark_startup(self, stage):
+        """记录启动阶段耗时，第一帧和天气主题都完成后输出"""
+        if stage in self.startup_times:
+            return
+        self.startup_times[stage] = (time.perf_counter() - LAUNCH_TIME) * 1000
+        if 'first_frame' in self.startup_times and 'fresh_theme' in self.startup_times:
+            source = 'from snapshot' if self.startup_state else 'no snapshot'
+            first = self.startup_times['first_frame']
+            fresh = self.startup_times['fresh_theme']
+            # 快照主题与天气主题一致时第一帧就是正确的画面，否则要等天气主题应用后
+            correct = first if self.snapshot_theme == self.current_theme else max(first, fresh)
+            self.startup_times['first_correct_frame'] = correct
+            print(f"Startup: first correct frame {correct:.0f} ms ({source}), "
+                  f"first frame {first:.0f} ms, fresh theme {fresh:.0f} ms, "
+                  f"snapshot read {self.startup_snapshot.load_time * 1000:.1f} ms")
+
+    def mark_first_frame(self, dt=None):
+        self.mark_startup('first_frame')
+
     def update_theme(self, weather_type):
         """应用主题颜色（带视觉反馈效果）"""
         try:
             print(f"=== Applying theme: {weather_type} ===")
 
+            if self.theme_applied and weather_type == self.current_theme:
+                # 快照已经显示了同一个主题，不再闪屏
+                self.apply_final_theme(weather_type, self.theme_colors[weather_type])
+                return
+
             # 保存当前主题
             self.current_theme = weather_type
             
@@ -332,26 +564,7 @@ class DailyTracker(TabbedPanel):
         try:
             if hasattr(self, 'weather_manager'):
                 # 获取当前天气信息（使用上海交大坐标）
-                weather_data = self.weather_manager.get_current_weather(31.0258, 121.4376)
-                weather_type = weather_data.get('weather', 'sunny')
-                print(f"Weather data received: {weather_type}")
-
-                # 天气类型到主题的映射
-                weather_map = {
-                    'clear': 'sunny',
-                    'sunny': 'sunny',
-                    'cloudy': 'cloudy',
-                    'overcast': 'cloudy',
-                    'rain': 'rainy',
-                    'rainy': 'rainy',
-                    'snow': 'rainy'
-                }
-
-                # 获取对应的主题
-                theme = weather_map.get(weather_type, 'sunny')
-                print(f"Weather {weather_type} mapped to theme: {theme}")
-                self.update_theme(theme)  # 应用主题
-
+                self.apply_weather(self.weather_manager.get_current_weather(31.0258, 121.4376))
             else:
                 print("Weather manager not available, using default theme")
                 self.update_theme('sunny')
@@ -360,25 +573,50 @@ class DailyTracker(TabbedPanel):
             print(f"Weather update error: {e}")
             self.update_theme('sunny')  # 出错时使用默认主题
 
-    def apply_final_theme(self, weather_type, colors):
-        """在视觉反馈后应用最终主题颜色"""
-        try:
-            # 应用最终背景色
-            bg_color = get_color_from_hex(colors['background'])
-            Window.clearcolor = bg_color
-            print(f"Final background color: {colors['background']}")
-
-            # 强制窗口重绘
-            Window.canvas.ask_update()
+    def apply_weather(self, weather_data):
+        """把天气数据映射为主题并应用"""
+        weather_type = weather_data.get('weather', 'sunny')
+        print(f"Weather data received: {weather_type}")
+
+        # 天气类型到主题的映射
+        weather_map = {
+            'clear': 'sunny',
+            'sunny': 'sunny',
+            'cloudy': 'cloudy',
+            'overcast': 'cloudy',
+            'rain': 'rainy',
+            'rainy': 'rainy',
+            'snow': 'rainy'
+        }
 
-            # 通知所有标签页更新主题
-            if hasattr(self, 'schedule_tab'):
-                self.schedule_tab.update_theme(colors)
-            if hasattr(self, 'tracking_tab'):
-                self.tracking_tab.update_theme(colors)
-            if hasattr(self, 'personalization_tab'):
-                self.personalization_tab.update_theme(colors)
+        # 获取对应的主题
+        theme = weather_map.get(weather_type, 'sunny')
+        print(f"Weather {weather_type} mapped to theme: {theme}")
+        self.update_theme(theme)  # 应用主题
 
+    def apply_final_theme(self, weather_type, colors, fresh=True):
+        """在视觉反馈后应用最终主题颜色（fresh=False表示来自启动快照）"""
+        try:
+            with measure('DailyTracker.apply_final_theme'):
+                # 应用最终背景色
+                bg_color = get_color_from_hex(colors['background'])
+                Window.clearcolor = bg_color
+                print(f"Final background color: {colors['background']}")
+
+                # 强制窗口重绘
+                Window.canvas.ask_update()
+
+                # 通知所有标签页更新主题
+                if hasattr(self, 'schedule_tab'):
+                    self.schedule_tab.update_theme(colors)
+                if hasattr(self, 'tracking_tab'):
+                    self.tracking_tab.update_theme(colors)
+                if hasattr(self, 'personalization_tab'):
+                    self.personalization_tab.update_theme(colors)
+
+            self.theme_applied = True
+            if fresh:
+                self.mark_startup('fresh_theme')
             print(f"Theme {weather_type} applied successfully with visual feedback!")
 
         except Exception as e:
@@ -387,26 +625,71 @@ class DailyTracker(TabbedPanel):
     def add_note(self, activity_data, text, image_path=None):
         """添加活动笔记"""
         try:
-            # 创建笔记对象
-            note = {
-                'timestamp': datetime.datetime.now().isoformat(),  # ISO格式时间戳
-                'activity': activity_data,  # 活动数据
-                'text': text,              # 笔记文本
-                'image': image_path        # 图片路径(可选)
-            }
+            # 图片存入附件库，笔记只记录附件id
+            if image_path and self.attachment_store:
+                image_path = self.attachment_store.add(image_path)
 
-            # 确保notes列表存在
-            if 'notes' not in self.user_data:
-                self.user_data['notes'] = []
+            # 笔记通过活动id关联，只追加写入这条笔记及其索引
+            if isinstance(activity_data, dict):
+                activity_id = activity_data.get('id')
+            else:
+                activity_id = getattr(activity_data, 'id', activity_data)
+            note = self.notes_store.add(activity_id, text, image_path)
+            self.sync_client.record('note', note.id, note.timestamp[:10], note.to_dict())
 
-            # 添加笔记并保存
-            self.user_data['notes'].append(note)
-            self.save_user_data()
+            # 更新显示
+            if hasattr(self, 'schedule_tab'):
+                self.schedule_tab.update_activities_display()
             print("Note added successfully")
 
         except Exception as e:
             print(f"Failed to add note: {e}")
 
+    def sync_report(self):
+        """同步统计，与完整重新上传全部数据的大小对比"""
+        notes = []
+        if self.notes_store is not None:
+            self.notes_store.load()
+            notes = [n.to_dict() for n in self.notes_store.notes.values()]
+        full_payload = {
+            'activities': [a.to_dict() for a in self.schedule_tab.activities],
+            'notes': notes,
+            'rollups': self.schedule_tab.rollups,
+        }
+        return self.sync_client.report(full_payload)
+
+    def search_notes(self, query):
+        """全文搜索笔记"""
+        if self.notes_store is None:
+            return []
+        try:
+            return self.notes_store.search(query)
+        except Exception as e:
+            print(f"Failed to search notes: {e}")
+            return []
+
+    def export_history(self, path, fmt, start_date=None, end_date=None, place=None):
+        """导出轨迹和活动记录（gpx / geojson / csv），可按日期范围和地点过滤"""
+        try:
+            from utils.exporter import HistoryExporter
+            self.track_store.flush()
+            activities = []
+            if hasattr(self.schedule_tab, 'query_activities'):
+                # 包括已归档月份中的活动
+                activities = self.schedule_tab.query_activities(start_date or datetime.date.min,
+                                                                end_date or datetime.date.max)
+            exporter = HistoryExporter(self.track_store, activities, self.user_data.get('locations', {}))
+            exporter.export(path, fmt, start_date, end_date, place)
+            if fmt == 'csv':
+                # CSV格式的活动记录单独保存
+                base, ext = os.path.splitext(path)
+                exporter.export_activities(f"{base}_activities{ext}", start_date, end_date, place)
+            print(f"History exported to {path}")
+            return True
+        except Exception as e:
+            print(f"Failed to export history: {e}")
+            return False
+
     def customize_color(self, module):
         """自定义模块颜色（委托给设置标签页）"""
         if hasattr(self, 'personalization_tab'):
@@ -422,7 +705,7 @@ class DailyTracker(TabbedPanel):
         try:
             # 更新数据并保存
             self.user_data['speed_threshold'] = float(value)
-            self.save_user_data()
+            self.request_save()
 
             # 更新位置管理器
             if hasattr(self, 'location_manager'):
@@ -513,14 +796,32 @@ class DailyTrackerApp(App):
         print(f"Application icon: {self.icon}")
         # 设置初始窗口大小（桌面测试用）
         Window.size = (400, 700)
+
+        # 可选的主循环卡顿监控（环境变量 DAILYTRACKER_WATCHDOG 开启），需在创建界面前安装
+        self.watchdog = StallWatchdog.from_environment() if StallWatchdog else None
+        if self.watchdog:
+            self.watchdog.install()
+
         return DailyTracker()  # 返回主应用实例
 
+    def on_start(self):
+        """界面创建完成后启动后台服务"""
+        self.root.start_services()
+        # 第一帧画出后的下一次Clock回调记录启动耗时
+        Clock.schedule_once(lambda dt: Clock.schedule_once(self.root.mark_first_frame))
+
     def on_pause(self):
         """应用暂停时调用（Android特有）"""
         try:
-            # 保存用户数据
+            # 停止后台服务并保存用户数据
             if hasattr(self, 'root'):
+                self.root.stop_services()
+                self.root.events.dispatch()  # 立即分发还没处理的位置事件
                 self.root.save_user_data()
+                self.root.save_snapshot()
+                self.root.track_store.flush()
+                if getattr(self.root, 'location_manager', None):
+                    self.root.location_manager.save_state()
             print("Application paused, data saved")
             return True  # 允许应用暂停
         except Exception as e:
@@ -531,9 +832,16 @@ class DailyTrackerApp(App):
         """应用恢复时调用（Android特有）"""
         try:
             if hasattr(self, 'root'):
-                # 更新闹钟信息和天气主题
-                self.root.update_alarm_info()
-                self.root.update_weather_theme()
+                # 补发暂停期间错过的提醒
+                if hasattr(self.root.schedule_tab, 'check_reminders'):
+                    self.root.schedule_tab.check_reminders()
+                if self.root.services:
+                    # 重新启动服务（会重新读取闹钟和天气）
+                    self.root.start_services()
+                else:
+                    # 更新闹钟信息和天气主题
+                    self.root.update_alarm_info()
+                    self.root.update_weather_theme()
             print("Application resumed, data updated")
         except Exception as e:
             print(f"Resume handling failed: {e}")
@@ -541,10 +849,33 @@ class DailyTrackerApp(App):
     def on_stop(self):
         """应用停止时调用"""
         try:
-            # 保存用户数据
+            # 停止后台服务并保存用户数据
             if hasattr(self, 'root'):
+                self.root.stop_services()
+                self.root.events.dispatch()  # 立即分发还没处理的位置事件
                 self.root.save_user_data()
+                self.root.save_snapshot()
+                self.root.track_store.flush()
+                if getattr(self.root, 'location_manager', None):
+                    self.root.location_manager.save_state()
             print("Application stopped, data saved")
+
+            # 定位预处理的丢弃统计
+            location_manager = getattr(self.root, 'location_manager', None)
+            if location_manager is not None:
+                print(f"Fix pipeline drops: {location_manager.fix_pipeline.report()}")
+                print(f"Location events: {self.root.events.report()}")
+
+            if hasattr(self, 'root'):
+                self.root.sync_client.close()
+                if self.root.tile_fetcher:
+                    print(f"Tile cache: {self.root.tile_fetcher.cache.stats()}")
+                    self.root.tile_fetcher.close(wait=False)
+
+            # 写出卡顿报告
+            if getattr(self, 'watchdog', None):
+                self.watchdog.write_report()
+                self.watchdog.uninstall()
         except Exception as e:
             print(f"Stop handling failed: {e}")
 
@@ -552,8 +883,8 @@ class DailyTrackerApp(App):
 # ========== 应用入口 ==========
 if __name__ == '__main__':
     try:
-        # 创建并运行应用
-        DailyTrackerApp().run()
+        # 在asyncio事件循环上运行应用，后台服务作为任务并发执行
+        asyncio.run(DailyTrackerApp().async_run(async_lib='asyncio'))
     except Exception as e:
         print(f"Application startup failed: {e}")
         # 打印完整错误堆栈
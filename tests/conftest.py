@@ -0,0 +1,43 @@
+import sys
+import types
+
+import pytest
+
+# 依赖Kivy的模块（只用到其中很少的名字），测试时用替身模块导入
+_KIVY_DEPENDENT = ('utils.services', 'utils.event_bus', 'utils.location_manager')
+
+
+class _StubClock:
+    """kivy.clock.Clock的替身：不调度，测试自己调用dispatch"""
+
+    @staticmethod
+    def create_trigger(callback, timeout=0):
+        return lambda *args: None
+
+    @staticmethod
+    def schedule_once(callback, timeout=0):
+        pass
+
+    @staticmethod
+    def schedule_interval(callback, timeout):
+        pass
+
+
+@pytest.fixture
+def kivy_stub(monkeypatch):
+    """替换kivy和mapview，并让依赖它们的模块重新导入"""
+    kivy = types.ModuleType('kivy')
+    kivy.platform = 'linux'
+    clock = types.ModuleType('kivy.clock')
+    clock.Clock = _StubClock
+    garden = types.ModuleType('kivy.garden')
+    mapview = types.ModuleType('kivy.garden.mapview')
+    mapview.MapView = mapview.MapMarker = object
+    for name, module in (('kivy', kivy), ('kivy.clock', clock), ('kivy.garden', garden),
+                         ('kivy.garden.mapview', mapview)):
+        monkeypatch.setitem(sys.modules, name, module)
+    for name in _KIVY_DEPENDENT:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    yield
+    for name in _KIVY_DEPENDENT:
+        sys.modules.pop(name, None)
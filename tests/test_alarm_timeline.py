@@ -0,0 +1,35 @@
+import datetime
+
+from utils.alarm_reader import AlarmTimeline
+
+
+def _ts(date, hhmm):
+    hours, minutes = map(int, hhmm.split(':'))
+    return datetime.datetime.combine(date, datetime.time(hours, minutes)).timestamp()
+
+
+def test_day_windows_are_contiguous():
+    # 周末起得晚
+    timeline = AlarmTimeline({day: (7 * 60, 23 * 60) for day in range(5)})
+    timeline.days.update({5: (9 * 60, 23 * 60), 6: (9 * 60, 23 * 60)})
+    start = datetime.date(2026, 10, 12)  # 周一
+    timeline.precompute_windows(start, 14)
+    for offset in range(13):
+        date = start + datetime.timedelta(days=offset)
+        window = timeline.day_window(date)
+        assert window[0] < window[1]
+        assert window[1] == timeline.day_window(date + datetime.timedelta(days=1))[0]
+
+
+def test_late_night_and_early_activities_belong_to_one_day():
+    timeline = AlarmTimeline.from_alarms([{'time': '07:00', 'days': []}, {'time': '23:00', 'days': []}])
+    today = datetime.date(2026, 10, 19)
+    yesterday = today - datetime.timedelta(days=1)
+
+    def owners(ts):
+        return [d for d in (yesterday, today) if timeline.day_window(d)[0] <= ts < timeline.day_window(d)[1]]
+
+    assert owners(_ts(today, '00:30')) == [yesterday]  # 熬夜学习
+    assert owners(_ts(today, '06:30')) == [yesterday]  # 起床前
+    assert owners(_ts(today, '07:00')) == [today]
+    assert owners(_ts(today, '23:30')) == [today]      # 睡觉之后
@@ -0,0 +1,127 @@
+import datetime
+import json
+import math
+import random
+import time
+import tracemalloc
+import types
+
+from utils.records import Activity, Fix, Note, Run
+from utils.speed_series import SpeedSeries
+from utils.track_store import TrackStore
+
+# 内存预算：真实的LocationManager.process_new_location处理24小时1Hz定位后，
+# 跟踪相关对象（含围栏、状态日志、地图匹配、事件队列）的内存增长和峰值
+GROWTH_BUDGET = 512 * 1024      # 字节
+PEAK_BUDGET = 2 * 1024 * 1024   # 字节
+WINDOW = 1000                   # LocationManager保留的最近定位点数
+DAY_SECONDS = 24 * 3600
+
+PLACES = {
+    'home': {'name': 'Home', 'coords': [31.0258, 121.4376], 'radius': 25, 'events': ['Rest']},
+    'library': {'name': 'Library', 'coords': [31.0275, 121.4376], 'radius': 25, 'events': ['Study']},
+    'cafeteria': {'name': 'Cafeteria', 'coords': [31.0275, 121.4400], 'radius': 25, 'events': ['Meal']},
+    'field': {'name': 'Field', 'coords': [31.0258, 121.4400], 'radius': 25, 'events': ['Sport']},
+}
+# 四个地点之间的道路（正方形），地图匹配用
+PATHS = {
+    'nodes': {'home': [31.0258, 121.4376], 'library': [31.0275, 121.4376],
+              'cafeteria': [31.0275, 121.4400], 'field': [31.0258, 121.4400]},
+    'edges': [['home', 'library'], ['library', 'cafeteria'], ['cafeteria', 'field'], ['field', 'home']],
+}
+# 一天的循环：(目的地, 移动速度m/s, 到达后停留秒数)；None表示在两地之间的路边停留
+ROUTINE = [('library', 1.4, 3600), ('cafeteria', 1.4, 1200), ('field', 1.4, 600),
+           ('home', 4.0, 0), ('field', 4.0, 0), (None, 1.4, 900), ('home', 1.4, 1800)]
+
+
+def _simulated_day(start, seconds):
+    """按ROUTINE在地点之间走动、跑步和停留的1Hz定位 (时间戳, 纬度, 经度, 速度)"""
+    rng = random.Random(0)
+    lat, lon = PLACES['home']['coords']
+    ts = start
+    while True:
+        for target, speed, stay in ROUTINE:
+            if target is None:
+                # 路边停留：当前位置到下一个地点的中点（在所有围栏以外）
+                next_lat, next_lon = PATHS['nodes']['home']
+                dest = ((lat + next_lat) / 2, (lon + next_lon) / 2)
+            else:
+                dest = tuple(PLACES[target]['coords'])
+            distance = math.hypot((dest[0] - lat) * 111000, (dest[1] - lon) * 95000)
+            steps = max(1, int(distance / speed))
+            start_lat, start_lon = lat, lon
+            for step in range(1, steps + 1):
+                lat = start_lat + (dest[0] - start_lat) * step / steps + rng.gauss(0, 2e-6)
+                lon = start_lon + (dest[1] - start_lon) * step / steps + rng.gauss(0, 2e-6)
+                yield ts, lat, lon, speed + rng.gauss(0, 0.1)
+                ts += 1
+            for _ in range(stay if target is not None else 900):
+                yield ts, dest[0] + rng.gauss(0, 3e-6), dest[1] + rng.gauss(0, 3e-6), abs(rng.gauss(0, 0.1))
+                ts += 1
+            if ts - start >= seconds:
+                return
+
+
+def test_records_have_no_instance_dict():
+    for record in (Fix(0, 0, 0), Activity('a', 'Home', 'Rest', 0, 60), Run(0, 1.0),
+                   Note('n', '', 'a', 'text')):
+        assert not hasattr(record, '__dict__')
+
+
+def test_24h_tracking_stays_within_memory_budget(tmp_path, monkeypatch, kivy_stub):
+    # StateJournal、MapMatcher和Gazetteer使用相对路径
+    monkeypatch.chdir(tmp_path)
+    with open('campus_paths.json', 'w', encoding='utf-8') as f:
+        json.dump(PATHS, f)
+
+    from utils.event_bus import EventBus, RunEnded, StayEnded
+    from utils.location_manager import LocationManager
+
+    start = datetime.datetime.combine(datetime.date.today(), datetime.time()).timestamp()
+    now = [start]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+
+    events = EventBus()
+    ended = {'stays': 0, 'runs': 0}
+    events.subscribe(StayEnded, lambda e: ended.__setitem__('stays', ended['stays'] + 1))
+    events.subscribe(RunEnded, lambda e: ended.__setitem__('runs', ended['runs'] + 1))
+    track_store = TrackStore('tracks')
+    app = types.SimpleNamespace(
+        user_data={'locations': PLACES},
+        events=events,
+        track_store=track_store,
+        speed_series=SpeedSeries(track_store, 'speed_cache'),
+    )
+    manager = LocationManager(app)
+    assert manager.map_matcher is not None
+
+    def process(ts, lat, lon, speed):
+        now[0] = ts
+        manager.process_new_location(lat, lon, speed, accuracy=8.0)
+        events.dispatch()  # 每个定位点之间至少有一帧
+
+    fixes = _simulated_day(start, DAY_SECONDS)
+    # 先走完一轮日程：填满最近定位窗口、建立今天的速度曲线和各种缓存，之后的增长才是泄漏
+    for _ in range(3 * 3600):
+        process(*next(fixes))
+    app.speed_series.day_points(datetime.date.today(), 200)
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        for fix in fixes:
+            process(*fix)
+        track_store.flush()
+        manager.save_state()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    growth = current - baseline
+    print(f"24h at 1 Hz: growth {growth / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB, "
+          f"{ended['stays']} stays, {ended['runs']} runs")
+    # 确认模拟的一天确实经过了停留、跑步等状态变化
+    assert ended['stays'] > 20 and ended['runs'] > 5
+    assert len(manager.locations) == WINDOW
+    assert growth < GROWTH_BUDGET
+    assert peak < PEAK_BUDGET
@@ -0,0 +1,116 @@
+import asyncio
+import datetime
+import os
+import threading
+import time
+
+import pytest
+
+from utils.track_store import TrackStore
+from utils.user_store import SectionedUserData
+
+
+def test_failed_section_write_stays_dirty(tmp_path, monkeypatch):
+    user_data = SectionedUserData(str(tmp_path / 'user_data'), str(tmp_path / 'legacy.json'))
+    user_data.load()
+    user_data['wake_time'] = '07:00'
+
+    prepared = user_data.prepare_save()
+    monkeypatch.setattr(os, 'replace', lambda src, dst: (_ for _ in ()).throw(OSError('disk full')))
+    with pytest.raises(OSError):
+        user_data.write_prepared(prepared)
+    monkeypatch.undo()
+    assert os.listdir(user_data.root) == []  # 临时文件已清理
+
+    # 下次保存会重写该分区
+    user_data.save()
+    reloaded = SectionedUserData(str(tmp_path / 'user_data'), str(tmp_path / 'legacy.json'))
+    reloaded.load()
+    assert reloaded['wake_time'] == '07:00'
+
+
+def test_failed_track_write_is_requeued(tmp_path):
+    track_store = TrackStore(str(tmp_path / 'tracks'), flush_every=1000)
+    for i in range(3):
+        track_store.append(31.0, 121.0, 1.0, 1700000000 + i)
+    batch = track_store.prepare_flush()
+    track_store.append(31.0, 121.0, 1.0, 1700000003)
+
+    os.rmdir(track_store.root)  # 目录不存在，写入失败
+    assert not track_store.write_batch(batch)
+    os.makedirs(track_store.root)
+    track_store.flush()
+
+    (date,) = track_store.days()
+    timestamps = [fix.timestamp for fix in track_store.iter_day(date)]
+    assert timestamps == [1700000000 + i for i in range(4)]
+
+
+def test_concurrent_section_writes_do_not_collide(tmp_path):
+    user_data = SectionedUserData(str(tmp_path / 'user_data'), str(tmp_path / 'legacy.json'))
+    user_data.load()
+    errors = []
+
+    def writer(value):
+        try:
+            for _ in range(10):
+                user_data['wake_time'] = value
+                user_data.write_prepared(user_data.prepare_save('settings'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(f'0{i}:00',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(os.listdir(user_data.root)) == ['settings.json']
+
+
+@pytest.fixture
+def service_manager_class(kivy_stub):
+    from utils.services import ServiceManager
+    return ServiceManager
+
+
+def test_stop_waits_for_in_flight_writes(service_manager_class):
+    finished = []
+
+    def slow_write():
+        time.sleep(0.2)
+        finished.append(True)
+
+    async def scenario():
+        manager = service_manager_class(app=None)
+        manager.loop = asyncio.get_running_loop()
+        manager.running = True
+
+        async def worker():
+            await manager._write(slow_write)
+
+        manager._spawn('persistence', worker())
+        await asyncio.sleep(0.05)  # 写入已经开始
+        manager.stop()
+        # 取消任务后，stop返回前写入已经完成
+        assert finished == [True]
+
+    asyncio.run(scenario())
+
+
+def test_archiving_does_not_duplicate_buffered_fixes(tmp_path):
+    track_store = TrackStore(str(tmp_path / 'tracks'), flush_every=1000)
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    noon = datetime.datetime.combine(yesterday, datetime.time(12)).timestamp()
+    for i in range(3):
+        track_store.append(31.0, 121.0, 1.0, noon + i)
+    track_store.flush()
+    track_store.append(31.0, 121.0, 1.0, noon + 3)  # 归档时还在缓冲区
+
+    assert track_store.archive_closed_days() == 1
+    assert not os.path.exists(track_store.day_file(yesterday))
+    track_store.flush()
+    track_store.archive_closed_days()  # 合并后来写入的CSV
+
+    timestamps = [fix.timestamp for fix in track_store.iter_day(yesterday)]
+    assert timestamps == [noon + i for i in range(4)]
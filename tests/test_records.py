@@ -0,0 +1,33 @@
+import datetime
+
+import pytest
+
+from utils.activity_archive import ActivityArchive, compact_activities
+from utils.records import Activity
+
+
+def test_legacy_activity_is_converted():
+    activity = Activity.from_dict({'date': '2026-03-02', 'end_time': '00:30', 'duration': 3600,
+                                   'location': 'Library', 'event_type': 'Study'})
+    assert activity.date == '2026-03-02'
+    assert activity.start_time == '23:30'
+    assert activity.duration == 3600
+
+
+@pytest.mark.parametrize('date', [None, '', 'yesterday', '2026-13-40'])
+def test_legacy_activity_without_valid_date_is_rejected(date):
+    data = {'end_time': '10:00', 'duration': 600, 'location': 'Home'}
+    if date is not None:
+        data['date'] = date
+    with pytest.raises(ValueError):
+        Activity.from_dict(data)
+
+
+def test_legacy_activity_archives_under_its_own_date(tmp_path):
+    today = datetime.date(2026, 10, 19)
+    activities = [Activity.from_dict({'id': 'old', 'date': '2026-08-01', 'end_time': '10:00',
+                                      'duration': 600, 'location': 'Home', 'event_type': 'Rest'})]
+    archive = ActivityArchive(str(tmp_path))
+    recent, rollups, archived = compact_activities(activities, {}, archive, 30, today=today)
+    assert archived == 1 and recent == []
+    assert list(rollups) == ['2026-08-01']
@@ -0,0 +1,106 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.sync_client import SyncClient, make_server
+
+
+@pytest.fixture
+def sync_server(tmp_path):
+    output_file = str(tmp_path / 'server.jsonl')
+    server = make_server(0, output_file)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def _received(server):
+    with open(server.output_file, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_batches_after_compaction_are_not_dropped(tmp_path, sync_server):
+    server, url = sync_server
+    client = SyncClient(url, root=str(tmp_path / 'sync'), max_retries=0)
+    try:
+        client.record('activity', 'a1', '2026-10-19', {'location': 'Home'})
+        assert client.sync() == 1
+        assert client.cursor['offset'] == 0  # 全部上传后改动文件被清空
+
+        # 清空后偏移从0开始，写入长度相同的一条改动
+        client.record('activity', 'a2', '2026-10-19', {'location': 'Home'})
+        assert client.sync() == 1
+    finally:
+        client.close()
+
+    batches = _received(server)
+    assert [c['id'] for batch in batches for c in batch['changes']] == ['a1', 'a2']
+    assert len(server.batches) == 2
+    assert all(batch_id.startswith(client.cursor['client_id']) for batch_id in server.batches)
+    assert client.cursor['seq'] == 2
+
+
+def test_seq_survives_restart(tmp_path, sync_server):
+    server, url = sync_server
+    root = str(tmp_path / 'sync')
+    client = SyncClient(url, root=root, max_retries=0)
+    client.record('note', 'n1', '2026-10-19', {'text': 'x'})
+    client.sync()
+    client.close()
+
+    client = SyncClient(url, root=root, max_retries=0)
+    try:
+        client.record('note', 'n2', '2026-10-19', {'text': 'x'})
+        assert client.sync() == 1
+    finally:
+        client.close()
+    assert len(_received(server)) == 2
+
+
+class _RejectingHandler(BaseHTTPRequestHandler):
+    """替身服务器：含有 'bad' 记录的批次返回400，其余接收"""
+
+    def do_POST(self):
+        body = gzip.decompress(self.rfile.read(int(self.headers['Content-Length'])))
+        changes = json.loads(body)['changes']
+        if any(c['id'] == 'bad' for c in changes):
+            self.send_response(400)
+        else:
+            self.server.received.extend(c['id'] for c in changes)
+            self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_rejected_batch_is_dead_lettered_and_skipped(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _RejectingHandler)
+    server.received = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = SyncClient(f'http://127.0.0.1:{server.server_port}', root=str(tmp_path / 'sync'),
+                        batch_size=1, max_retries=0)
+    try:
+        for item_id in ('a1', 'bad', 'a2'):
+            client.record('activity', item_id, '2026-10-19', {'location': 'Home'})
+        assert client.sync() == 2
+        assert client.pending_bytes() == 0
+        assert client.sync() == 0  # 不会再重发被拒绝的批次
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    assert server.received == ['a1', 'a2']
+    assert client.cursor['seq'] == 3
+    assert client.report()['rejected'] == 1
+    with open(client.rejected_file, 'r', encoding='utf-8') as f:
+        (entry,) = [json.loads(line) for line in f]
+    assert [c['id'] for c in entry['changes']] == ['bad']
+    assert entry['batch_id'] == f"{client.cursor['client_id']}-1"
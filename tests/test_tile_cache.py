@@ -0,0 +1,100 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.tile_cache import TileCache, TileFetcher, tiles_for_bbox
+
+PLACES = {
+    'home': {'name': 'Home', 'coords': [31.0258, 121.4376]},
+    'library': {'name': 'Library', 'coords': [31.0262, 121.4378], 'radius': 15},
+}
+
+
+class _StubTileHandler(BaseHTTPRequestHandler):
+    """替身瓦片服务器：返回 'z/x/y' 填充的假图片，记录请求路径"""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body = (self.path.strip('/').encode('utf-8') + b' ') * 50
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubTileHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f'http://127.0.0.1:{server.server_port}/{{z}}/{{x}}/{{y}}.png'
+    server.shutdown()
+    server.server_close()
+
+
+def test_prefetch_then_hits(tmp_path, tile_server):
+    server, url = tile_server
+    fetcher = TileFetcher(TileCache(str(tmp_path)), url)
+    try:
+        fetched = fetcher.prefetch_places(PLACES, zooms=range(14, 17))
+        assert fetched > 0
+        assert fetcher.failures == 0
+        assert len(server.requests) == fetched
+        assert fetcher.cache.stats()['misses'] == fetched
+
+        # 第二次全部命中缓存，不再请求服务器
+        assert fetcher.prefetch_places(PLACES, zooms=range(14, 17)) == fetched
+        assert len(server.requests) == fetched
+        stats = fetcher.cache.stats()
+        assert stats['hits'] == fetched
+        assert stats['hit_rate'] == pytest.approx(0.5)
+    finally:
+        fetcher.close()
+
+
+def test_cache_survives_restart(tmp_path, tile_server):
+    server, url = tile_server
+    fetcher = TileFetcher(TileCache(str(tmp_path)), url)
+    try:
+        data = fetcher.fetch(16, 54846, 26779)
+    finally:
+        fetcher.close()
+
+    cache = TileCache(str(tmp_path))
+    assert cache.get(16, 54846, 26779) == data
+    assert cache.stats()['tiles'] == 1
+
+
+def test_lru_eviction_respects_byte_budget(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=2500)
+    for y in range(3):
+        cache.put(15, 1, y, b'x' * 1000)
+    assert cache.stats()['bytes'] <= 2500
+    assert cache.get(15, 1, 0) is None  # 最久未使用的被淘汰
+
+    # 读取会刷新LRU顺序
+    assert cache.get(15, 1, 1) is not None
+    cache.put(15, 1, 3, b'x' * 1000)
+    assert cache.get(15, 1, 1) is not None
+    assert cache.get(15, 1, 2) is None
+
+
+def test_refuses_bulk_prefetch_from_osm(tmp_path):
+    fetcher = TileFetcher(TileCache(str(tmp_path)))
+    try:
+        with pytest.raises(ValueError):
+            fetcher.prefetch_places(PLACES)
+    finally:
+        fetcher.close()
+
+
+def test_tiles_for_bbox_covers_places():
+    tiles = list(tiles_for_bbox(31.02, 121.43, 31.03, 121.44, 16))
+    assert len(tiles) == len(set(tiles))
+    assert all(z == 16 for z, _, _ in tiles)
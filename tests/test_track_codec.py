@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from utils import track_codec
+from utils.records import Fix
+from utils.track_codec import TrackArchive, _fixed, encode_track, write_track
+
+
+@pytest.fixture(params=['numpy', 'pure'])
+def decoder(request, monkeypatch):
+    """两种解码路径都要测"""
+    if request.param == 'numpy':
+        if not track_codec.NUMPY_AVAILABLE:
+            pytest.skip('numpy not installed')
+    else:
+        monkeypatch.setattr(track_codec, 'NUMPY_AVAILABLE', False)
+    return request.param
+
+
+def _track(count, start=1700000000.0):
+    """1Hz轨迹，夹杂定位跳变和信号中断，让部分差分需要多字节编码"""
+    rng = random.Random(count)
+    lat, lon, speed, ts = 31.0258, 121.4376, 1.4, start
+    fixes = []
+    for i in range(count):
+        ts += 1 if i % 500 else 3600.5
+        speed = max(0.0, speed + rng.gauss(0, 0.3))
+        lat += rng.gauss(0, 1e-5) + (0.01 if i % 97 == 0 else 0)
+        lon += rng.gauss(0, 1e-5) - (0.02 if i % 89 == 0 else 0)
+        fixes.append(Fix(ts, round(lat, 6), round(lon, 6), round(speed, 2)))
+    return fixes
+
+
+def _archive(tmp_path, fixes, block_size=64):
+    path = str(tmp_path / 'day.dtk')
+    write_track(path, fixes, block_size)
+    return TrackArchive(path)
+
+
+def test_round_trip(tmp_path, decoder):
+    fixes = _track(3000)
+    decoded = list(_archive(tmp_path, fixes))
+    assert [_fixed(f) for f in decoded] == [_fixed(f) for f in fixes]
+
+
+def test_iter_range_matches_full_scan(tmp_path, decoder):
+    fixes = _track(3000)
+    archive = _archive(tmp_path, fixes)
+    rng = random.Random(1)
+    for _ in range(50):
+        a, b = sorted(rng.uniform(fixes[0].timestamp - 10, fixes[-1].timestamp + 10) for _ in range(2))
+        expected = [_fixed(f) for f in fixes if a <= f.timestamp <= b]
+        assert [_fixed(f) for f in archive.iter_range(a, b)] == expected
+    assert [_fixed(f) for f in archive.iter_range(end_ts=fixes[10].timestamp)] == \
+        [_fixed(f) for f in fixes[:11]]
+    assert len(list(archive.iter_range(start_ts=fixes[-5].timestamp))) == 5
+
+
+def test_iter_range_decodes_only_needed_blocks(tmp_path, monkeypatch):
+    fixes = _track(3000)
+    archive = _archive(tmp_path, fixes)
+    decoded_blocks = []
+    decode_block = track_codec.decode_block
+    monkeypatch.setattr(track_codec, 'decode_block',
+                        lambda data, offset: decoded_blocks.append(offset) or decode_block(data, offset))
+    assert len(list(archive.iter_range(fixes[1000].timestamp, fixes[1010].timestamp))) == 11
+    assert len(decoded_blocks) <= 2
+
+
+def test_empty_and_single_fix_days(tmp_path, decoder):
+    assert encode_track([])[:4] == track_codec.MAGIC
+    empty = _archive(tmp_path, [])
+    assert list(empty) == []
+    assert list(empty.iter_range(0, 2e9)) == []
+
+    fix = Fix(1700000000.25, 31.0258, 121.4376, 1.5)
+    single = _archive(tmp_path, [fix])
+    assert [_fixed(f) for f in single] == [_fixed(fix)]
+    assert [_fixed(f) for f in single.iter_range(fix.timestamp, fix.timestamp)] == [_fixed(fix)]
+    assert list(single.iter_range(fix.timestamp + 1)) == []
+
+
+def test_block_with_single_trailing_fix(tmp_path, decoder):
+    fixes = _track(129)  # 64 + 64 + 1
+    assert [_fixed(f) for f in _archive(tmp_path, fixes)] == [_fixed(f) for f in fixes]
+
+
+def test_rejects_truncated_archive(tmp_path):
+    path = tmp_path / 'day.dtk'
+    path.write_bytes(encode_track(_track(100))[:-3])
+    with pytest.raises(ValueError):
+        TrackArchive(str(path))
@@ -1,9 +1,59 @@
 """
 Utilities package for DailyTracker app
+
+子模块按需导入：导入utils时不会加载kivy、mapview等可选依赖，
+只有用到对应的类时才导入所在的模块。
 """
 
-from .location_manager import LocationManager
-from .alarm_reader import AlarmReader
-from .weather_api import WeatherManager
+import importlib
+
+# 导出名称 -> 所在子模块
+_EXPORTS = {
+    'LocationManager': 'location_manager',
+    'AlarmReader': 'alarm_reader',
+    'AlarmTimeline': 'alarm_reader',
+    'WeatherManager': 'weather_api',
+    'GeofenceIndex': 'geofence',
+    'GeofenceTracker': 'geofence',
+    'AttachmentStore': 'attachment_store',
+    'NotesStore': 'notes_store',
+    'SectionedUserData': 'user_store',
+    'StallWatchdog': 'watchdog',
+    'TrackStore': 'track_store',
+    'TrackArchive': 'track_codec',
+    'HeatmapGrid': 'heatmap',
+    'HeatmapStore': 'heatmap',
+    'Gazetteer': 'gazetteer',
+    'SpeedSeries': 'speed_series',
+    'EventBus': 'event_bus',
+    'StartupSnapshot': 'startup_snapshot',
+    'HistoryExporter': 'exporter',
+    'TileCache': 'tile_cache',
+    'TileFetcher': 'tile_cache',
+    'CachedMapSource': 'map_source',
+    'ActivityArchive': 'activity_archive',
+    'ActivityTimeline': 'activity_archive',
+    'Fix': 'records',
+    'Activity': 'records',
+    'Run': 'records',
+    'Note': 'records',
+    'Reminder': 'records',
+    'ReminderScheduler': 'reminders',
+    'PathGraph': 'map_matcher',
+    'MapMatcher': 'map_matcher',
+    'FixPipeline': 'fix_pipeline',
+    'StateJournal': 'state_journal',
+    'SyncClient': 'sync_client',
+    'ServiceManager': 'services',
+}
+
+__all__ = list(_EXPORTS)
+
 
-__all__ = ['LocationManager', 'AlarmReader', 'WeatherManager']
\ No newline at end of file
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,169 @@
+import bisect
+import datetime
+import gzip
+import json
+import os
+from collections import OrderedDict
+
+from .records import Activity
+
+
+def rollup_day(activities):
+    """单日活动汇总：条数、总时长、按事件和地点的时长"""
+    summary = {'count': 0, 'duration': 0, 'by_event': {}, 'by_location': {}}
+    for activity in activities:
+        duration = activity.duration
+        summary['count'] += 1
+        summary['duration'] += duration
+        event = activity.event_type
+        location = activity.location
+        summary['by_event'][event] = summary['by_event'].get(event, 0) + duration
+        summary['by_location'][location] = summary['by_location'].get(location, 0) + duration
+    return summary
+
+
+def day_bounds(start_date, end_date):
+    """日期范围转为本地时间戳范围 [开始日0点, 结束日次日0点)"""
+    try:
+        start_ts = datetime.datetime.combine(start_date, datetime.time()).timestamp()
+    except (OverflowError, ValueError, OSError):
+        start_ts = float('-inf')
+    try:
+        end_ts = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time()).timestamp()
+    except (OverflowError, ValueError, OSError):
+        end_ts = float('inf')
+    return start_ts, end_ts
+
+
+class ActivityTimeline:
+    """按开始时间排序的活动列表
+
+    插入用bisect保持有序；时间窗口查询用二分查找定位起点，再向后扫描到窗口结束。
+    从 开始时间-最长时长 处开始扫描，窗口开始前就开始、但仍与窗口重叠的活动也能找到。
+    """
+
+    def __init__(self, activities=()):
+        self.items = sorted(activities, key=lambda a: a.start_ts)
+        self.starts = [a.start_ts for a in self.items]
+        self.max_duration = max((a.end_ts - a.start_ts for a in self.items), default=0)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def insert(self, activity):
+        index = bisect.bisect_right(self.starts, activity.start_ts)
+        self.starts.insert(index, activity.start_ts)
+        self.items.insert(index, activity)
+        self.max_duration = max(self.max_duration, activity.end_ts - activity.start_ts)
+
+    def between(self, start_ts, end_ts):
+        """与 [start_ts, end_ts) 重叠的活动（按开始时间排序）"""
+        index = bisect.bisect_left(self.starts, start_ts - self.max_duration)
+        stop = bisect.bisect_left(self.starts, end_ts)
+        return [a for a in self.items[index:stop] if a.end_ts > start_ts or a.start_ts >= start_ts]
+
+    def on_dates(self, start_date, end_date):
+        """日期范围内结束的活动（与按date字段筛选的结果一致）"""
+        start_ts, end_ts = day_bounds(start_date, end_date)
+        index = bisect.bisect_left(self.starts, start_ts - self.max_duration)
+        stop = bisect.bisect_left(self.starts, end_ts)
+        return [a for a in self.items[index:stop] if start_ts <= a.end_ts < end_ts]
+
+
+class ActivityArchive:
+    """按月份压缩保存的历史活动（activity_archive/YYYY-MM.json.gz）
+
+    归档的月份在需要查询时才解压读取，并保留少量最近读取的月份在内存中。
+    """
+
+    def __init__(self, root='activity_archive', cached_months=3):
+        self.root = root
+        self.cached_months = cached_months
+        self._cache = OrderedDict()  # 月份 -> 活动列表
+        os.makedirs(root, exist_ok=True)
+
+    def month_file(self, month):
+        return os.path.join(self.root, f'{month}.json.gz')
+
+    def months(self):
+        """已归档的月份列表"""
+        return sorted(name[:-len('.json.gz')] for name in os.listdir(self.root)
+                      if name.endswith('.json.gz'))
+
+    def load_month(self, month):
+        """读取某个月的归档活动"""
+        if month in self._cache:
+            self._cache.move_to_end(month)
+            return self._cache[month]
+
+        activities = []
+        path = self.month_file(month)
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                activities = [Activity.from_dict(a) for a in json.load(f)]
+
+        self._cache[month] = activities
+        while len(self._cache) > self.cached_months:
+            self._cache.popitem(last=False)
+        return activities
+
+    def add(self, month, activities):
+        """把活动并入某个月的归档（按id去重）"""
+        existing = self.load_month(month)
+        known = {a.id for a in existing if a.id}
+        merged = existing + [a for a in activities if not a.id or a.id not in known]
+        merged.sort(key=lambda a: a.start_ts)
+
+        path = self.month_file(month)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump([a.to_dict() for a in merged], f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        self._cache[month] = merged
+
+    def query(self, start_date, end_date):
+        """查询日期范围内的归档活动"""
+        start, end = start_date.isoformat()[:7], end_date.isoformat()[:7]
+        for month in self.months():
+            if month < start or month > end:
+                continue
+            yield from ActivityTimeline(self.load_month(month)).on_dates(start_date, end_date)
+
+
+def compact_activities(activities, rollups, archive, horizon_days, today=None):
+    """把早于保留期的活动按月归档，并生成每日汇总
+
+    返回 (保留在热数据中的活动, 更新后的每日汇总, 归档的活动条数)
+    """
+    today = today or datetime.date.today()
+    cutoff, _ = day_bounds(today - datetime.timedelta(days=horizon_days), today)
+
+    recent = []
+    old_by_month = {}
+    old_by_day = {}
+    for activity in activities:
+        if activity.end_ts < cutoff:
+            date = activity.date
+            old_by_month.setdefault(date[:7], []).append(activity)
+            old_by_day.setdefault(date, []).append(activity)
+        else:
+            recent.append(activity)
+
+    if not old_by_month:
+        return activities, rollups, 0
+
+    # 先写归档再返回，保证热数据重写前旧数据已经安全保存
+    for month, month_activities in sorted(old_by_month.items()):
+        archive.add(month, month_activities)
+
+    rollups = dict(rollups)
+    for date, day_activities in old_by_day.items():
+        # 同一天可能分多次归档，需要基于整月归档重新汇总
+        month_activities = archive.load_month(date[:7])
+        rollups[date] = rollup_day(a for a in month_activities if a.date == date)
+
+    archived = sum(len(v) for v in old_by_month.values())
+    return recent, rollups, archived
@@ -1,13 +1,124 @@
+import datetime
+import hashlib
+import json
+import time
+
+DEFAULT_WAKE = '07:00'
+DEFAULT_SLEEP = '23:00'
+
+
+def _to_minutes(hhmm):
+    """'HH:MM' 转为当天分钟数"""
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _to_hhmm(minutes):
+    """当天分钟数转为 'HH:MM'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class AlarmTimeline:
+    """按星期划分的起床/睡觉时间表
+
+    每个星期几取当天最早的闹钟为起床时间、最晚的为睡觉时间（按分钟比较，
+    而不是字符串）。fingerprint 用来判断闹钟是否有变化；day_window 返回
+    某天从起床到次日起床的时间戳范围，预先计算好后查询是O(1)的字典查找。
+    相邻的窗口首尾相接，睡觉之后、次日起床之前的时间仍属于前一天。
+    """
+
+    def __init__(self, days):
+        # days: 星期几(0=周一) -> (起床分钟, 睡觉分钟)
+        self.days = dict(days)
+        self.fingerprint = hashlib.sha1(
+            json.dumps(sorted(self.days.items())).encode('utf-8')
+        ).hexdigest()
+        self._windows = {}  # 日期 -> (开始时间戳, 结束时间戳)
+
+    @classmethod
+    def from_alarms(cls, alarms):
+        """从闹钟列表构建，alarms: [{'time': 'HH:MM', 'days': [0..6]}, ...]"""
+        per_day = {}
+        for alarm in alarms:
+            minutes = _to_minutes(alarm['time'])
+            for weekday in alarm.get('days') or range(7):
+                per_day.setdefault(weekday, []).append(minutes)
+        return cls({day: (min(values), max(values)) for day, values in per_day.items()})
+
+    @classmethod
+    def from_dict(cls, data):
+        """从保存的数据恢复"""
+        return cls({int(day): (_to_minutes(v['wake']), _to_minutes(v['sleep']))
+                    for day, v in data.items()})
+
+    def to_dict(self):
+        """转为可保存的数据"""
+        return {str(day): {'wake': _to_hhmm(wake), 'sleep': _to_hhmm(sleep)}
+                for day, (wake, sleep) in sorted(self.days.items())}
+
+    def wake_time(self, weekday):
+        """某个星期几的起床时间"""
+        if weekday in self.days:
+            return _to_hhmm(self.days[weekday][0])
+        return DEFAULT_WAKE
+
+    def sleep_time(self, weekday):
+        """某个星期几的睡觉时间"""
+        if weekday in self.days:
+            return _to_hhmm(self.days[weekday][1])
+        return DEFAULT_SLEEP
+
+    def precompute_windows(self, start_date=None, days=14):
+        """预先计算一段日期的起止时间戳（默认从一周前开始的两周）"""
+        if start_date is None:
+            start_date = datetime.date.today() - datetime.timedelta(days=7)
+        for offset in range(days):
+            date = start_date + datetime.timedelta(days=offset)
+            self._windows[date] = self._compute_window(date)
+
+    def _wake_timestamp(self, date):
+        """某天起床时刻的时间戳"""
+        wake = _to_minutes(self.wake_time(date.weekday()))
+        return time.mktime(date.timetuple()) + wake * 60
+
+    def _compute_window(self, date):
+        """计算某天从起床到次日起床的时间戳范围"""
+        return (self._wake_timestamp(date), self._wake_timestamp(date + datetime.timedelta(days=1)))
+
+    def day_window(self, date=None):
+        """某天的[开始时间戳, 结束时间戳)，相邻日期的窗口首尾相接"""
+        if date is None:
+            date = datetime.date.today()
+        window = self._windows.get(date)
+        if window is None:
+            window = self._windows[date] = self._compute_window(date)
+        return window
+
+
 class AlarmReader:
     def __init__(self):
         pass
 
-    def get_alarms(self):
-        # 在Android上读取闹钟数据
+    def get_alarm_schedule(self):
+        # 在Android上读取闹钟数据（时间和重复的星期几）
         # 这里需要Android权限和具体的实现
-        # 返回格式: ['07:00', '08:30', '23:00']
+        # 返回格式: [{'time': '07:00', 'days': [0, 1, 2, 3, 4]}, ...]，days为空表示每天
         try:
             # 模拟数据
-            return ['07:00', '08:30', '23:00']
+            return [
+                {'time': '07:00', 'days': [0, 1, 2, 3, 4]},
+                {'time': '08:30', 'days': [5, 6]},
+                {'time': '23:00', 'days': []},
+            ]
         except:
-            return []
\ No newline at end of file
+            return []
+
+    def get_alarms(self):
+        # 返回格式: ['07:00', '08:30', '23:00']
+        return [alarm['time'] for alarm in self.get_alarm_schedule()]
+
+    def get_timeline(self):
+        """读取闹钟并生成按星期划分的时间表"""
+        timeline = AlarmTimeline.from_alarms(self.get_alarm_schedule())
+        timeline.precompute_windows()
+        return timeline
\ No newline at end of file
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+
+from kivy.clock import Clock
+
+try:
+    from PIL import Image as PILImage
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+class AttachmentStore:
+    """按内容哈希去重的附件存储
+
+    原图保存在 objects/ 下，文件名为内容的sha256；缩略图由后台线程生成，
+    保存在 thumbs/ 下，按最近使用顺序（LRU）控制磁盘占用上限。
+    """
+
+    def __init__(self, root='attachments', thumb_size=(256, 256), cache_bytes=20 * 1024 * 1024):
+        self.objects_dir = os.path.join(root, 'objects')
+        self.thumbs_dir = os.path.join(root, 'thumbs')
+        self.thumb_size = thumb_size
+        self.cache_bytes = cache_bytes
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._thumbs = OrderedDict()  # 附件id -> 缩略图字节数，按LRU顺序
+        self._thumbs_total = 0
+        self._pending = {}            # 附件id -> 等待缩略图的回调列表
+        self._queue = queue.Queue()
+        self._worker = None
+
+        self._scan_thumbs()
+
+    def _scan_thumbs(self):
+        """启动时扫描已有缩略图，按修改时间恢复LRU顺序"""
+        entries = []
+        for name in os.listdir(self.thumbs_dir):
+            path = os.path.join(self.thumbs_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, os.path.splitext(name)[0], stat.st_size))
+
+        for _, attachment_id, size in sorted(entries):
+            self._thumbs[attachment_id] = size
+            self._thumbs_total += size
+
+    def add(self, path):
+        """存入图片，返回附件id（内容相同的文件只保存一份）"""
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                sha.update(chunk)
+
+        ext = os.path.splitext(path)[1].lower()
+        attachment_id = sha.hexdigest() + ext
+        target = self.object_path(attachment_id)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = target + '.tmp'
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, target)
+
+        # 提前在后台生成缩略图
+        self.get_thumbnail(attachment_id)
+        return attachment_id
+
+    def object_path(self, attachment_id):
+        """原图路径（按哈希前两位分目录）"""
+        return os.path.join(self.objects_dir, attachment_id[:2], attachment_id)
+
+    def thumbnail_path(self, attachment_id):
+        """缩略图路径"""
+        return os.path.join(self.thumbs_dir, os.path.splitext(attachment_id)[0] + '.png')
+
+    def get_thumbnail(self, attachment_id, callback=None):
+        """获取缩略图路径，未生成时交给后台线程，完成后在主线程回调callback(path)"""
+        key = os.path.splitext(attachment_id)[0]
+        with self._lock:
+            if key in self._thumbs:
+                self._thumbs.move_to_end(key)
+                path = self.thumbnail_path(attachment_id)
+                hit = True
+            else:
+                hit = False
+                callbacks = self._pending.get(key)
+                if callbacks is None:
+                    self._pending[key] = [callback] if callback else []
+                    self._queue.put(attachment_id)
+                elif callback:
+                    callbacks.append(callback)
+
+        if hit:
+            try:
+                os.utime(path)  # 刷新修改时间，重启后保持LRU顺序
+            except OSError:
+                pass
+            if callback:
+                callback(path)
+            return path
+
+        self._ensure_worker()
+        return None
+
+    def _ensure_worker(self):
+        """按需启动后台缩略图线程"""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='thumbnailer', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        """后台线程：逐个生成缩略图"""
+        while True:
+            attachment_id = self._queue.get()
+            key = os.path.splitext(attachment_id)[0]
+            path = None
+            try:
+                path = self._make_thumbnail(attachment_id)
+            except Exception as e:
+                print(f"Thumbnail generation failed: {e}")
+
+            with self._lock:
+                callbacks = self._pending.pop(key, [])
+                if path:
+                    size = os.path.getsize(path)
+                    self._thumbs[key] = size
+                    self._thumbs_total += size
+                    self._evict()
+
+            for callback in callbacks:
+                # 回到Kivy主线程执行UI回调
+                Clock.schedule_once(lambda dt, cb=callback: cb(path))
+
+    def _make_thumbnail(self, attachment_id):
+        """解码原图并缩放保存为PNG"""
+        if not PIL_AVAILABLE:
+            print("Pillow not available, thumbnails disabled")
+            return None
+
+        source = self.object_path(attachment_id)
+        target = self.thumbnail_path(attachment_id)
+        with PILImage.open(source) as image:
+            image.draft('RGB', self.thumb_size)  # JPEG可以直接低分辨率解码
+            image.thumbnail(self.thumb_size)
+            tmp_path = target + '.tmp'
+            image.save(tmp_path, format='PNG')
+        os.replace(tmp_path, target)
+        return target
+
+    def _evict(self):
+        """超过容量上限时删除最久未使用的缩略图（调用方持有锁）"""
+        while self._thumbs_total > self.cache_bytes and len(self._thumbs) > 1:
+            key, size = self._thumbs.popitem(last=False)
+            self._thumbs_total -= size
+            try:
+                os.remove(os.path.join(self.thumbs_dir, key + '.png'))
+            except OSError:
+                pass
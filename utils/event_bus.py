@@ -0,0 +1,138 @@
+from kivy.clock import Clock
+
+
+class Event:
+    """事件基类：key相同的事件在同一帧内只保留最后一个，key为None的事件不合并"""
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return None
+
+
+class SpeedChanged(Event):
+    """当前速度变化（一帧内只显示最新的速度）"""
+    __slots__ = ('speed', 'timestamp')
+
+    def __init__(self, speed, timestamp):
+        self.speed = speed
+        self.timestamp = timestamp
+
+    @property
+    def key(self):
+        return 'speed'
+
+
+class RunStarted(Event):
+    """开始跑步"""
+    __slots__ = ('speed', 'timestamp')
+
+    def __init__(self, speed, timestamp):
+        self.speed = speed
+        self.timestamp = timestamp
+
+    @property
+    def key(self):
+        return ('run_start', self.timestamp)
+
+
+class RunEnded(Event):
+    """结束跑步"""
+    __slots__ = ('start_ts', 'duration', 'average_speed')
+
+    def __init__(self, start_ts, duration, average_speed):
+        self.start_ts = start_ts
+        self.duration = duration
+        self.average_speed = average_speed
+
+    @property
+    def key(self):
+        return ('run_end', self.start_ts)
+
+
+class StayEnded(Event):
+    """一次停留结束（location为预设地点数据，地点以外的停留为None）"""
+    __slots__ = ('name', 'event_type', 'start_ts', 'end_ts', 'location')
+
+    def __init__(self, name, event_type, start_ts, end_ts, location=None):
+        self.name = name
+        self.event_type = event_type
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.location = location
+
+    @property
+    def duration(self):
+        return self.end_ts - self.start_ts
+
+    @property
+    def key(self):
+        # 同一次停留只记录一次
+        return ('stay', self.name, self.start_ts)
+
+
+class EventBus:
+    """位置事件总线：发布者不需要引用标签页
+
+    事件先放入待分发队列（相同key的合并），每帧分发一次；batch=True的订阅者
+    一次收到这一帧内该类型的全部事件，可以合并保存。
+    """
+
+    def __init__(self):
+        self._handlers = {}     # 事件类型 -> [(处理函数, batch)]
+        self._pending = {}      # key -> 事件（按发布顺序）
+        self._sequence = 0      # 不合并事件的自增key
+        self._trigger = Clock.create_trigger(self.dispatch)
+        self.published = 0
+        self.coalesced = 0
+        self.frames = 0
+
+    def subscribe(self, event_type, handler, batch=False):
+        if not (isinstance(event_type, type) and issubclass(event_type, Event)):
+            raise TypeError(f"Not an event type: {event_type!r}")
+        self._handlers.setdefault(event_type, []).append((handler, batch))
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self._handlers.get(event_type, [])
+        self._handlers[event_type] = [h for h in handlers if h[0] != handler]
+
+    def publish(self, event):
+        """发布事件，下一帧分发"""
+        if not isinstance(event, Event):
+            raise TypeError(f"Not an event: {event!r}")
+        key = event.key
+        if key is None:
+            self._sequence += 1
+            key = self._sequence
+        key = (type(event), key)
+        if key in self._pending:
+            self.coalesced += 1
+            del self._pending[key]  # 移到队尾，保持最新事件的顺序
+        self._pending[key] = event
+        self.published += 1
+        self._trigger()
+
+    def dispatch(self, dt=None):
+        """分发这一帧内积累的事件"""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self.frames += 1
+
+        by_type = {}
+        for event in pending.values():
+            by_type.setdefault(type(event), []).append(event)
+
+        for event_type, events in by_type.items():
+            for handler, batch in self._handlers.get(event_type, []):
+                try:
+                    if batch:
+                        handler(events)
+                    else:
+                        for event in events:
+                            handler(event)
+                except Exception as e:
+                    print(f"Event handler for {event_type.__name__} failed: {e}")
+
+    def report(self):
+        return {'published': self.published, 'coalesced': self.coalesced, 'frames': self.frames}
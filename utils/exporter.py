@@ -0,0 +1,176 @@
+import datetime
+import json
+from xml.sax.saxutils import escape
+
+from .geofence import GeofenceIndex
+
+EXPORT_FORMATS = ('gpx', 'geojson', 'csv')
+
+
+def _iso(timestamp):
+    """时间戳转为UTC的ISO 8601字符串"""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc) \
+        .strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _chunked(pieces, chunk_size):
+    """把小段文本合并成块输出，减少写文件次数"""
+    chunk = []
+    for piece in pieces:
+        chunk.append(piece)
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def iter_gpx(fixes, waypoints=(), chunk_size=500):
+    """生成GPX文本块，waypoints为 [(纬度, 经度, 名称, 描述), ...]"""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<gpx version="1.1" creator="DailyTracker" xmlns="http://www.topografix.com/GPX/1/1">\n')
+
+    # GPX规定航点必须在轨迹之前
+    yield from _chunked(
+        (f'  <wpt lat="{lat:.7f}" lon="{lon:.7f}"><name>{escape(name)}</name>'
+         f'<desc>{escape(desc)}</desc></wpt>\n'
+         for lat, lon, name, desc in waypoints),
+        chunk_size
+    )
+
+    yield '  <trk><name>DailyTracker</name><trkseg>\n'
+    yield from _chunked(
+        (f'    <trkpt lat="{lat:.7f}" lon="{lon:.7f}"><time>{_iso(ts)}</time>'
+         f'<extensions><speed>{speed:.2f}</speed></extensions></trkpt>\n'
+         for ts, lat, lon, speed in fixes),
+        chunk_size
+    )
+    yield '  </trkseg></trk>\n</gpx>\n'
+
+
+def iter_geojson(fixes, waypoints=(), chunk_size=500):
+    """生成GeoJSON文本块：一条LineString轨迹，加上活动地点的Point"""
+    yield '{"type": "FeatureCollection", "features": [\n'
+
+    for lat, lon, name, desc in waypoints:
+        feature = {
+            'type': 'Feature',
+            'properties': {'name': name, 'description': desc},
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]}
+        }
+        yield json.dumps(feature, ensure_ascii=False) + ',\n'
+
+    # 坐标逐点输出；起止时间在写完坐标后才知道，放在geometry之后的properties里
+    yield '{"type": "Feature", "geometry": {"type": "LineString", "coordinates": ['
+    bounds = {'start': None, 'end': None, 'points': 0}
+
+    def coordinates():
+        for ts, lat, lon, speed in fixes:
+            if bounds['start'] is None:
+                bounds['start'] = ts
+            bounds['end'] = ts
+            bounds['points'] += 1
+            yield ('' if bounds['points'] == 1 else ',') + f'[{lon:.7f},{lat:.7f}]'
+
+    yield from _chunked(coordinates(), chunk_size)
+
+    properties = {'name': 'DailyTracker', 'points': bounds['points']}
+    if bounds['start'] is not None:
+        properties['start'] = _iso(bounds['start'])
+        properties['end'] = _iso(bounds['end'])
+    yield ']}, "properties": ' + json.dumps(properties) + '}\n]}\n'
+
+
+def iter_csv(fixes, chunk_size=500):
+    """生成轨迹CSV文本块"""
+    yield 'time,lat,lon,speed\n'
+    yield from _chunked(
+        (f'{_iso(ts)},{lat:.7f},{lon:.7f},{speed:.2f}\n' for ts, lat, lon, speed in fixes),
+        chunk_size
+    )
+
+
+def iter_activities_csv(activities, chunk_size=500):
+    """生成活动记录CSV文本块"""
+    yield 'date,start_time,end_time,duration,location,event_type\n'
+
+    def row(activity):
+        fields = [activity.date, activity.start_time, activity.end_time,
+                  str(activity.duration), activity.location, activity.event_type]
+        return ','.join('"' + str(f).replace('"', '""') + '"' for f in fields) + '\n'
+
+    yield from _chunked((row(a) for a in activities), chunk_size)
+
+
+class HistoryExporter:
+    """把轨迹历史和活动记录流式导出为GPX / GeoJSON / CSV
+
+    所有数据都通过生成器逐块读取和写出，内存占用与导出的时间范围无关。
+    """
+
+    def __init__(self, track_store, activities=(), locations=None):
+        self.track_store = track_store
+        self.activities = activities
+        self.locations = locations or {}
+        self.geofence_index = GeofenceIndex(self.locations)
+
+    def _place(self, place):
+        """按地点id或名称查找围栏"""
+        for fence in self.geofence_index.fences:
+            if place in (fence.id, fence.name):
+                return fence
+        raise ValueError(f"Unknown place: {place}")
+
+    def fixes(self, start_date=None, end_date=None, place=None):
+        """日期范围内的定位点，可按地点过滤"""
+        fence = self._place(place) if place else None
+        for date in self.track_store.days(start_date, end_date):
+            for fix in self.track_store.iter_day(date):
+                if fence is None or fence.contains(fix.lat, fix.lon):
+                    yield fix
+
+    def iter_activities(self, start_date=None, end_date=None, place=None):
+        """日期范围内的活动记录，可按地点过滤"""
+        start = start_date.isoformat() if start_date else ''
+        end = end_date.isoformat() if end_date else '9999-12-31'
+        fence = self._place(place) if place else None
+        for activity in self.activities:
+            if not start <= activity.date <= end:
+                continue
+            if fence is not None and activity.location not in (fence.id, fence.name):
+                continue
+            yield activity
+
+    def _waypoints(self, start_date, end_date, place):
+        """活动记录转为航点（使用所在地点的中心坐标）"""
+        centers = {f.name: f.center for f in self.geofence_index.fences}
+        for activity in self.iter_activities(start_date, end_date, place):
+            center = centers.get(activity.location)
+            if center is None:
+                continue
+            desc = f"{activity.event_type} {activity.date} {activity.start_time}-{activity.end_time}"
+            yield center[0], center[1], activity.location, desc
+
+    def iter_export(self, fmt, start_date=None, end_date=None, place=None, chunk_size=500):
+        """按格式生成导出内容的文本块"""
+        fixes = self.fixes(start_date, end_date, place)
+        waypoints = self._waypoints(start_date, end_date, place)
+        if fmt == 'gpx':
+            return iter_gpx(fixes, waypoints, chunk_size)
+        if fmt == 'geojson':
+            return iter_geojson(fixes, waypoints, chunk_size)
+        if fmt == 'csv':
+            return iter_csv(fixes, chunk_size)
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    def export(self, path, fmt, start_date=None, end_date=None, place=None, chunk_size=500):
+        """导出轨迹（GPX/GeoJSON附带活动地点）到文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in self.iter_export(fmt, start_date, end_date, place, chunk_size):
+                f.write(chunk)
+
+    def export_activities(self, path, start_date=None, end_date=None, place=None, chunk_size=500):
+        """导出活动记录CSV到文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in iter_activities_csv(self.iter_activities(start_date, end_date, place), chunk_size):
+                f.write(chunk)
@@ -0,0 +1,147 @@
+from .geofence import haversine
+
+# 默认处理链（可在 user_data['fix_pipeline'] 中修改）
+DEFAULT_PIPELINE = [
+    {'stage': 'dedupe', 'min_interval': 1.0, 'min_distance': 0.5},
+    {'stage': 'accuracy', 'max_accuracy': 50},
+    {'stage': 'spike', 'max_speed': 15, 'max_rejects': 3},
+    {'stage': 'downsample', 'min_interval': 2},
+]
+
+
+class Stage:
+    """处理阶段基类：accept(fix) 返回是否保留该点"""
+    name = 'stage'
+
+    def __init__(self):
+        self.seen = 0
+        self.dropped = 0
+
+    def process(self, fix):
+        self.seen += 1
+        if self.accept(fix):
+            return True
+        self.dropped += 1
+        return False
+
+    def accept(self, fix):
+        return True
+
+
+class DedupeStage(Stage):
+    """丢弃重复和时间倒序的定位点"""
+    name = 'dedupe'
+
+    def __init__(self, min_interval=1.0, min_distance=0.5):
+        super().__init__()
+        self.min_interval = min_interval  # 秒
+        self.min_distance = min_distance  # 米
+        self.last = None
+
+    def accept(self, fix):
+        last = self.last
+        if last is not None:
+            if fix.timestamp <= last.timestamp:
+                return False
+            if (fix.timestamp - last.timestamp < self.min_interval
+                    and haversine(last.lat, last.lon, fix.lat, fix.lon) < self.min_distance):
+                return False
+        self.last = fix
+        return True
+
+
+class AccuracyStage(Stage):
+    """丢弃精度为0或误差过大的定位点（没有精度信息的点保留）"""
+    name = 'accuracy'
+
+    def __init__(self, max_accuracy=50):
+        super().__init__()
+        self.max_accuracy = max_accuracy  # 米
+
+    def accept(self, fix):
+        if fix.accuracy is None:
+            return True
+        return 0 < fix.accuracy <= self.max_accuracy
+
+
+class SpikeStage(Stage):
+    """丢弃与上一个有效点之间隐含速度过大的跳点
+
+    连续丢弃max_rejects个点后认为位置确实发生了变化，接受新位置。
+    """
+    name = 'spike'
+
+    def __init__(self, max_speed=15, max_rejects=3):
+        super().__init__()
+        self.max_speed = max_speed  # m/s
+        self.max_rejects = max_rejects
+        self.last = None
+        self.rejects = 0
+
+    def accept(self, fix):
+        last = self.last
+        if last is not None and self.rejects < self.max_rejects:
+            elapsed = max(fix.timestamp - last.timestamp, 1e-3)
+            if haversine(last.lat, last.lon, fix.lat, fix.lon) / elapsed > self.max_speed:
+                self.rejects += 1
+                return False
+        self.last = fix
+        self.rejects = 0
+        return True
+
+
+class DownsampleStage(Stage):
+    """按时间降采样：两个保留点之间至少间隔min_interval秒"""
+    name = 'downsample'
+
+    def __init__(self, min_interval=2):
+        super().__init__()
+        self.min_interval = min_interval  # 秒
+        self.last_time = None
+
+    def accept(self, fix):
+        if self.last_time is not None and fix.timestamp - self.last_time < self.min_interval:
+            return False
+        self.last_time = fix.timestamp
+        return True
+
+
+STAGES = {stage.name: stage for stage in (DedupeStage, AccuracyStage, SpikeStage, DownsampleStage)}
+
+
+class FixPipeline:
+    """定位点预处理链，放在停留/跑步检测之前，某一阶段丢弃后不再经过后面的阶段"""
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    @classmethod
+    def from_config(cls, config=None):
+        """根据配置列表创建处理链，例如 [{'stage': 'dedupe', 'min_interval': 1.0}, ...]"""
+        stages = []
+        for item in DEFAULT_PIPELINE if config is None else config:
+            params = dict(item)
+            name = params.pop('stage', None)
+            if name not in STAGES:
+                print(f"Unknown fix pipeline stage: {name}")
+                continue
+            try:
+                stages.append(STAGES[name](**params))
+            except TypeError as e:
+                print(f"Invalid fix pipeline stage {name}: {e}")
+        return cls(stages)
+
+    def process(self, fix):
+        """返回该定位点是否通过所有阶段"""
+        for stage in self.stages:
+            if not stage.process(fix):
+                return False
+        return True
+
+    def stats(self):
+        """各阶段的输入和丢弃计数"""
+        return {stage.name: {'seen': stage.seen, 'dropped': stage.dropped} for stage in self.stages}
+
+    def report(self):
+        """各阶段丢弃情况的文本"""
+        return ', '.join(f"{stage.name} {stage.dropped}/{stage.seen}" for stage in self.stages)
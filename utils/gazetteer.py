@@ -0,0 +1,163 @@
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+
+from .geofence import haversine
+
+MAGIC = b'GZT1'
+HEADER = struct.Struct('<4sddfII')  # MAGIC, 最小纬度, 最小经度, 格子大小(度), 行数, 列数
+RECORD = struct.Struct('<iiIH')     # 纬度(1e-7度), 经度(1e-7度), 名称偏移, 名称长度
+OFFSET = struct.Struct('<I')
+
+
+def build_gazetteer(pois, path='gazetteer.bin', cell_size=0.001):
+    """把地点列表 [{'name', 'lat', 'lon'}] 写成带网格索引的二进制文件
+
+    文件结构：文件头、每个格子的记录起始序号（rows*cols+1个）、按格子排序的记录、名称(UTF-8)。
+    """
+    pois = [p for p in pois if p.get('name')]
+    if not pois:
+        raise ValueError("No places to write")
+    min_lat = min(p['lat'] for p in pois)
+    min_lon = min(p['lon'] for p in pois)
+    rows = int((max(p['lat'] for p in pois) - min_lat) / cell_size) + 1
+    cols = int((max(p['lon'] for p in pois) - min_lon) / cell_size) + 1
+
+    def cell_of(poi):
+        return (int((poi['lat'] - min_lat) / cell_size) * cols
+                + int((poi['lon'] - min_lon) / cell_size))
+
+    pois.sort(key=cell_of)
+    starts = [0] * (rows * cols + 1)
+    for poi in pois:
+        starts[cell_of(poi) + 1] += 1
+    for i in range(1, len(starts)):
+        starts[i] += starts[i - 1]
+
+    names = bytearray()
+    records = bytearray()
+    for poi in pois:
+        name = poi['name'].encode('utf-8')[:0xFFFF]
+        records += RECORD.pack(int(round(poi['lat'] * 1e7)), int(round(poi['lon'] * 1e7)),
+                               len(names), len(name))
+        names += name
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, min_lat, min_lon, cell_size, rows, cols))
+        f.write(b''.join(OFFSET.pack(s) for s in starts))
+        f.write(records)
+        f.write(names)
+    os.replace(tmp_path, path)
+    return len(pois)
+
+
+class Gazetteer:
+    """离线反向地理编码：查找附近的校园地点名称
+
+    文件在第一次查询时才用mmap映射，不影响启动；查询只读取附近几个格子。
+    结果按四舍五入后的坐标缓存（precision=4 约11米）。
+    """
+
+    def __init__(self, path='gazetteer.bin', max_distance=150, precision=4, memo_size=1024):
+        self.path = path
+        self.max_distance = max_distance  # 米
+        self.precision = precision
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._file = None
+        self._map = None
+        self._loaded = False
+
+    def _open(self):
+        """映射文件（只执行一次）"""
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.min_lat, self.min_lon, self.cell_size, self.rows, self.cols = \
+                HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError("not a gazetteer file")
+            self._starts_at = HEADER.size
+            self._records_at = self._starts_at + (self.rows * self.cols + 1) * OFFSET.size
+            count = OFFSET.unpack_from(self._map, self._starts_at + self.rows * self.cols * OFFSET.size)[0]
+            self._names_at = self._records_at + count * RECORD.size
+        except Exception as e:
+            print(f"Failed to open gazetteer: {e}")
+            self.close()
+
+    def _cell_records(self, row, col):
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return
+        cell = row * self.cols + col
+        start, end = struct.unpack_from('<II', self._map, self._starts_at + cell * OFFSET.size)
+        for i in range(start, end):
+            yield RECORD.unpack_from(self._map, self._records_at + i * RECORD.size)
+
+    def _search(self, lat, lon):
+        """在附近的格子中查找最近的地点"""
+        row = int(math.floor((lat - self.min_lat) / self.cell_size))
+        col = int(math.floor((lon - self.min_lon) / self.cell_size))
+        # 需要检查的格子圈数（经度方向格子更窄，按纬度换算后取大）
+        reach_deg = self.max_distance / (111320 * math.cos(math.radians(lat)))
+        reach = int(math.ceil(reach_deg / self.cell_size))
+
+        best_name, best_distance = None, self.max_distance
+        for r in range(row - reach, row + reach + 1):
+            for c in range(col - reach, col + reach + 1):
+                for lat_e7, lon_e7, name_offset, name_length in self._cell_records(r, c):
+                    distance = haversine(lat, lon, lat_e7 / 1e7, lon_e7 / 1e7)
+                    if distance <= best_distance:
+                        best_distance = distance
+                        position = self._names_at + name_offset
+                        best_name = self._map[position:position + name_length]
+        return best_name.decode('utf-8') if best_name is not None else None
+
+    def lookup(self, lat, lon):
+        """附近地点的名称，没有时返回None"""
+        key = (round(lat, self.precision), round(lon, self.precision))
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        if not self._loaded:
+            self._open()
+        name = self._search(*key) if self._map is not None else None
+
+        self._memo[key] = name
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return name
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def main(argv=None):
+    """命令行: python -m utils.gazetteer build 地点.json [gazetteer.bin] | lookup 纬度 经度"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 2 and argv[0] == 'build':
+        with open(argv[1], 'r', encoding='utf-8') as f:
+            pois = json.load(f)
+        path = argv[2] if len(argv) > 2 else 'gazetteer.bin'
+        print(f"Wrote {build_gazetteer(pois, path)} places to {path}")
+    elif len(argv) == 3 and argv[0] == 'lookup':
+        print(Gazetteer().lookup(float(argv[1]), float(argv[2])))
+    else:
+        print("Usage: python -m utils.gazetteer build places.json [gazetteer.bin] | lookup LAT LON")
+
+
+if __name__ == '__main__':
+    main()
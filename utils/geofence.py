@@ -0,0 +1,144 @@
+from math import sqrt, radians, sin, cos, atan2
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """计算两点间距离（米）"""
+    R = 6371000  # 地球半径
+
+    lat1_rad = radians(lat1)
+    lat2_rad = radians(lat2)
+    delta_lat = radians(lat2 - lat1)
+    delta_lon = radians(lon2 - lon1)
+
+    a = (sin(delta_lat / 2) * sin(delta_lat / 2) +
+         cos(lat1_rad) * cos(lat2_rad) *
+         sin(delta_lon / 2) * sin(delta_lon / 2))
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    return R * c
+
+
+class Geofence:
+    """单个地点的围栏（多边形或自定义半径圆形）"""
+
+    DEFAULT_RADIUS = 10  # 只有坐标点时的默认半径(米)，与原停留判定一致
+
+    def __init__(self, loc_id, loc_data):
+        self.id = loc_id
+        self.data = loc_data
+        self.name = loc_data.get('name', loc_id)
+        self.polygon = None
+        self.center = None
+        self.radius = None
+
+        if loc_data.get('polygon'):
+            # 多边形顶点: [[lat, lon], ...]
+            self.polygon = [tuple(p) for p in loc_data['polygon']]
+            lats = [p[0] for p in self.polygon]
+            lons = [p[1] for p in self.polygon]
+            self.center = (sum(lats) / len(lats), sum(lons) / len(lons))
+            self.bbox = (min(lats), min(lons), max(lats), max(lons))
+        else:
+            self.center = tuple(loc_data['coords'])
+            self.radius = float(loc_data.get('radius', self.DEFAULT_RADIUS))
+            # 把半径换算成经纬度，得到外接矩形
+            dlat = self.radius / 111320.0
+            dlon = self.radius / (111320.0 * max(cos(radians(self.center[0])), 1e-6))
+            self.bbox = (self.center[0] - dlat, self.center[1] - dlon,
+                         self.center[0] + dlat, self.center[1] + dlon)
+
+    def in_bbox(self, lat, lon):
+        """外接矩形预筛选"""
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+    def contains(self, lat, lon):
+        """精确判断点是否在围栏内"""
+        if not self.in_bbox(lat, lon):
+            return False
+        if self.polygon is None:
+            return haversine(lat, lon, self.center[0], self.center[1]) <= self.radius
+        return point_in_polygon(lat, lon, self.polygon)
+
+
+def point_in_polygon(lat, lon, polygon):
+    """射线法判断点是否在多边形内"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lon_i > lon) != (lon_j > lon):
+            cross_lat = (lat_j - lat_i) * (lon - lon_i) / (lon_j - lon_i) + lat_i
+            if lat < cross_lat:
+                inside = not inside
+        j = i
+    return inside
+
+
+class GeofenceIndex:
+    """所有地点围栏的集合，先用外接矩形筛选候选再做精确判断"""
+
+    def __init__(self, locations):
+        self.fences = []
+        for loc_id, loc_data in locations.items():
+            if 'coords' in loc_data or loc_data.get('polygon'):
+                try:
+                    self.fences.append(Geofence(loc_id, loc_data))
+                except Exception as e:
+                    print(f"Invalid geofence {loc_id}: {e}")
+
+    def candidates(self, lat, lon):
+        """外接矩形命中的候选围栏"""
+        return [f for f in self.fences if f.in_bbox(lat, lon)]
+
+    def locate(self, lat, lon):
+        """返回包含该点的围栏，多个命中时取中心最近的"""
+        best = None
+        best_distance = float('inf')
+        for fence in self.candidates(lat, lon):
+            if fence.contains(lat, lon):
+                distance = haversine(lat, lon, fence.center[0], fence.center[1])
+                if distance < best_distance:
+                    best_distance = distance
+                    best = fence
+        return best
+
+    def nearest(self, lat, lon, max_distance=100):
+        """查找最近的地点中心（用于显示，不做围栏判断）"""
+        best = None
+        best_distance = float('inf')
+        for fence in self.fences:
+            distance = haversine(lat, lon, fence.center[0], fence.center[1])
+            if distance < best_distance:
+                best_distance = distance
+                best = fence
+        return best if best_distance <= max_distance else None
+
+
+class GeofenceTracker:
+    """围栏状态机：只在进入/离开时产生事件"""
+
+    def __init__(self, index):
+        self.index = index
+        self.current = None       # 当前所在围栏
+        self.enter_time = None    # 进入时间
+
+    def update(self, lat, lon, timestamp):
+        """输入新定位，返回事件列表 [('exit', fence, enter_time), ('enter', fence, timestamp)]"""
+        events = []
+
+        # 仍在当前围栏内时只检查这一个，避免每次都全量匹配
+        if self.current is not None and self.current.contains(lat, lon):
+            return events
+
+        fence = self.index.locate(lat, lon)
+        if self.current is not None:
+            events.append(('exit', self.current, self.enter_time))
+            self.current = None
+            self.enter_time = None
+        if fence is not None:
+            self.current = fence
+            self.enter_time = timestamp
+            events.append(('enter', fence, timestamp))
+        return events
@@ -0,0 +1,143 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+
+try:
+    import numpy as np
+    HEATMAP_AVAILABLE = True
+except ImportError:
+    HEATMAP_AVAILABLE = False
+
+from .geofence import GeofenceIndex
+
+
+class HeatmapGrid:
+    """覆盖所有地点（外扩margin度）的固定分辨率网格"""
+
+    def __init__(self, min_lat, min_lon, max_lat, max_lon, cell_size=20):
+        self.min_lat = min_lat
+        self.min_lon = min_lon
+        self.max_lat = max_lat
+        self.max_lon = max_lon
+        self.cell_size = cell_size  # 米
+        self.lat_step = cell_size / 111320
+        self.lon_step = cell_size / (111320 * math.cos(math.radians((min_lat + max_lat) / 2)))
+        self.rows = max(1, int(math.ceil((max_lat - min_lat) / self.lat_step)))
+        self.cols = max(1, int(math.ceil((max_lon - min_lon) / self.lon_step)))
+
+    @classmethod
+    def around_places(cls, locations, margin=0.003, cell_size=20):
+        fences = GeofenceIndex(locations).fences
+        if not fences:
+            return None
+        return cls(min(f.bbox[0] for f in fences) - margin, min(f.bbox[1] for f in fences) - margin,
+                   max(f.bbox[2] for f in fences) + margin, max(f.bbox[3] for f in fences) + margin,
+                   cell_size)
+
+    @property
+    def fingerprint(self):
+        """网格定义的指纹，地点改变后旧的每日网格失效"""
+        spec = [round(v, 7) for v in (self.min_lat, self.min_lon, self.max_lat, self.max_lon)]
+        spec.append(self.cell_size)
+        return hashlib.sha1(json.dumps(spec).encode('utf-8')).hexdigest()[:12]
+
+    def bin(self, timestamps, lats, lons, max_gap=120):
+        """把定位点按停留时间累加到网格（秒），全部为数组运算
+
+        每个点的权重是到下一个点的时间间隔，间隔超过max_gap（信号中断）时按max_gap计算。
+        """
+        if len(timestamps) == 0:
+            return np.zeros((self.rows, self.cols), dtype=np.float32)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, lats, lons = timestamps[order], lats[order], lons[order]
+
+        weights = np.empty(len(timestamps), dtype=np.float64)
+        weights[:-1] = np.clip(np.diff(timestamps), 0, max_gap)
+        weights[-1] = 0
+
+        rows = np.floor((lats - self.min_lat) / self.lat_step).astype(np.int64)
+        cols = np.floor((lons - self.min_lon) / self.lon_step).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        flat = rows[inside] * self.cols + cols[inside]
+        counts = np.bincount(flat, weights=weights[inside], minlength=self.rows * self.cols)
+        return counts.reshape(self.rows, self.cols).astype(np.float32)
+
+
+class HeatmapStore:
+    """按天预先计算的停留时间热力图
+
+    已结束的日期保存为 heatmap/<网格指纹>/YYYY-MM-DD.npy，任意日期范围的热力图
+    就是这些数组的和；今天的数据每次重新计算。
+    """
+
+    def __init__(self, track_store, locations, root='heatmap', cell_size=20):
+        self.track_store = track_store
+        self.root = root
+        self.grid = None
+        if not HEATMAP_AVAILABLE:
+            print("numpy not available, heatmap disabled")
+        else:
+            self.grid = HeatmapGrid.around_places(locations, cell_size=cell_size)
+        self.grid_dir = None
+        if self.grid is not None:
+            self.grid_dir = os.path.join(root, self.grid.fingerprint)
+            os.makedirs(self.grid_dir, exist_ok=True)
+
+    @property
+    def available(self):
+        return self.grid is not None
+
+    def day_file(self, date):
+        return os.path.join(self.grid_dir, f'{date.isoformat()}.npy')
+
+    def compute_day(self, date):
+        """从轨迹历史计算某天的网格"""
+        points = np.array([(f.timestamp, f.lat, f.lon) for f in self.track_store.iter_day(date)],
+                          dtype=np.float64).reshape(-1, 3)
+        return self.grid.bin(points[:, 0], points[:, 1], points[:, 2])
+
+    def day_grid(self, date, today=None):
+        """某天的网格：已结束的日期读取或生成缓存文件"""
+        today = today or datetime.date.today()
+        if date >= today:
+            return self.compute_day(date)
+        path = self.day_file(date)
+        if os.path.exists(path):
+            try:
+                return np.load(path)
+            except Exception as e:
+                print(f"Failed to read heatmap {date}: {e}")
+        grid = self.compute_day(date)
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, grid)
+        os.replace(tmp_path, path)
+        return grid
+
+    def build(self, start_date=None, end_date=None, today=None):
+        """预先生成日期范围内有轨迹但还没有缓存的日期，返回生成的天数"""
+        if not self.available:
+            return 0
+        today = today or datetime.date.today()
+        end_date = min(end_date or today, today - datetime.timedelta(days=1))
+        built = 0
+        for date in self.track_store.days(start_date, end_date):
+            if not os.path.exists(self.day_file(date)):
+                self.day_grid(date, today)
+                built += 1
+        return built
+
+    def range_grid(self, start_date, end_date, today=None):
+        """日期范围内的停留时间网格（秒）"""
+        if not self.available:
+            return None
+        total = np.zeros((self.grid.rows, self.grid.cols), dtype=np.float64)
+        for date in self.track_store.days(start_date, end_date):
+            total += self.day_grid(date, today)
+        return total
+
+    def last_days(self, days=7, today=None):
+        """最近几天（包括今天）的网格"""
+        today = today or datetime.date.today()
+        return self.range_grid(today - datetime.timedelta(days=days - 1), today, today)
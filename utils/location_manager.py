@@ -1,12 +1,20 @@
 from kivy.clock import Clock
 from kivy.garden.mapview import MapView, MapMarker
 import time
-from math import sqrt, radians, sin, cos, atan2
+
+from .event_bus import RunEnded, RunStarted, SpeedChanged, StayEnded
+from .fix_pipeline import FixPipeline
+from .gazetteer import Gazetteer
+from .geofence import GeofenceIndex, GeofenceTracker, haversine
+from .map_matcher import MapMatcher
+from .records import Fix, Run
+from .state_journal import StateJournal
 
 
 class LocationManager:
     def __init__(self, app):
         self.app = app
+        self.events = getattr(app, 'events', None)  # 事件总线，界面订阅事件而不是被直接调用
         self.locations = []
         self.current_location = None
         self.last_location = None
@@ -14,12 +22,84 @@ class LocationManager:
         self.current_stay = None
         self.stay_start_time = None
         self.running_start_time = None
+        self.current_run = None  # 进行中的跑步记录
 
         # 从用户数据获取阈值
         self.speed_threshold = app.user_data.get('speed_threshold', 5.0)
         self.running_threshold = app.user_data.get('running_threshold', 3.0)
         self.stay_threshold = app.user_data.get('stay_threshold', 60)
 
+        # 定位点预处理链（去重、精度、跳点、降采样），配置见 user_data['fix_pipeline']
+        self.fix_pipeline = FixPipeline.from_config(app.user_data.get('fix_pipeline'))
+
+        # 地点围栏（多边形/自定义半径），状态机只在进出时产生事件
+        self.reload_geofences()
+
+        # 可选的道路图地图匹配（有 campus_paths.json 时启用），跑步距离按吸附后的点计算
+        self.map_matcher = MapMatcher.load()
+        self.last_matched = None
+
+        # 地点以外的停留：用离线地名库标注（第一次查询时才加载）
+        self.gazetteer = Gazetteer()
+        self.unnamed_stay = None  # (纬度, 经度, 开始时间, 最后时间)
+        self.unnamed_radius = 30  # 米
+
+        # 检测状态日志，进程被杀后恢复进行中的停留/跑步
+        self.journal = StateJournal()
+        self.restore_state()
+
+    def restore_state(self, max_gap=600, now=None):
+        """从状态日志恢复停留和跑步；中断超过max_gap秒的按最后定位时间结束并记录"""
+        try:
+            state = self.journal.load()
+        except Exception as e:
+            print(f"Failed to restore tracking state: {e}")
+            return
+        now = now or time.time()
+        last_seen = state.get('last_seen') or now
+        stale = now - last_seen > max_gap
+
+        stay = state.get('stay')
+        if stay:
+            fence = next((f for f in self.geofence_index.fences if f.id == stay['loc']), None)
+            if fence is None:
+                self.journal.record('exit', last_seen)
+            elif stale:
+                # 中断太久，停留到最后一次定位为止
+                if last_seen - stay['start'] >= self.stay_threshold:
+                    self.publish_stay(fence.data, stay['start'], last_seen)
+                self.journal.record('exit', last_seen)
+            else:
+                self.geofence_tracker.current = fence
+                self.geofence_tracker.enter_time = stay['start']
+                self.current_stay = fence.name
+                self.stay_start_time = stay['start']
+                print(f"Resumed stay at {fence.name}")
+
+        run_state = state.get('run')
+        if run_state:
+            run = Run(run_state['start'], run_state.get('speed', 0))
+            run.distance = run_state.get('distance', 0.0)
+            run.max_speed = run_state.get('max_speed', run.start_speed)
+            if stale:
+                run.end_time = last_seen
+                self.publish(RunEnded(run.start_time, run.duration, run.average_speed))
+                self.journal.record('run_end', last_seen)
+            else:
+                self.current_run = run
+                self.running_start_time = run.start_time
+                print("Resumed running session")
+        self.journal.checkpoint()
+
+    def save_state(self):
+        """暂停/退出时写出检测状态检查点"""
+        self.journal.checkpoint()
+
+    def reload_geofences(self):
+        """根据用户地点数据重建围栏索引"""
+        self.geofence_index = GeofenceIndex(self.app.user_data.get('locations', {}))
+        self.geofence_tracker = GeofenceTracker(self.geofence_index)
+
     def start_tracking(self):
         """开始位置跟踪"""
         try:
@@ -49,9 +129,10 @@ class LocationManager:
         lat = kwargs.get('lat')
         lon = kwargs.get('lon')
         speed = kwargs.get('speed', 0)
+        accuracy = kwargs.get('accuracy')
 
         if lat and lon:
-            self.process_new_location(lat, lon, speed)
+            self.process_new_location(lat, lon, speed, accuracy)
 
     def simulate_location(self, dt):
         """模拟位置数据（用于测试）"""
@@ -64,25 +145,44 @@ class LocationManager:
 
         self.process_new_location(lat, lon, speed)
 
-    def process_new_location(self, lat, lon, speed):
+    def process_new_location(self, lat, lon, speed, accuracy=None):
         """处理新位置数据"""
         current_time = time.time()
-        new_location = (lat, lon, speed, current_time)
+        new_location = Fix(current_time, lat, lon, speed, accuracy)
+
+        # 重复、精度差和跳点在这里丢弃，不进入后面的检测
+        if not self.fix_pipeline.process(new_location):
+            return
 
         # 添加到位置历史
         self.locations.append(new_location)
         if len(self.locations) > 1000:
             self.locations = self.locations[-1000:]
 
-        # 更新当前速度
-        if self.app.tracking_tab:
-            self.app.tracking_tab.update_current_speed(speed)
+        # 写入轨迹历史（批量落盘）
+        track_store = getattr(self.app, 'track_store', None)
+        if track_store is not None:
+            track_store.append(lat, lon, speed, current_time)
+        speed_series = getattr(self.app, 'speed_series', None)
+        if speed_series is not None:
+            speed_series.add(new_location)
+
+        # 地图匹配（结果有几个点的延迟）
+        if self.map_matcher is not None:
+            self.add_matched_fixes(self.map_matcher.update(new_location))
+
+        # 更新当前速度（一帧内只显示最新的）
+        self.publish(SpeedChanged(speed, current_time))
 
         # 检查位置停留
         self.check_location_stay(lat, lon, current_time)
+        self.check_unnamed_stay(lat, lon, current_time)
 
         # 检查跑步状态
-        self.check_running_status(speed, current_time)
+        self.check_running_status(speed, current_time, lat, lon)
+
+        # 状态日志心跳（只在写入间隔到达时写盘）
+        self.journal.heartbeat(current_time, self.current_run)
 
         # 更新最后位置
         self.last_location = (lat, lon)
@@ -90,46 +190,46 @@ class LocationManager:
 
     def check_location_stay(self, lat, lon, current_time):
         """检查位置停留"""
-        predefined_locations = self.app.user_data['locations']
-        nearest_location = self.find_nearest_location(lat, lon, predefined_locations)
-
-        if nearest_location and self.is_within_radius(lat, lon, nearest_location['coords'], 10):
-            # 在预定义地点附近
-            if self.current_stay != nearest_location['name']:
-                # 新地点停留开始
-                self.current_stay = nearest_location['name']
-                self.stay_start_time = current_time
-            else:
-                # 继续在同一地点停留
-                stay_duration = current_time - self.stay_start_time
-                if stay_duration >= self.stay_threshold:
-                    # 停留时间超过阈值，记录活动
-                    self.record_stay_activity(nearest_location, stay_duration)
-        else:
-            # 不在预定义地点或离开地点
-            if self.current_stay:
-                # 结束当前停留
-                stay_duration = current_time - self.stay_start_time
-                if stay_duration >= self.stay_threshold:
-                    self.record_leave_activity(self.current_stay, stay_duration)
+        for event, fence, event_time in self.geofence_tracker.update(lat, lon, current_time):
+            if event == 'exit':
+                # 离开地点，停留超过阈值时记录一次
+                if current_time - event_time >= self.stay_threshold:
+                    self.publish_stay(fence.data, event_time, current_time)
                 self.current_stay = None
                 self.stay_start_time = None
+                self.journal.record('exit', current_time)
+            elif event == 'enter':
+                # 新地点停留开始
+                self.current_stay = fence.name
+                self.stay_start_time = event_time
+                self.journal.record('enter', event_time, loc=fence.id)
 
-    def find_nearest_location(self, lat, lon, locations):
-        """查找最近的定义位置"""
-        nearest = None
-        min_distance = float('inf')
+    def check_unnamed_stay(self, lat, lon, current_time):
+        """检查在预设地点以外的停留，离开时记录一次"""
+        stay = self.unnamed_stay
+        if stay is not None:
+            inside = self.geofence_tracker.current is None and \
+                haversine(stay[0], stay[1], lat, lon) <= self.unnamed_radius
+            if inside:
+                self.unnamed_stay = (stay[0], stay[1], stay[2], current_time)
+                return
+            # 离开停留范围（或进入了预设地点）
+            if stay[3] - stay[2] >= self.stay_threshold:
+                self.publish(StayEnded(self.describe_position(stay[0], stay[1]), 'stay', stay[2], stay[3]))
+            self.unnamed_stay = None
+
+        if self.geofence_tracker.current is None:
+            self.unnamed_stay = (lat, lon, current_time, current_time)
 
-        for loc_id, loc_data in locations.items():
-            if 'coords' in loc_data:
-                loc_lat, loc_lon = loc_data['coords']
-                distance = self.calculate_distance(lat, lon, loc_lat, loc_lon)
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest = loc_data
-                    nearest['id'] = loc_id
+    def describe_position(self, lat, lon):
+        """位置描述：附近地点名称，没有时显示坐标"""
+        name = self.gazetteer.lookup(lat, lon)
+        return name or f"{lat:.5f}, {lon:.5f}"
 
-        return nearest if min_distance <= 100 else None  # 100米范围内
+    def find_nearest_location(self, lat, lon, locations=None):
+        """查找最近的定义位置"""
+        fence = self.geofence_index.nearest(lat, lon, 100)  # 100米范围内
+        return fence.data if fence else None
 
     def is_within_radius(self, lat1, lon1, coords2, radius_meters):
         """检查是否在指定半径内"""
@@ -139,45 +239,54 @@ class LocationManager:
 
     def calculate_distance(self, lat1, lon1, lat2, lon2):
         """计算两点间距离（米）"""
-        R = 6371000  # 地球半径
-
-        lat1_rad = radians(lat1)
-        lat2_rad = radians(lat2)
-        delta_lat = radians(lat2 - lat1)
-        delta_lon = radians(lon2 - lon1)
+        return haversine(lat1, lon1, lat2, lon2)
 
-        a = (sin(delta_lat / 2) * sin(delta_lat / 2) +
-             cos(lat1_rad) * cos(lat2_rad) *
-             sin(delta_lon / 2) * sin(delta_lon / 2))
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-        return R * c
-
-    def check_running_status(self, speed, current_time):
+    def check_running_status(self, speed, current_time, lat=None, lon=None):
         """检查跑步状态"""
         if speed > self.running_threshold:
             if self.running_start_time is None:
                 # 开始跑步
                 self.running_start_time = current_time
-                if self.app.tracking_tab:
-                    self.app.tracking_tab.add_running_start_log(speed)
+                self.current_run = Run(current_time, speed)
+                self.journal.record('run_start', current_time, speed=speed)
+                self.publish(RunStarted(speed, current_time))
+            elif self.current_run is not None:
+                # 累计跑步距离（启用地图匹配时由add_matched_fixes累计）
+                if self.map_matcher is None and lat is not None and self.last_location:
+                    self.current_run.distance += self.calculate_distance(
+                        self.last_location[0], self.last_location[1], lat, lon
+                    )
+                self.current_run.max_speed = max(self.current_run.max_speed, speed)
         else:
             if self.running_start_time is not None:
                 # 结束跑步
-                duration = current_time - self.running_start_time
-                if self.app.tracking_tab:
-                    self.app.tracking_tab.add_running_end_log(duration, speed)
+                if self.map_matcher is not None:
+                    # 取出窗口内还没确定的匹配点，计入本次跑步
+                    self.add_matched_fixes(self.map_matcher.flush())
+                run = self.current_run or Run(self.running_start_time, speed)
+                run.end_time = current_time
+                self.publish(RunEnded(run.start_time, run.duration, run.average_speed))
                 self.running_start_time = None
+                self.current_run = None
+                self.journal.record('run_end', current_time)
+
+    def add_matched_fixes(self, matched):
+        """用吸附到道路上的点累计跑步距离"""
+        for fix in matched:
+            run = self.current_run
+            if run is not None and fix.timestamp >= run.start_time and self.last_matched is not None:
+                if self.last_matched.timestamp >= run.start_time:
+                    run.distance += haversine(self.last_matched.lat, self.last_matched.lon,
+                                              fix.lat, fix.lon)
+            self.last_matched = fix
+
+    def publish(self, event):
+        """发布事件（没有事件总线时忽略）"""
+        if self.events is not None:
+            self.events.publish(event)
 
-    def record_stay_activity(self, location, duration):
-        """记录停留活动"""
-        if self.app.schedule_tab:
-            # 自动选择第一个可用事件类型
-            events = location.get('events', ['stay'])
-            event_type = events[0]
-
-            self.app.schedule_tab.record_activity(
-                location['name'],
-                event_type,
-                int(duration)
-            )
\ No newline at end of file
+    def publish_stay(self, location, start_ts, end_ts):
+        """预设地点的一次停留结束"""
+        # 自动选择第一个可用事件类型
+        event_type = location.get('events', ['stay'])[0]
+        self.publish(StayEnded(location['name'], event_type, start_ts, end_ts, location))
@@ -0,0 +1,227 @@
+import heapq
+import json
+import math
+import os
+
+from .records import Fix
+
+EARTH_RADIUS = 6371000  # 地球半径(米)
+
+
+class PathGraph:
+    """校园道路图
+
+    文件格式: {"nodes": {"id": [lat, lon], ...}, "edges": [["a", "b"], ...]}
+    坐标在加载时投影到以图中心为原点的平面(米)，道路段按网格建立空间索引。
+    """
+
+    def __init__(self, nodes, edges, cell_size=50):
+        self.cell_size = cell_size
+        lats = [p[0] for p in nodes.values()]
+        lons = [p[1] for p in nodes.values()]
+        self.ref_lat = sum(lats) / len(lats)
+        self.ref_lon = sum(lons) / len(lons)
+        self._kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(self.ref_lat))
+        self._ky = math.radians(1) * EARTH_RADIUS
+
+        self.nodes = {node_id: self.project(lat, lon) for node_id, (lat, lon) in nodes.items()}
+        self.edges = []       # (起点id, 终点id, 长度)
+        self.adjacency = {}   # 节点id -> [(相邻节点id, 长度)]
+        self.grid = {}        # (格子x, 格子y) -> [道路段序号]
+        for a, b in edges:
+            (ax, ay), (bx, by) = self.nodes[a], self.nodes[b]
+            length = math.hypot(bx - ax, by - ay)
+            edge_id = len(self.edges)
+            self.edges.append((a, b, length))
+            self.adjacency.setdefault(a, []).append((b, length))
+            self.adjacency.setdefault(b, []).append((a, length))
+            for cell in self._cells(min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)):
+                self.grid.setdefault(cell, []).append(edge_id)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['nodes'], data['edges'])
+
+    def project(self, lat, lon):
+        """经纬度 -> 平面坐标(米)"""
+        return (lon - self.ref_lon) * self._kx, (lat - self.ref_lat) * self._ky
+
+    def unproject(self, x, y):
+        """平面坐标(米) -> 经纬度"""
+        return self.ref_lat + y / self._ky, self.ref_lon + x / self._kx
+
+    def _cells(self, min_x, min_y, max_x, max_y):
+        size = self.cell_size
+        for cx in range(int(math.floor(min_x / size)), int(math.floor(max_x / size)) + 1):
+            for cy in range(int(math.floor(min_y / size)), int(math.floor(max_y / size)) + 1):
+                yield cx, cy
+
+    def candidates(self, x, y, radius, limit):
+        """半径内最近的若干个道路段投影点 [(距离, 道路段序号, 距起点长度, 投影x, 投影y)]"""
+        seen = set()
+        found = []
+        for cell in self._cells(x - radius, y - radius, x + radius, y + radius):
+            for edge_id in self.grid.get(cell, ()):
+                if edge_id in seen:
+                    continue
+                seen.add(edge_id)
+                a, b, length = self.edges[edge_id]
+                (ax, ay), (bx, by) = self.nodes[a], self.nodes[b]
+                if length > 0:
+                    t = ((x - ax) * (bx - ax) + (y - ay) * (by - ay)) / (length * length)
+                    t = min(1.0, max(0.0, t))
+                else:
+                    t = 0.0
+                px, py = ax + t * (bx - ax), ay + t * (by - ay)
+                distance = math.hypot(x - px, y - py)
+                if distance <= radius:
+                    found.append((distance, edge_id, t * length, px, py))
+        return heapq.nsmallest(limit, found)
+
+    def route_distance(self, edge1, offset1, edge2, offset2, limit, max_expansions=200):
+        """两个道路段上的点之间的道路距离，超过limit时返回None"""
+        if edge1 == edge2:
+            return abs(offset2 - offset1)
+
+        a1, b1, length1 = self.edges[edge1]
+        a2, b2, length2 = self.edges[edge2]
+        targets = {a2: offset2, b2: length2 - offset2}
+
+        # 从起点所在道路段的两个端点出发做有界Dijkstra
+        best = {a1: offset1, b1: length1 - offset1}
+        heap = [(cost, node) for node, cost in best.items()]
+        heapq.heapify(heap)
+        result = None
+        expansions = 0
+        while heap and expansions < max_expansions:
+            cost, node = heapq.heappop(heap)
+            if cost > best.get(node, math.inf) or cost > limit:
+                continue
+            expansions += 1
+            if node in targets:
+                total = cost + targets[node]
+                if result is None or total < result:
+                    result = total
+            for neighbor, length in self.adjacency.get(node, ()):
+                new_cost = cost + length
+                if new_cost < best.get(neighbor, math.inf) and new_cost <= limit:
+                    best[neighbor] = new_cost
+                    heapq.heappush(heap, (new_cost, neighbor))
+        if result is not None and result <= limit:
+            return result
+        return None
+
+
+class MapMatcher:
+    """流式地图匹配：把定位点吸附到道路图上
+
+    隐马尔可夫模型：观测概率取决于定位点到道路的距离，转移概率取决于
+    道路距离与直线距离之差。用固定延迟的Viterbi解码，窗口满时输出最早的点，
+    每个定位点的计算量受候选数、窗口长度和Dijkstra扩展节点数限制。
+    """
+
+    def __init__(self, graph, search_radius=40, max_candidates=5, lag=5,
+                 sigma=8.0, beta=10.0):
+        self.graph = graph
+        self.search_radius = search_radius  # 候选道路搜索半径(米)
+        self.max_candidates = max_candidates
+        self.lag = lag                      # 输出延迟(定位点个数)
+        self.sigma = sigma                  # GPS误差标准差(米)
+        self.beta = beta                    # 转移概率参数(米)
+        self._window = []  # [(定位点, 候选列表, 累计得分, 回溯指针)]
+
+    @classmethod
+    def load(cls, path='campus_paths.json', **kwargs):
+        """从文件加载道路图，文件不存在时返回None（不启用地图匹配）"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(PathGraph.load(path), **kwargs)
+        except Exception as e:
+            print(f"Failed to load path graph: {e}")
+            return None
+
+    def _emission(self, distance):
+        return -0.5 * (distance / self.sigma) ** 2
+
+    def update(self, fix):
+        """输入一个定位点，返回已确定的匹配结果列表（Fix，坐标为吸附后的位置）"""
+        x, y = self.graph.project(fix.lat, fix.lon)
+        candidates = self.graph.candidates(x, y, self.search_radius, self.max_candidates)
+        if not candidates:
+            # 离开道路图：输出窗口内的结果，本点保持原样
+            return self.flush() + [fix]
+
+        emissions = [self._emission(c[0]) for c in candidates]
+        if not self._window:
+            self._window.append((fix, candidates, emissions, None))
+            return []
+
+        prev_fix, prev_candidates, prev_scores, _ = self._window[-1]
+        px, py = self.graph.project(prev_fix.lat, prev_fix.lon)
+        straight = math.hypot(x - px, y - py)
+        limit = straight * 2 + self.search_radius * 2
+
+        scores = []
+        back = []
+        for j, cand in enumerate(candidates):
+            best_score, best_i = -math.inf, None
+            for i, prev in enumerate(prev_candidates):
+                route = self.graph.route_distance(prev[1], prev[2], cand[1], cand[2], limit)
+                if route is None:
+                    continue
+                score = prev_scores[i] - abs(route - straight) / self.beta
+                if score > best_score:
+                    best_score, best_i = score, i
+            scores.append(best_score + emissions[j])
+            back.append(best_i)
+
+        if all(i is None for i in back):
+            # 道路不连通：结束当前窗口，从本点重新开始
+            result = self.flush()
+            self._window.append((fix, candidates, emissions, None))
+            return result
+
+        # 归一化避免得分无限下降
+        top = max(scores)
+        scores = [s - top for s in scores]
+        self._window.append((fix, candidates, scores, back))
+
+        if len(self._window) > self.lag:
+            path = self._best_path()
+            committed = self._snap(self._window[0], path[0])
+            # 最早的点已确定，后一个点成为新的起点
+            self._window.pop(0)
+            fix1, cands1, scores1, _ = self._window[0]
+            self._window[0] = (fix1, cands1, scores1, None)
+            return [committed]
+        return []
+
+    def _best_path(self):
+        """从当前得分最高的候选回溯整个窗口，返回每步的候选序号"""
+        scores = self._window[-1][2]
+        state = max(range(len(scores)), key=lambda k: scores[k])
+        path = [state]
+        for step in range(len(self._window) - 1, 0, -1):
+            back = self._window[step][3]
+            state = back[state] if back[state] is not None else 0
+            path.append(state)
+        path.reverse()
+        return path
+
+    def _snap(self, step, index):
+        fix, candidates = step[0], step[1]
+        _, _, _, px, py = candidates[index]
+        lat, lon = self.graph.unproject(px, py)
+        return Fix(fix.timestamp, lat, lon, fix.speed)
+
+    def flush(self):
+        """输出窗口内所有点的匹配结果并清空窗口"""
+        if not self._window:
+            return []
+        path = self._best_path()
+        result = [self._snap(step, index) for step, index in zip(self._window, path)]
+        self._window = []
+        return result
@@ -0,0 +1,50 @@
+from kivy.clock import Clock
+from kivy.garden.mapview import MapMarker, MapSource, MapView
+
+from .geofence import GeofenceIndex
+
+
+class CachedMapSource(MapSource):
+    """MapView的瓦片源：先查磁盘瓦片缓存，未命中时由TileFetcher的有界线程池下载
+
+    替换mapview自带的下载器（它不限制缓存大小，每次都按自己的文件名单独缓存）。
+    """
+
+    def __init__(self, fetcher, **kwargs):
+        kwargs.setdefault('cache_key', 'dailytracker')
+        super().__init__(url=fetcher.url_template, **kwargs)
+        self.fetcher = fetcher
+
+    def fill_tile(self, tile):
+        if tile.state == 'done':
+            return
+        zoom, x = tile.zoom, tile.tile_x
+        y = self.get_row_count(zoom) - tile.tile_y - 1  # MapView的行号从下往上数
+        future = self.fetcher.fetch_async(zoom, x, y)
+        # 线程池中完成，回到主线程设置瓦片图片
+        future.add_done_callback(
+            lambda f: Clock.schedule_once(lambda dt: self._tile_loaded(tile, zoom, x, y, f))
+        )
+
+    def _tile_loaded(self, tile, zoom, x, y, future):
+        try:
+            data = future.result()
+        except Exception as e:
+            print(f"Tile load failed {zoom}/{x}/{y}: {e}")
+            return
+        if data is not None and tile.state != 'done':
+            tile.set_source(self.fetcher.cache.path(zoom, x, y))
+
+
+def create_map_view(fetcher, locations, zoom=16):
+    """以所有地点为中心的地图，瓦片走缓存，每个地点一个标记"""
+    fences = GeofenceIndex(locations).fences
+    if fences:
+        lat = sum(f.center[0] for f in fences) / len(fences)
+        lon = sum(f.center[1] for f in fences) / len(fences)
+    else:
+        lat, lon = 31.0258, 121.4376  # 上海交大
+    map_view = MapView(lat=lat, lon=lon, zoom=zoom, map_source=CachedMapSource(fetcher))
+    for fence in fences:
+        map_view.add_marker(MapMarker(lat=fence.center[0], lon=fence.center[1]))
+    return map_view
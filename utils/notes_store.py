@@ -0,0 +1,148 @@
+import datetime
+import json
+import os
+import re
+import uuid
+
+from .records import Note
+
+# 拉丁字母/数字按单词切分，中日韩文字按单字+相邻二字切分
+_WORD_RE = re.compile(r'[0-9a-z]+')
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+
+
+def tokenize(text):
+    """把文本切分为索引词"""
+    text = (text or '').lower()
+    tokens = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _query_terms(text):
+    """查询词：中文连续片段只用二字词，避免单字匹配过宽"""
+    text = (text or '').lower()
+    terms = set(_WORD_RE.findall(text))
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.add(run)
+        else:
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class NotesStore:
+    """独立的备注存储，带增量维护的倒排索引
+
+    备注和索引都是只追加的JSON Lines文件：新增一条备注只追加这条备注
+    和它的索引词，不会重写已有内容。
+    """
+
+    def __init__(self, root='notes'):
+        self.notes_file = os.path.join(root, 'notes.jsonl')
+        self.index_file = os.path.join(root, 'index.jsonl')
+        os.makedirs(root, exist_ok=True)
+
+        self.notes = {}        # 备注id -> 备注
+        self.by_activity = {}  # 活动id -> [备注id]
+        self.index = {}        # 索引词 -> {备注id}
+        self.loaded = False    # 首次查询时才读取文件
+
+    def load(self):
+        """读取备注和索引"""
+        if self.loaded:
+            return
+        self.loaded = True
+        for data in self._read_lines(self.notes_file):
+            self._add_to_memory(Note.from_dict(data))
+
+        for posting in self._read_lines(self.index_file):
+            for token in posting.get('tokens', []):
+                self.index.setdefault(token, set()).add(posting['id'])
+
+    def _read_lines(self, path):
+        """逐行读取JSON Lines文件，跳过损坏的行"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    print(f"Skipping corrupt line in {path}")
+
+    def _append_line(self, path, record):
+        """追加一行并立即落盘"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _add_to_memory(self, note):
+        """把备注加入内存结构"""
+        self.notes[note.id] = note
+        if note.activity_id:
+            self.by_activity.setdefault(note.activity_id, []).append(note.id)
+
+    def add(self, activity_id, text, image=None, timestamp=None):
+        """新增备注，只写入这条备注和它的索引词"""
+        note = Note(
+            id=uuid.uuid4().hex,
+            timestamp=timestamp or datetime.datetime.now().isoformat(),
+            activity_id=activity_id,
+            text=text,
+            image=image
+        )
+        tokens = sorted(tokenize(text))
+
+        self._append_line(self.notes_file, note.to_dict())
+        self._append_line(self.index_file, {'id': note.id, 'tokens': tokens})
+
+        # 尚未加载时不需要更新内存，之后加载会读到这条备注
+        if self.loaded:
+            self._add_to_memory(note)
+            for token in tokens:
+                self.index.setdefault(token, set()).add(note.id)
+        return note
+
+    def for_activity(self, activity_id):
+        """某条活动的全部备注（按时间顺序）"""
+        self.load()
+        return [self.notes[i] for i in self.by_activity.get(activity_id, [])]
+
+    def search(self, query, limit=50):
+        """全文搜索，返回同时包含所有查询词的备注（最新的在前）"""
+        terms = _query_terms(query)
+        if not terms:
+            return []
+        self.load()
+
+        # 从最短的倒排表开始求交集
+        postings = sorted((self.index.get(t, set()) for t in terms), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+
+        notes = [self.notes[i] for i in result if i in self.notes]
+        notes.sort(key=lambda n: n.timestamp, reverse=True)
+        return notes[:limit]
+
+    def import_legacy(self, notes, find_activity_id=None):
+        """迁移旧版user_data['notes']中的备注
+
+        旧备注保存的是活动字段的副本（没有id），由find_activity_id按这些字段找到活动id。
+        """
+        for note in notes:
+            activity = note.get('activity')
+            if isinstance(activity, dict):
+                activity_id = activity.get('id')
+                if not activity_id and find_activity_id is not None:
+                    activity_id = find_activity_id(activity)
+            else:
+                activity_id = activity
+            self.add(activity_id, note.get('text', ''), note.get('image'), note.get('timestamp'))
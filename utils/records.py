@@ -0,0 +1,162 @@
+import datetime
+
+
+class Fix:
+    """一个定位点"""
+    __slots__ = ('timestamp', 'lat', 'lon', 'speed', 'accuracy')
+
+    def __init__(self, timestamp, lat, lon, speed=0.0, accuracy=None):
+        self.timestamp = timestamp
+        self.lat = lat
+        self.lon = lon
+        self.speed = speed
+        self.accuracy = accuracy  # 定位精度(米)，未知时为None
+
+    def __iter__(self):
+        # 支持 ts, lat, lon, speed = fix 的解包写法
+        yield self.timestamp
+        yield self.lat
+        yield self.lon
+        yield self.speed
+
+    def __repr__(self):
+        return f"Fix({self.timestamp:.3f}, {self.lat:.7f}, {self.lon:.7f}, {self.speed:.2f})"
+
+
+class Activity:
+    """一条活动记录（开始/结束为时间戳，显示用的日期和时间在读取时再格式化）"""
+    __slots__ = ('id', 'location', 'event_type', 'start_ts', 'end_ts')
+
+    def __init__(self, id, location, event_type, start_ts, end_ts):
+        self.id = id
+        self.location = location
+        self.event_type = event_type
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+
+    @classmethod
+    def from_dict(cls, data):
+        """从保存的字典创建；没有有效日期的旧格式记录抛出ValueError"""
+        start_ts, end_ts = data.get('start_ts'), data.get('end_ts')
+        if start_ts is None or end_ts is None:
+            start_ts, end_ts = _legacy_times(data)
+        return cls(
+            data.get('id'),
+            data.get('location', 'unknown'),
+            data.get('event_type', 'unknown'),
+            start_ts,
+            end_ts
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @property
+    def duration(self):
+        """时长(秒)"""
+        return int(round(self.end_ts - self.start_ts))
+
+    @property
+    def date(self):
+        """结束时的本地日期 'YYYY-MM-DD'"""
+        return datetime.datetime.fromtimestamp(self.end_ts).strftime('%Y-%m-%d')
+
+    @property
+    def start_time(self):
+        return datetime.datetime.fromtimestamp(self.start_ts).strftime('%H:%M')
+
+    @property
+    def end_time(self):
+        return datetime.datetime.fromtimestamp(self.end_ts).strftime('%H:%M')
+
+    def __repr__(self):
+        return f"Activity({self.date} {self.start_time}-{self.end_time} {self.location} {self.event_type})"
+
+
+def _legacy_times(data):
+    """旧格式（date + 'HH:MM' + duration）转换为时间戳
+
+    旧记录的date和end_time都是记录时刻，开始时间由时长倒推，跨午夜的活动也能还原。
+    没有日期或日期无法解析时抛出ValueError，由调用方原样保留该记录。
+    """
+    duration = data.get('duration', 0) or 0
+    try:
+        day = datetime.datetime.strptime(data.get('date') or '', '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"Legacy activity without a valid date: {data.get('date')!r}")
+    try:
+        end = datetime.datetime.strptime(data.get('end_time', ''), '%H:%M').time()
+        day = datetime.datetime.combine(day.date(), end)
+    except ValueError:
+        pass
+    end_ts = day.timestamp()
+    return end_ts - duration, end_ts
+
+
+class Run:
+    """一次跑步"""
+    __slots__ = ('start_time', 'end_time', 'start_speed', 'max_speed', 'distance')
+
+    def __init__(self, start_time, start_speed):
+        self.start_time = start_time
+        self.end_time = None
+        self.start_speed = start_speed
+        self.max_speed = start_speed
+        self.distance = 0.0  # 米
+
+    @property
+    def duration(self):
+        return (self.end_time or self.start_time) - self.start_time
+
+    @property
+    def average_speed(self):
+        return self.distance / self.duration if self.duration > 0 else self.start_speed
+
+    def __repr__(self):
+        return f"Run({self.duration:.0f}s, {self.distance:.0f}m)"
+
+
+class Note:
+    """一条活动备注"""
+    __slots__ = ('id', 'timestamp', 'activity_id', 'text', 'image')
+
+    def __init__(self, id, timestamp, activity_id, text, image=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.activity_id = activity_id
+        self.text = text
+        self.image = image
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data.get('timestamp', ''), data.get('activity_id'),
+                   data.get('text', ''), data.get('image'))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Note({self.timestamp} {self.text[:20]!r})"
+
+
+class Reminder:
+    """一条行程提醒（repeat: 'none' / 'daily' / 'weekly'）"""
+    __slots__ = ('id', 'title', 'due', 'repeat', 'note')
+
+    def __init__(self, id, title, due, repeat='none', note=''):
+        self.id = id
+        self.title = title
+        self.due = due  # 下次提醒的时间戳
+        self.repeat = repeat
+        self.note = note
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data.get('title', ''), data.get('due', 0),
+                   data.get('repeat', 'none'), data.get('note', ''))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"Reminder({self.title!r} at {self.due:.0f}, {self.repeat})"
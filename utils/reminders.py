@@ -0,0 +1,171 @@
+import datetime
+import heapq
+import json
+import os
+import time
+import uuid
+
+from kivy.clock import Clock
+
+from .records import Reminder
+
+REPEAT_DAYS = {'daily': 1, 'weekly': 7}
+
+
+def next_occurrence(reminder, now):
+    """重复提醒在now之后的下一次时间（按本地时间推算，跨夏令时不漂移）"""
+    step = REPEAT_DAYS.get(reminder.repeat)
+    if not step:
+        return None
+    due = datetime.datetime.fromtimestamp(reminder.due)
+    current = datetime.datetime.fromtimestamp(now)
+    # 直接跳过错过的周期，不逐个展开
+    periods = max(1, (current - due).days // step + 1)
+    due += datetime.timedelta(days=step * periods)
+    while due.timestamp() <= now:
+        due += datetime.timedelta(days=step)
+    return due.timestamp()
+
+
+class ReminderScheduler:
+    """持久化的行程提醒调度器
+
+    提醒保存在 reminders.json 中，内存里用最小堆按时间排序：启动时 heapify
+    一次建堆，任何时候只有堆顶的提醒持有一个Clock定时器。重复提醒只保存下一次
+    的时间，触发后再计算下一次（惰性展开）。删除和改期不在堆中查找，旧的堆项
+    在弹出时按时间不符丢弃。
+    """
+
+    MAX_WAIT = 600  # 定时器最长等待(秒)，防止系统休眠或改时间后错过提醒
+
+    def __init__(self, data_file='reminders.json', on_fire=None):
+        self.data_file = data_file
+        self.on_fire = on_fire  # on_fire(reminder, missed)
+        self.reminders = {}     # id -> Reminder
+        self._heap = []         # (时间戳, id)
+        self._event = None
+
+    def load(self):
+        """读取提醒并建堆（O(n)）"""
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.reminders = {}
+            for item in data.get('reminders', []):
+                reminder = Reminder.from_dict(item)
+                self.reminders[reminder.id] = reminder
+        except FileNotFoundError:
+            self.reminders = {}
+        except Exception as e:
+            print(f"Failed to load reminders: {e}")
+            self.reminders = {}
+
+        self._heap = [(r.due, r.id) for r in self.reminders.values()]
+        heapq.heapify(self._heap)
+
+    def save(self):
+        """原子写入提醒文件"""
+        try:
+            tmp_path = self.data_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'reminders': [r.to_dict() for r in self.reminders.values()]},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.data_file)
+        except Exception as e:
+            print(f"Failed to save reminders: {e}")
+
+    def add(self, title, due, repeat='none', note=''):
+        """添加提醒，返回Reminder"""
+        if repeat != 'none' and repeat not in REPEAT_DAYS:
+            raise ValueError(f"Unknown repeat: {repeat}")
+        reminder = Reminder(uuid.uuid4().hex, title, due, repeat, note)
+        self.reminders[reminder.id] = reminder
+        heapq.heappush(self._heap, (reminder.due, reminder.id))
+        self.save()
+        self.arm()
+        return reminder
+
+    def remove(self, reminder_id):
+        """删除提醒（堆中的旧项在弹出时丢弃）"""
+        if self.reminders.pop(reminder_id, None) is not None:
+            self.save()
+            self.arm()
+
+    def reschedule(self, reminder_id, due):
+        """修改提醒时间"""
+        reminder = self.reminders.get(reminder_id)
+        if reminder is None:
+            return
+        reminder.due = due
+        heapq.heappush(self._heap, (due, reminder_id))
+        self.save()
+        self.arm()
+
+    def _peek(self):
+        """堆顶的有效提醒（顺便丢弃已删除或已改期的旧项）"""
+        while self._heap:
+            due, reminder_id = self._heap[0]
+            reminder = self.reminders.get(reminder_id)
+            if reminder is not None and reminder.due == due:
+                return reminder
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due(self):
+        """下一条要触发的提醒"""
+        return self._peek()
+
+    def upcoming(self, limit=5):
+        """接下来的几条提醒（按时间顺序）"""
+        return sorted(self.reminders.values(), key=lambda r: r.due)[:limit]
+
+    def arm(self):
+        """只给堆顶提醒设置一个定时器"""
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+        reminder = self._peek()
+        if reminder is None:
+            return
+        wait = min(max(0, reminder.due - time.time()), self.MAX_WAIT)
+        self._event = Clock.schedule_once(self._on_timer, wait)
+
+    def _on_timer(self, dt):
+        self._event = None
+        self.check()
+
+    def check(self, now=None):
+        """触发所有已到期的提醒（恢复运行时调用以补发错过的提醒），返回触发的条数"""
+        now = now or time.time()
+        fired = []
+        while True:
+            reminder = self._peek()
+            if reminder is None or reminder.due > now:
+                break
+            heapq.heappop(self._heap)
+            # 超过一分钟才触发的视为错过的提醒
+            fired.append((reminder, now - reminder.due > 60))
+
+            next_due = next_occurrence(reminder, now)
+            if next_due is None:
+                del self.reminders[reminder.id]
+            else:
+                reminder.due = next_due
+                heapq.heappush(self._heap, (next_due, reminder.id))
+
+        if fired:
+            self.save()
+            for reminder, missed in fired:
+                if self.on_fire:
+                    try:
+                        self.on_fire(reminder, missed)
+                    except Exception as e:
+                        print(f"Reminder callback failed: {e}")
+        self.arm()
+        return len(fired)
+
+    def stop(self):
+        """取消定时器"""
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
@@ -0,0 +1,239 @@
+import asyncio
+import concurrent.futures
+import random
+
+from kivy import platform
+
+
+class ServiceManager:
+    """基于asyncio的后台服务编排
+
+    运行在Kivy的asyncio事件循环上（与界面同一线程），各服务是独立的任务：
+    持久化、天气、闹钟和定位。阻塞调用（网络请求、读闹钟、写文件）放到
+    线程中执行，定位数据通过队列交给定位任务处理，界面不会被任何服务阻塞。
+    """
+
+    WEATHER_INTERVAL = 30 * 60  # 天气刷新间隔(秒)
+    FLUSH_INTERVAL = 30         # 轨迹缓冲写盘间隔(秒)
+    SYNC_INTERVAL = 15 * 60     # 增量同步间隔(秒)
+    HEATMAP_DAYS = 7            # 热力图覆盖的天数
+    SIMULATION_INTERVAL = 10    # 桌面模拟定位间隔(秒)
+
+    def __init__(self, app):
+        self.app = app
+        self.tasks = {}
+        self.save_queue = None
+        self.fix_queue = None
+        self.loop = None
+        self.running = False
+        # 保存用户数据和写轨迹都在这一个线程里按顺序执行；stop()会等这些写入完成
+        self.writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+        self.pending_writes = set()
+
+    async def start(self):
+        """按顺序启动服务：先整理历史和持久化，再并发启动天气、闹钟和定位"""
+        if self.running:
+            return
+        self.running = True
+        self.loop = asyncio.get_running_loop()
+        self.save_queue = asyncio.Queue()
+        self.fix_queue = asyncio.Queue(maxsize=1000)
+        print("Starting application services...")
+
+        # 归档过期的活动历史（修改活动列表，需在主线程完成）
+        schedule_tab = getattr(self.app, 'schedule_tab', None)
+        if hasattr(schedule_tab, 'compact_history'):
+            schedule_tab.compact_history(self.app.user_data.get('retention_days', 30))
+
+        # 持久化最先启动，其他服务产生的保存请求都交给它
+        self._spawn('persistence', self._persistence_worker())
+        self._spawn('track_flush', self._track_flush_worker())
+        self._spawn('track_history', self._track_history_worker())
+        if getattr(self.app, 'sync_client', None) and self.app.sync_client.base_url:
+            self._spawn('sync', self._sync_worker())
+
+        # 天气、闹钟和定位互不依赖，并发执行
+        self._spawn('weather', self._weather_worker())
+        if platform == 'android':
+            self._spawn('alarms', self._read_alarms())
+            self._spawn('gps', self._gps_worker())
+            self._start_gps()
+        else:
+            # 非Android平台使用模拟数据
+            print("Non-Android platform, using simulation data")
+            self.app.setup_desktop_simulation()
+
+    def _spawn(self, name, coro):
+        """创建命名任务，异常时打印而不是静默丢失"""
+        task = self.loop.create_task(coro)
+        self.tasks[name] = task
+        task.add_done_callback(lambda t, n=name: self._on_task_done(n, t))
+        return task
+
+    def _on_task_done(self, name, task):
+        if self.tasks.get(name) is task:
+            del self.tasks[name]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Service {name} failed: {task.exception()}")
+
+    def stop(self):
+        """取消所有服务（on_pause/on_stop中调用，之后由调用方同步保存数据）
+
+        取消任务不会停止已经交给写线程的写入，这里等它们写完，
+        调用方之后的同步保存才不会和后台写入同时写同一个文件，也不会被旧数据覆盖。
+        """
+        if not self.running:
+            return
+        self.running = False
+        self._stop_gps()
+        for task in list(self.tasks.values()):
+            task.cancel()
+        self.tasks.clear()
+        concurrent.futures.wait(list(self.pending_writes))
+        print("Application services stopped")
+
+    def _write(self, func, *args):
+        """在写线程中执行文件写入，返回可等待对象
+
+        任务被取消时写入照常完成（shield），stop()通过pending_writes等待它。
+        """
+        future = self.writer.submit(func, *args)
+        self.pending_writes.add(future)
+        future.add_done_callback(self.pending_writes.discard)
+        return asyncio.shield(asyncio.wrap_future(future))
+
+    # ========== 持久化 ==========
+
+    def request_save(self):
+        """请求保存用户数据（合并短时间内的多次请求）"""
+        if self.running and self.save_queue is not None:
+            self.save_queue.put_nowait('user_data')
+        else:
+            self.app.save_user_data()
+
+    async def _persistence_worker(self):
+        """在主线程取数据快照，在工作线程写文件"""
+        while True:
+            await self.save_queue.get()
+            # 合并队列里已有的请求，只写一次
+            while not self.save_queue.empty():
+                self.save_queue.get_nowait()
+            try:
+                # 写入失败时write_prepared会把分区重新标记为待保存
+                prepared = self.app.user_data.prepare_save()
+                await self._write(self.app.user_data.write_prepared, prepared)
+            except Exception as e:
+                print(f"Failed to save user data: {e}")
+
+    async def _track_flush_worker(self):
+        """定期把轨迹缓冲写入文件（缓冲区在主线程取出）"""
+        track_store = self.app.track_store
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            # 写入失败的点由write_batch放回缓冲区
+            await self._write(track_store.write_batch, track_store.prepare_flush())
+
+    async def _track_history_worker(self):
+        """压缩已结束日期的轨迹，再生成最近一周的热力图"""
+        await asyncio.to_thread(self.app.track_store.archive_closed_days)
+
+        heatmap_store = getattr(self.app, 'heatmap_store', None)
+        if heatmap_store is None or not heatmap_store.available:
+            return
+        grid = await asyncio.to_thread(heatmap_store.last_days, self.HEATMAP_DAYS)
+        if hasattr(self.app.tracking_tab, 'render_heatmap'):
+            self.app.tracking_tab.render_heatmap(grid)
+
+    async def _sync_worker(self):
+        """定期在后台线程上传改动"""
+        while True:
+            sent = await asyncio.to_thread(self.app.sync_client.sync)
+            if sent:
+                stats = self.app.sync_client.report()
+                print(f"Synced {sent} changes, {stats['bytes_per_day']:.0f} bytes/day")
+            await asyncio.sleep(self.SYNC_INTERVAL)
+
+    # ========== 天气 ==========
+
+    async def _weather_worker(self):
+        """获取天气并更新主题，之后定期刷新"""
+        from .weather_api import WeatherManager
+
+        if not hasattr(self.app, 'weather_manager'):
+            self.app.weather_manager = WeatherManager()
+        while True:
+            try:
+                weather_data = await asyncio.to_thread(
+                    self.app.weather_manager.get_current_weather, 31.0258, 121.4376
+                )
+                self.app.apply_weather(weather_data)
+            except Exception as e:
+                print(f"Weather update error: {e}")
+                self.app.update_theme('sunny')  # 出错时使用默认主题
+            await asyncio.sleep(self.WEATHER_INTERVAL)
+
+    # ========== 闹钟 ==========
+
+    async def _read_alarms(self):
+        """在线程中读取闹钟，回到主线程应用结果"""
+        from .alarm_reader import AlarmReader
+
+        if not hasattr(self.app, 'alarm_reader'):
+            self.app.alarm_reader = AlarmReader()
+        timeline = await asyncio.to_thread(self.app.alarm_reader.get_timeline)
+        self.app.apply_alarm_timeline(timeline)
+
+    # ========== 定位 ==========
+
+    def _start_gps(self):
+        """启动GPS，回调线程中的定位通过队列交给定位任务"""
+        from .location_manager import LocationManager
+
+        if not hasattr(self.app, 'location_manager'):
+            self.app.location_manager = LocationManager(self.app)
+        try:
+            from plyer import gps
+            gps.configure(on_location=self._on_gps_location)
+            gps.start()
+            print("Location tracking service started")
+        except Exception as e:
+            print(f"GPS unavailable ({e}), using simulated locations")
+            self._spawn('gps_simulation', self._simulate_locations())
+
+    def _stop_gps(self):
+        try:
+            from plyer import gps
+            gps.stop()
+        except Exception:
+            pass
+
+    def _on_gps_location(self, **kwargs):
+        """plyer回调（可能在其他线程），只负责把数据放入队列"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._enqueue_fix, kwargs)
+
+    def _enqueue_fix(self, fix):
+        try:
+            self.fix_queue.put_nowait(fix)
+        except asyncio.QueueFull:
+            print("Location queue full, dropping fix")
+
+    async def _simulate_locations(self):
+        """模拟上海交通大学周围的定位数据"""
+        base_lat, base_lon = 31.0258, 121.4376
+        while True:
+            self._enqueue_fix({
+                'lat': base_lat + random.uniform(-0.001, 0.001),
+                'lon': base_lon + random.uniform(-0.001, 0.001),
+                'speed': random.uniform(0, 8)  # 0-8 m/s
+            })
+            await asyncio.sleep(self.SIMULATION_INTERVAL)
+
+    async def _gps_worker(self):
+        """逐个处理定位数据"""
+        while True:
+            fix = await self.fix_queue.get()
+            try:
+                self.app.location_manager.on_gps_location(**fix)
+            except Exception as e:
+                print(f"Failed to process location: {e}")
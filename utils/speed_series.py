@@ -0,0 +1,154 @@
+import datetime
+import json
+import os
+from collections import OrderedDict
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets降采样：保留threshold个最能体现曲线形状的点
+
+    points为按时间排序的 [(t, v), ...]。
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0  # 上一个选中的点
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # 下一个桶的平均点
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_t = sum(p[0] for p in points[next_start:next_end]) / count
+        avg_v = sum(p[1] for p in points[next_start:next_end]) / count
+
+        # 当前桶中与上一个点、下一桶平均点组成三角形面积最大的点
+        at, av = points[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            t, v = points[j]
+            area = abs((at - avg_t) * (v - av) - (at - t) * (avg_v - av))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+class _TodayBuckets:
+    """今天的增量序列：按固定时间桶保留每个桶内速度最小和最大的点"""
+
+    def __init__(self, day_start, bucket_seconds):
+        self.day_start = day_start
+        self.bucket_seconds = bucket_seconds
+        self.buckets = {}  # 桶序号 -> [最小点, 最大点]
+
+    def add(self, t, v):
+        index = int((t - self.day_start) // self.bucket_seconds)
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            self.buckets[index] = [(t, v), (t, v)]
+        else:
+            if v < bucket[0][1]:
+                bucket[0] = (t, v)
+            if v > bucket[1][1]:
+                bucket[1] = (t, v)
+
+    def points(self):
+        result = []
+        for index in sorted(self.buckets):
+            low, high = self.buckets[index]
+            if low == high:
+                result.append(low)
+            else:
+                result.extend(sorted((low, high)))
+        return result
+
+
+class SpeedSeries:
+    """每日速度曲线（用于图表）
+
+    已结束的日期按 (日期, 点数) 计算一次LTTB并缓存到 speed_cache/；今天的数据在
+    新定位到达时累加到时间桶里（每个桶保留最小/最大速度），绘图时只对桶代表点做LTTB。
+    """
+
+    BUCKETS_PER_POINT = 4  # 今天的时间桶数 = 点数 * 4
+
+    def __init__(self, track_store, root='speed_cache', cached=16):
+        self.track_store = track_store
+        self.root = root
+        self.cached = cached
+        self._cache = OrderedDict()  # (日期, 点数) -> 点列表
+        self._today = None           # 今天的日期
+        self._today_series = {}      # 点数 -> _TodayBuckets
+        os.makedirs(root, exist_ok=True)
+
+    def cache_file(self, date, width):
+        return os.path.join(self.root, f'{date.isoformat()}-{width}.json')
+
+    def day_points(self, date, width, today=None):
+        """某天降采样到width个点的速度曲线 [(时间戳, 速度), ...]"""
+        today = today or datetime.date.today()
+        if date >= today:
+            return self._today_points(date, width)
+
+        key = (date, width)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        path = self.cache_file(date, width)
+        points = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    points = [tuple(p) for p in json.load(f)]
+            except Exception as e:
+                print(f"Failed to read speed cache {date}: {e}")
+        if points is None:
+            points = lttb([(f.timestamp, f.speed) for f in self.track_store.iter_day(date)], width)
+            try:
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(points, f, separators=(',', ':'))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Failed to write speed cache {date}: {e}")
+
+        self._cache[key] = points
+        while len(self._cache) > self.cached:
+            self._cache.popitem(last=False)
+        return points
+
+    def _today_points(self, date, width):
+        if self._today != date:
+            self._today = date
+            self._today_series = {}
+        series = self._today_series.get(width)
+        if series is None:
+            # 第一次请求这个宽度时从轨迹历史补齐，之后由add增量更新
+            day_start = datetime.datetime.combine(date, datetime.time()).timestamp()
+            series = _TodayBuckets(day_start, 86400 / (width * self.BUCKETS_PER_POINT))
+            for fix in self.track_store.iter_day(date):
+                series.add(fix.timestamp, fix.speed)
+            self._today_series[width] = series
+        return lttb(series.points(), width)
+
+    def add(self, fix):
+        """新定位到达时更新今天的曲线"""
+        if self._today is None:
+            return
+        if datetime.date.fromtimestamp(fix.timestamp) != self._today:
+            self._today = None  # 日期变了，下次请求时重建
+            self._today_series = {}
+            return
+        for series in self._today_series.values():
+            series.add(fix.timestamp, fix.speed)
@@ -0,0 +1,56 @@
+import datetime
+import json
+import os
+import time
+
+
+class StartupSnapshot:
+    """启动快照：上次暂停/退出时界面的最终状态
+
+    保存已确定的主题颜色、今天显示的活动行和跟踪统计。启动时先读取快照，第一帧直接显示
+    这些内容，天气等新数据在后台准备好后再替换。起床/睡觉时间在启动时加载的settings分区里，
+    不需要放进快照。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path='startup_snapshot.json'):
+        self.path = path
+        self.load_time = 0.0  # 上次读取耗时(秒)
+
+    def load(self, today=None):
+        """读取快照，没有或格式不对时返回None；不是今天的快照不包含活动行"""
+        start = time.perf_counter()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Failed to read startup snapshot: {e}")
+            return None
+        finally:
+            self.load_time = time.perf_counter() - start
+
+        if snapshot.get('version') != self.VERSION:
+            return None
+        today = today or datetime.date.today()
+        if snapshot.get('date') != today.isoformat():
+            # 昨天的活动和统计已经不是今天的了
+            snapshot['activity_rows'] = []
+            snapshot['tracking'] = {}
+        return snapshot
+
+    def save(self, state):
+        """原子写入快照"""
+        snapshot = dict(state)
+        snapshot['version'] = self.VERSION
+        snapshot['saved_at'] = time.time()
+        snapshot['date'] = datetime.date.today().isoformat()
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Failed to write startup snapshot: {e}")
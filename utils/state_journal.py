@@ -0,0 +1,119 @@
+import json
+import os
+import time
+
+
+class StateJournal:
+    """停留/跑步检测状态的追加日志，用于崩溃或进程被杀后恢复
+
+    状态变化（进入/离开地点、开始/结束跑步）追加到 state/journal.jsonl，
+    先放在内存缓冲区里批量写入；日志达到一定条数时把完整状态写成检查点
+    并清空日志。恢复时读取检查点并重放不超过checkpoint_every条日志，耗时与历史长短无关。
+    """
+
+    def __init__(self, root='state', flush_every=10, flush_interval=30, checkpoint_every=200):
+        self.root = root
+        self.flush_every = flush_every            # 缓冲条数达到后写入
+        self.flush_interval = flush_interval      # 最长写入间隔(秒)
+        self.checkpoint_every = checkpoint_every  # 日志条数达到后写检查点
+        self.journal_file = os.path.join(root, 'journal.jsonl')
+        self.checkpoint_file = os.path.join(root, 'checkpoint.json')
+        self.state = {'stay': None, 'run': None, 'last_seen': None}
+        self._buffer = []
+        self._entries = 0        # 检查点之后已写入的日志条数
+        self._last_flush = time.time()
+        os.makedirs(root, exist_ok=True)
+
+    def load(self):
+        """读取检查点并重放日志，返回恢复的状态"""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                self.state.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Failed to read state checkpoint: {e}")
+
+        self._entries = 0
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 跳过写了一半的行
+                    self._apply(entry)
+                    self._entries += 1
+        except FileNotFoundError:
+            pass
+        return self.state
+
+    def _apply(self, entry):
+        event = entry.get('e')
+        if event == 'enter':
+            self.state['stay'] = {'loc': entry['loc'], 'start': entry['t']}
+        elif event == 'exit':
+            self.state['stay'] = None
+        elif event == 'run_start':
+            self.state['run'] = {'start': entry['t'], 'speed': entry.get('speed', 0),
+                                 'distance': 0.0, 'max_speed': entry.get('speed', 0)}
+        elif event == 'run_end':
+            self.state['run'] = None
+        elif event == 'seen' and self.state['run'] is not None and 'distance' in entry:
+            self.state['run']['distance'] = entry['distance']
+            self.state['run']['max_speed'] = entry['max_speed']
+        self.state['last_seen'] = entry['t']
+
+    def record(self, event, timestamp, **fields):
+        """记录一次状态变化"""
+        entry = {'t': timestamp, 'e': event}
+        entry.update(fields)
+        self._apply(entry)
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def heartbeat(self, timestamp, run=None):
+        """每个定位点调用：只更新内存，超过写入间隔时才记录一条并写盘"""
+        self.state['last_seen'] = timestamp
+        if timestamp - self._last_flush < self.flush_interval:
+            return
+        fields = {}
+        if run is not None:
+            fields = {'distance': round(run.distance, 1), 'max_speed': run.max_speed}
+        self.record('seen', timestamp, **fields)
+        self.flush()
+
+    def flush(self):
+        """把缓冲区追加写入日志"""
+        self._last_flush = time.time()
+        if not self._buffer:
+            return
+        buffer, self._buffer = self._buffer, []
+        try:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, separators=(',', ':')) + '\n' for entry in buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries += len(buffer)
+        except Exception as e:
+            print(f"Failed to write state journal: {e}")
+        if self._entries >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """写出完整状态并清空日志"""
+        self._buffer = []
+        try:
+            tmp_path = self.checkpoint_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.checkpoint_file)
+            # 检查点已包含全部状态，日志可以清空
+            open(self.journal_file, 'w').close()
+            self._entries = 0
+            self._last_flush = time.time()
+        except Exception as e:
+            print(f"Failed to write state checkpoint: {e}")
@@ -0,0 +1,269 @@
+import gzip
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+
+class SyncClient:
+    """把活动、备注和每日汇总的改动增量同步到服务器
+
+    改动追加到 sync/outbox.jsonl，已确认上传的位置（字节偏移）和下一批的序号保存在
+    sync/cursor.json。每次同步从偏移处读取一批改动，合并同一条记录的多次修改，
+    gzip压缩后通过同一个连接池POST；失败按指数退避重试，中断后从偏移处继续。
+    服务器明确拒绝的批次（4xx，429除外）重发也不会成功，写入 sync/rejected.jsonl 后跳过。
+    """
+
+    def __init__(self, base_url=None, root='sync', batch_size=200, max_retries=5,
+                 backoff=1.0, timeout=10):
+        self.base_url = base_url
+        self.root = root
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff  # 第一次重试前等待(秒)，之后翻倍
+        self.timeout = timeout
+        self.outbox_file = os.path.join(root, 'outbox.jsonl')
+        self.cursor_file = os.path.join(root, 'cursor.json')
+        self.rejected_file = os.path.join(root, 'rejected.jsonl')
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        # seq只增不减（清空改动文件时也不重置），与client_id一起组成唯一的批次号
+        self.cursor = {'client_id': uuid.uuid4().hex, 'offset': 0, 'seq': 0}
+        try:
+            with open(self.cursor_file, 'r', encoding='utf-8') as f:
+                self.cursor.update(json.load(f))
+        except FileNotFoundError:
+            self._save_cursor()
+        except Exception as e:
+            print(f"Failed to read sync cursor: {e}")
+
+        # 统计：上传字节数和涉及的日期
+        self.bytes_sent = 0
+        self.changes_sent = 0
+        self.changes_rejected = 0
+        self.days_synced = set()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'DailyTracker/1.0 (SJTU campus app)'
+
+    def _save_cursor(self):
+        tmp_path = self.cursor_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.cursor, f)
+        os.replace(tmp_path, self.cursor_file)
+
+    def record(self, kind, item_id, day, data=None, op='put'):
+        """记录一次改动（kind: activity / note / rollup，op: put / delete）"""
+        change = {'kind': kind, 'id': item_id, 'day': day, 'op': op, 'data': data}
+        line = json.dumps(change, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            with self._lock:
+                with open(self.outbox_file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except Exception as e:
+            print(f"Failed to record sync change: {e}")
+
+    def pending_bytes(self):
+        """还没上传的改动字节数"""
+        try:
+            return max(0, os.path.getsize(self.outbox_file) - self.cursor['offset'])
+        except OSError:
+            return 0
+
+    def _read_batch(self):
+        """从偏移处读取一批改动，返回 (合并后的改动列表, 结束偏移)"""
+        changes = {}
+        offset = self.cursor['offset']
+        with open(self.outbox_file, 'rb') as f:
+            f.seek(offset)
+            count = 0
+            while count < self.batch_size:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # 文件末尾或写了一半的行
+                offset += len(line)
+                count += 1
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    continue
+                # 同一条记录在一批中只保留最后一次修改
+                key = (change['kind'], change['id'])
+                changes.pop(key, None)
+                changes[key] = change
+        return list(changes.values()), offset
+
+    def _post(self, body, batch_id):
+        """上传一批数据，失败时指数退避重试
+
+        返回 'sent'（成功）、'rejected'（服务器拒绝，重发无用）或 'failed'（稍后重试）
+        """
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip',
+                   'X-Client-Id': self.cursor['client_id'], 'X-Batch-Id': batch_id}
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.base_url.rstrip('/') + '/sync', data=body,
+                                             headers=headers, timeout=self.timeout)
+                if response.status_code < 300:
+                    return 'sent'
+                if response.status_code < 500 and response.status_code != 429:
+                    print(f"Sync rejected: HTTP {response.status_code}")
+                    return 'rejected'
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = e
+            if attempt < self.max_retries:
+                print(f"Sync attempt {attempt + 1} failed ({error}), retrying in {delay:.1f}s")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+        return 'failed'
+
+    def _dead_letter(self, batch_id, changes):
+        """保存被拒绝的批次，供之后排查或手动重发"""
+        entry = {'batch_id': batch_id, 'rejected_at': time.time(), 'changes': changes}
+        try:
+            with open(self.rejected_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        except Exception as e:
+            print(f"Failed to record rejected sync batch: {e}")
+
+    def sync(self):
+        """上传所有未同步的改动，返回上传的改动条数（可以在后台线程调用）"""
+        if not self.base_url or not os.path.exists(self.outbox_file):
+            return 0
+        sent = 0
+        while True:
+            with self._lock:
+                changes, end_offset = self._read_batch()
+            start_offset = self.cursor['offset']
+            if end_offset == start_offset:
+                break
+
+            body = gzip.compress(json.dumps({'client_id': self.cursor['client_id'], 'changes': changes},
+                                            ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            # 确认上传后才递增序号，中断后重发同一批时批次号不变，服务器可以去重
+            batch_id = f"{self.cursor['client_id']}-{self.cursor['seq']}"
+            status = self._post(body, batch_id)
+            if status == 'failed':
+                break
+            if status == 'rejected':
+                # 不跳过的话这一批会一直重发，后面的改动也永远传不上去
+                self._dead_letter(batch_id, changes)
+
+            self.cursor['offset'] = end_offset
+            self.cursor['seq'] += 1
+            self._save_cursor()
+            if status == 'rejected':
+                self.changes_rejected += len(changes)
+                continue
+            self.bytes_sent += len(body)
+            self.changes_sent += len(changes)
+            self.days_synced.update(c['day'] for c in changes if c.get('day'))
+            sent += len(changes)
+
+        self._compact_outbox()
+        return sent
+
+    def _compact_outbox(self):
+        """全部上传后清空改动文件"""
+        with self._lock:
+            try:
+                if self.cursor['offset'] and self.cursor['offset'] == os.path.getsize(self.outbox_file):
+                    open(self.outbox_file, 'w').close()
+                    self.cursor['offset'] = 0
+                    self._save_cursor()
+            except OSError:
+                pass
+
+    def report(self, full_payload=None):
+        """同步统计：每个同步日期的上传字节数，可与完整重新上传对比"""
+        days = len(self.days_synced)
+        result = {
+            'changes': self.changes_sent,
+            'rejected': self.changes_rejected,
+            'bytes_sent': self.bytes_sent,
+            'days': days,
+            'bytes_per_day': self.bytes_sent / days if days else 0,
+        }
+        if full_payload is not None:
+            full = len(gzip.compress(json.dumps(full_payload, ensure_ascii=False,
+                                                separators=(',', ':')).encode('utf-8')))
+            result['full_upload_bytes'] = full
+            result['full_upload_bytes_per_day'] = full / days if days else 0
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """本地替身服务器：接收同步批次并追加到文件"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        batch_id = self.headers.get('X-Batch-Id')
+        server = self.server
+        if batch_id not in server.batches:
+            server.batches.add(batch_id)
+            with open(server.output_file, 'ab') as f:
+                f.write(body + b'\n')
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port=8765, output_file='sync_server.jsonl'):
+    """创建本地替身服务器，port为0时由系统分配端口"""
+    server = HTTPServer(('127.0.0.1', port), _StandInHandler)
+    server.batches = set()
+    server.output_file = output_file
+    return server
+
+
+def serve(port=8765, output_file='sync_server.jsonl'):
+    """启动本地替身服务器（测试用）"""
+    server = make_server(port, output_file)
+    print(f"Sync stand-in server on http://127.0.0.1:{server.server_port}, writing to {output_file}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    """命令行: python -m utils.sync_client serve [端口] | sync URL"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ('serve', 'sync'):
+        print("Usage: python -m utils.sync_client serve [port] | sync URL")
+        return
+    if argv[0] == 'serve':
+        serve(int(argv[1]) if len(argv) > 1 else 8765)
+        return
+
+    client = SyncClient(argv[1])
+    try:
+        sent = client.sync()
+    finally:
+        client.close()
+    stats = client.report()
+    print(f"Synced {sent} changes, {stats['bytes_sent']} bytes for {stats['days']} days "
+          f"({stats['bytes_per_day']:.0f} bytes/day), pending: {client.pending_bytes()} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .geofence import GeofenceIndex
+
+DEFAULT_TILE_URL = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'  # 只用于地图浏览
+OSM_TILE_HOST = 'tile.openstreetmap.org'  # 使用政策禁止批量下载，不能用于预取
+
+
+def deg2tile(lat, lon, zoom):
+    """经纬度转为瓦片坐标"""
+    lat_rad = math.radians(lat)
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_for_bbox(min_lat, min_lon, max_lat, max_lon, zoom):
+    """覆盖经纬度范围的全部瓦片"""
+    x1, y1 = deg2tile(max_lat, min_lon, zoom)  # 左上
+    x2, y2 = deg2tile(min_lat, max_lon, zoom)  # 右下
+    for x in range(x1, x2 + 1):
+        for y in range(y1, y2 + 1):
+            yield zoom, x, y
+
+
+class TileCache:
+    """磁盘地图瓦片缓存，超过字节上限时按最近最少使用（LRU）淘汰"""
+
+    def __init__(self, root='tile_cache', max_bytes=50 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._tiles = OrderedDict()  # (z, x, y) -> 字节数，按LRU顺序
+        self._total = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """启动时扫描已有瓦片，按修改时间恢复LRU顺序"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    z, x = os.path.relpath(dirpath, self.root).split(os.sep)
+                    key = (int(z), int(x), int(name[:-4]))
+                    stat = os.stat(path)
+                except (ValueError, OSError):
+                    continue
+                entries.append((stat.st_mtime, key, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._tiles[key] = size
+            self._total += size
+
+    def path(self, z, x, y):
+        """瓦片文件路径"""
+        return os.path.join(self.root, str(z), str(x), f'{y}.png')
+
+    def get(self, z, x, y):
+        """读取缓存的瓦片，未命中返回None"""
+        key = (z, x, y)
+        with self._lock:
+            if key not in self._tiles:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+
+        path = self.path(z, x, y)
+        try:
+            os.utime(path)  # 刷新修改时间，重启后保持LRU顺序
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                size = self._tiles.pop(key, 0)
+                self._total -= size
+            return None
+
+    def put(self, z, x, y, data):
+        """写入瓦片并按需淘汰旧瓦片"""
+        path = self.path(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        key = (z, x, y)
+        with self._lock:
+            self._total -= self._tiles.pop(key, 0)
+            self._tiles[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def _evict(self):
+        """超过上限时删除最久未使用的瓦片（调用方持有锁）"""
+        while self._total > self.max_bytes and len(self._tiles) > 1:
+            (z, x, y), size = self._tiles.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path(z, x, y))
+            except OSError:
+                pass
+
+    def stats(self):
+        """命中率统计"""
+        requests_count = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests_count if requests_count else 0.0,
+            'tiles': len(self._tiles),
+            'bytes': self._total,
+        }
+
+
+class TileFetcher:
+    """通过有界线程池并发下载瓦片，优先使用磁盘缓存"""
+
+    def __init__(self, cache, url_template=DEFAULT_TILE_URL, max_workers=2, timeout=10):
+        self.cache = cache
+        self.url_template = url_template
+        self.timeout = timeout
+        self.failures = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tiles')
+
+        # 连接池大小与线程数一致，复用连接
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'DailyTracker/1.0 (SJTU campus app)'
+
+    def fetch(self, z, x, y):
+        """获取一个瓦片（缓存未命中时下载）"""
+        data = self.cache.get(z, x, y)
+        if data is not None:
+            return data
+        try:
+            response = self.session.get(self.url_template.format(z=z, x=x, y=y), timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            self.failures += 1
+            print(f"Tile download failed {z}/{x}/{y}: {e}")
+            return None
+        self.cache.put(z, x, y, response.content)
+        return response.content
+
+    def fetch_async(self, z, x, y):
+        """后台获取瓦片，返回Future"""
+        return self.executor.submit(self.fetch, z, x, y)
+
+    def fetch_many(self, tiles):
+        """并发获取多个瓦片，返回成功数量"""
+        return sum(1 for data in self.executor.map(lambda t: self.fetch(*t), tiles) if data is not None)
+
+    def prefetch_places(self, locations, zooms=range(14, 19), margin=0.002):
+        """预取覆盖所有地点（外扩margin度）的各级瓦片（需要自建或允许批量下载的瓦片服务器）"""
+        if OSM_TILE_HOST in self.url_template:
+            raise ValueError("Bulk prefetch from tile.openstreetmap.org is not allowed by its tile usage "
+                             "policy; pass the URL of your own tile server")
+        fences = GeofenceIndex(locations).fences
+        if not fences:
+            return 0
+        min_lat = min(f.bbox[0] for f in fences) - margin
+        min_lon = min(f.bbox[1] for f in fences) - margin
+        max_lat = max(f.bbox[2] for f in fences) + margin
+        max_lon = max(f.bbox[3] for f in fences) + margin
+
+        tiles = [tile for zoom in zooms
+                 for tile in tiles_for_bbox(min_lat, min_lon, max_lat, max_lon, zoom)]
+        return self.fetch_many(tiles)
+
+    def close(self, wait=True):
+        """关闭线程池和连接"""
+        self.executor.shutdown(wait=wait)
+        self.session.close()
+
+
+def main(argv=None):
+    """命令行预取: python -m utils.tile_cache 瓦片URL模板 [最小级别-最大级别]"""
+    from .user_store import SectionedUserData
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or OSM_TILE_HOST in argv[0]:
+        print("Usage: python -m utils.tile_cache TILE_URL_TEMPLATE [MINZOOM-MAXZOOM]")
+        print("TILE_URL_TEMPLATE must be your own tile server, e.g. http://localhost:8080/{z}/{x}/{y}.png "
+              "(bulk downloads from tile.openstreetmap.org are not allowed)")
+        return
+    url_template = argv[0]
+    min_zoom, max_zoom = (int(z) for z in (argv[1] if len(argv) > 1 else '14-18').split('-'))
+
+    user_data = SectionedUserData()
+    user_data.load()
+    locations = user_data.get('locations', {})
+
+    fetcher = TileFetcher(TileCache(), url_template)
+    try:
+        fetched = fetcher.prefetch_places(locations, range(min_zoom, max_zoom + 1))
+    finally:
+        fetcher.close()
+
+    stats = fetcher.cache.stats()
+    print(f"Prefetched {fetched} tiles for {len(locations)} places "
+          f"(zoom {min_zoom}-{max_zoom}), failures: {fetcher.failures}")
+    print(f"Cache hits: {stats['hits']}, misses: {stats['misses']}, "
+          f"hit rate: {stats['hit_rate']:.1%}, size: {stats['bytes'] / 1024:.0f} KiB in {stats['tiles']} tiles")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import bisect
+import json
+import os
+import re
+import struct
+import sys
+import time
+from itertools import accumulate, repeat
+from operator import truediv
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .records import Fix
+
+MAGIC = b'DTK1'
+BLOCK_HEADER = struct.Struct('<IHqiih')  # 数据长度, 点数, 起始时间(ms), 纬度, 经度, 速度(cm/s)
+INDEX_ENTRY = struct.Struct('<qQ')       # 块起始时间(ms), 块偏移
+FOOTER = struct.Struct('<QI4s')          # 索引偏移, 块数, MAGIC
+
+COORD_SCALE = 10 ** 6  # 经纬度定点: 1e-6度（约0.1米，远小于GPS误差）
+TIME_SCALE = 1000      # 时间定点: 毫秒
+SPEED_SCALE = 100      # 速度定点: cm/s
+
+_VARINT = re.compile(rb'[\x80-\xff]*[\x00-\x7f]')  # 一个变长整数: 若干高位为1的字节 + 结束字节
+_varint_table = None
+
+
+def _put_varint(out, value):
+    """无符号变长整数"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    """有符号整数映射为无符号: 0,-1,1,-2 -> 0,1,2,3"""
+    return (value << 1) ^ (value >> 63)
+
+
+def _decode_varint(token):
+    value = 0
+    for shift, byte in enumerate(token):
+        value |= (byte & 0x7F) << (7 * shift)
+    return (value >> 1) ^ -(value & 1)
+
+
+def _small_varints():
+    """1-2字节变长整数的查找表（第一次解码时生成）"""
+    global _varint_table
+    if _varint_table is None:
+        table = {bytes([b]): _decode_varint(bytes([b])) for b in range(0x80)}
+        for low in range(0x80, 0x100):
+            for high in range(0x80):
+                token = bytes([low, high])
+                table[token] = _decode_varint(token)
+        _varint_table = table
+    return _varint_table
+
+
+def _fixed(fix):
+    return (int(round(fix.timestamp * TIME_SCALE)), int(round(fix.lat * COORD_SCALE)),
+            int(round(fix.lon * COORD_SCALE)), int(round(fix.speed * SPEED_SCALE)))
+
+
+def encode_block(fixes):
+    """编码一块定位点
+
+    块头保存第一个点；之后按列保存：时间和经纬度存二阶差分（匀速移动时接近0），
+    速度存一阶差分，全部用zigzag变长整数。
+    """
+    points = [_fixed(fix) for fix in fixes]
+    body = bytearray()
+    for column in range(4):
+        prev = points[0][column]
+        prev_delta = 0
+        for point in points[1:]:
+            delta = point[column] - prev
+            prev = point[column]
+            if column < 3:
+                _put_varint(body, _zigzag(delta - prev_delta))
+                prev_delta = delta
+            else:
+                _put_varint(body, _zigzag(delta))
+    t0, lat0, lon0, speed0 = points[0]
+    header = BLOCK_HEADER.pack(len(body), len(points), t0, lat0, lon0,
+                               max(-32768, min(32767, speed0)))
+    return header + bytes(body)
+
+
+def decode_block(data, offset=0):
+    """解码一块，返回Fix列表（有numpy时整块向量化解码，否则逐个查表）"""
+    length, count, t0, lat0, lon0, speed0 = BLOCK_HEADER.unpack_from(data, offset)
+    pos = offset + BLOCK_HEADER.size
+    if count == 1:
+        return [Fix(t0 / TIME_SCALE, lat0 / COORD_SCALE, lon0 / COORD_SCALE, speed0 / SPEED_SCALE)]
+    if NUMPY_AVAILABLE:
+        return _decode_block_numpy(data, pos, length, count, (t0, lat0, lon0, speed0))
+
+    tokens = _VARINT.findall(data[pos:pos + length])
+    values = list(map(_small_varints().get, tokens))
+    if None in values:
+        # 少数超过2字节的值逐个解码
+        values = [_decode_varint(t) if v is None else v for t, v in zip(tokens, values)]
+
+    n = count - 1
+    times = accumulate(accumulate(values[0:n]), initial=t0)
+    lats = accumulate(accumulate(values[n:2 * n]), initial=lat0)
+    lons = accumulate(accumulate(values[2 * n:3 * n]), initial=lon0)
+    speeds = accumulate(values[3 * n:4 * n], initial=speed0)
+    return list(map(Fix,
+                    map(truediv, times, repeat(TIME_SCALE)),
+                    map(truediv, lats, repeat(COORD_SCALE)),
+                    map(truediv, lons, repeat(COORD_SCALE)),
+                    map(truediv, speeds, repeat(SPEED_SCALE))))
+
+
+def _decode_block_numpy(data, pos, length, count, first):
+    """整块一次解码：变长整数、zigzag和差分累加都用数组运算完成"""
+    raw = np.frombuffer(data, dtype=np.uint8, count=length, offset=pos)
+    ends = np.flatnonzero(raw < 0x80)  # 每个变长整数的最后一个字节
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    values = (raw[starts] & 0x7F).astype(np.int64)
+    # 多字节的值逐字节补上高位（绝大多数值只有1字节）
+    longer = np.flatnonzero(ends > starts)
+    shift = 7
+    while longer.size:
+        values[longer] |= (raw[starts[longer] + shift // 7] & 0x7F).astype(np.int64) << shift
+        shift += 7
+        longer = longer[ends[longer] >= starts[longer] + shift // 7]
+    values = (values >> 1) ^ -(values & 1)
+
+    columns = np.empty((4, count), dtype=np.int64)
+    columns[:, 0] = first
+    deltas = values.reshape(4, count - 1)
+    columns[:3, 1:] = np.cumsum(np.cumsum(deltas[:3], axis=1), axis=1)
+    columns[3, 1:] = np.cumsum(deltas[3])
+    columns[:, 1:] += columns[:, :1]
+    scaled = columns / np.array([[TIME_SCALE], [COORD_SCALE], [COORD_SCALE], [SPEED_SCALE]])
+    return list(map(Fix, *scaled.tolist()))
+
+
+def encode_track(fixes, block_size=256):
+    """编码一天的定位点（按时间排序）：文件头 + 数据块 + 块索引 + 文件尾"""
+    fixes = sorted(fixes, key=lambda f: f.timestamp)
+    out = bytearray(MAGIC)
+    index = []
+    for start in range(0, len(fixes), block_size):
+        block = fixes[start:start + block_size]
+        index.append((int(round(block[0].timestamp * TIME_SCALE)), len(out)))
+        out += encode_block(block)
+    index_offset = len(out)
+    for entry in index:
+        out += INDEX_ENTRY.pack(*entry)
+    out += FOOTER.pack(index_offset, len(index), MAGIC)
+    return bytes(out)
+
+
+def write_track(path, fixes, block_size=256):
+    """原子写入归档文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_track(fixes, block_size))
+    os.replace(tmp_path, path)
+
+
+class TrackArchive:
+    """读取 .dtk 归档文件，可按时间直接定位到数据块"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if self.data[:4] != MAGIC:
+            raise ValueError(f"Not a track archive: {path}")
+        index_offset, count, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"Truncated track archive: {path}")
+        self.block_times = []
+        self.block_offsets = []
+        for i in range(count):
+            t, offset = INDEX_ENTRY.unpack_from(self.data, index_offset + i * INDEX_ENTRY.size)
+            self.block_times.append(t)
+            self.block_offsets.append(offset)
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def iter_range(self, start_ts=None, end_ts=None):
+        """逐个读取时间范围内的定位点，只解码相关的数据块"""
+        first = 0
+        if start_ts is not None:
+            first = max(0, bisect.bisect_right(self.block_times, int(start_ts * TIME_SCALE)) - 1)
+        for i in range(first, len(self.block_offsets)):
+            if end_ts is not None and self.block_times[i] > end_ts * TIME_SCALE:
+                break
+            for fix in decode_block(self.data, self.block_offsets[i]):
+                if start_ts is not None and fix.timestamp < start_ts:
+                    continue
+                if end_ts is not None and fix.timestamp > end_ts:
+                    return
+                yield fix
+
+
+def main(argv=None):
+    """往返校验和基准测试: python -m utils.track_codec [轨迹CSV文件 ...]"""
+    import math
+    import random
+
+    argv = sys.argv[1:] if argv is None else argv
+    fixes = []
+    if argv:
+        for path in argv:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    ts, lat, lon, speed = (float(v) for v in line.split(','))
+                    fixes.append(Fix(ts, lat, lon, speed))
+    else:
+        # 模拟一天1Hz的校园轨迹
+        random.seed(0)
+        lat, lon, heading, speed, ts = 31.0258, 121.4376, 0.0, 1.4, 1700000000.0
+        for _ in range(86400):
+            heading += random.gauss(0, 0.2)
+            speed = max(0.0, speed + random.gauss(0, 0.1))
+            lat += math.cos(heading) * speed / 111000
+            lon += math.sin(heading) * speed / 95000
+            ts += 1
+            fixes.append(Fix(ts, round(lat, 7), round(lon, 7), round(speed, 2)))
+
+    csv_text = ''.join(f"{f.timestamp:.3f},{f.lat:.7f},{f.lon:.7f},{f.speed:.2f}\n" for f in fixes)
+    json_text = json.dumps([[f.timestamp, f.lat, f.lon, f.speed] for f in fixes])
+    encoded = encode_track(fixes)
+
+    # 往返校验（在定点精度内，同时生成解码查找表）
+    decoded = _decode_all(encoded)
+    assert len(decoded) == len(fixes)
+    for a, b in zip(sorted(fixes, key=lambda f: f.timestamp), decoded):
+        assert _fixed(a) == _fixed(b), (a, b)
+
+    def bench(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    csv_time = bench(lambda: [Fix(*map(float, line.split(','))) for line in csv_text.splitlines()])
+    json_time = bench(lambda: [Fix(*row) for row in json.loads(json_text)])
+    dtk_time = bench(lambda: _decode_all(encoded))
+
+    print(f"{len(fixes)} fixes, round trip OK")
+    print(f"CSV  {len(csv_text.encode()):>9} bytes  decode {csv_time * 1000:7.1f} ms")
+    print(f"JSON {len(json_text.encode()):>9} bytes  decode {json_time * 1000:7.1f} ms")
+    print(f"DTK  {len(encoded):>9} bytes  decode {dtk_time * 1000:7.1f} ms  "
+          f"({len(csv_text.encode()) / len(encoded):.1f}x smaller than CSV, "
+          f"{len(json_text.encode()) / len(encoded):.1f}x smaller than JSON)")
+
+
+def _decode_all(data):
+    """解码内存中的整个归档"""
+    index_offset, count, _ = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+    fixes = []
+    for i in range(count):
+        _, offset = INDEX_ENTRY.unpack_from(data, index_offset + i * INDEX_ENTRY.size)
+        fixes.extend(decode_block(data, offset))
+    return fixes
+
+
+if __name__ == '__main__':
+    main()
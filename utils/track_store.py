@@ -0,0 +1,165 @@
+import datetime
+import os
+import threading
+
+from .records import Fix
+from .track_codec import TrackArchive, write_track
+
+
+def _day_of(timestamp):
+    """时间戳所在的本地日期"""
+    return datetime.date.fromtimestamp(timestamp)
+
+
+class TrackStore:
+    """按天保存的定位轨迹历史
+
+    每天一个 tracks/YYYY-MM-DD.csv 文件，每行 "时间戳,纬度,经度,速度"。
+    新定位先放在内存缓冲区，攒够一批再追加写入；读取全部通过生成器逐行进行，
+    不会把整段历史读入内存。已经结束的日期可以压缩为 .dtk 归档（见track_codec），
+    读取时两种格式都支持。
+    """
+
+    def __init__(self, root='tracks', flush_every=30):
+        self.root = root
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()       # 保护缓冲区：后台写入失败时会把定位点放回
+        self._file_lock = threading.Lock()  # 追加写入、归档不能同时操作同一天的文件
+        os.makedirs(root, exist_ok=True)
+
+    def day_file(self, date):
+        """某天的轨迹文件路径"""
+        return os.path.join(self.root, f'{date.isoformat()}.csv')
+
+    def archive_file(self, date):
+        """某天的压缩归档路径"""
+        return os.path.join(self.root, f'{date.isoformat()}.dtk')
+
+    def archive_closed_days(self, today=None):
+        """把今天之前的CSV轨迹压缩为归档，返回归档的天数"""
+        today = today or datetime.date.today()
+        archived = 0
+        for date in self.days(end_date=today - datetime.timedelta(days=1)):
+            path = self.day_file(date)
+            # 读取、写归档、删除CSV期间不能有追加写入，否则新写的行会随CSV一起被删掉
+            with self._file_lock:
+                if not os.path.exists(path):
+                    continue
+                try:
+                    # 缓冲区里的点之后会写入新的CSV，下次再归档，这里不能重复写入
+                    fixes = list(self.iter_day(date, include_buffer=False))
+                    if fixes:
+                        write_track(self.archive_file(date), fixes)
+                    os.remove(path)
+                    archived += 1
+                except Exception as e:
+                    print(f"Failed to archive track {date}: {e}")
+        return archived
+
+    def append(self, lat, lon, speed, timestamp):
+        """记录一个定位点（批量写入）"""
+        with self._lock:
+            self._buffer.append(Fix(timestamp, lat, lon, speed))
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区写入对应日期的文件"""
+        self.write_batch(self.prepare_flush())
+
+    def prepare_flush(self):
+        """取出缓冲区并按日期分组，之后可在其他线程写入"""
+        with self._lock:
+            if not self._buffer:
+                return {}
+            buffer, self._buffer = self._buffer, []
+
+        fixes_by_day = {}
+        for fix in buffer:
+            fixes_by_day.setdefault(_day_of(fix.timestamp), []).append(fix)
+        return fixes_by_day
+
+    def write_batch(self, fixes_by_day):
+        """追加写入prepare_flush的结果；没写成功的日期放回缓冲区，下次再写"""
+        unwritten = []
+        with self._file_lock:
+            for date, fixes in fixes_by_day.items():
+                lines = [f"{fix.timestamp:.3f},{fix.lat:.7f},{fix.lon:.7f},{fix.speed:.2f}\n"
+                         for fix in fixes]
+                try:
+                    with open(self.day_file(date), 'a', encoding='utf-8') as f:
+                        f.writelines(lines)
+                except Exception as e:
+                    print(f"Failed to write track data: {e}")
+                    unwritten.extend(fixes)
+        if unwritten:
+            self.requeue(unwritten)
+        return not unwritten
+
+    def requeue(self, fixes):
+        """把没写入的定位点放回缓冲区前面（保持时间顺序）"""
+        with self._lock:
+            self._buffer[:0] = fixes
+
+    def days(self, start_date=None, end_date=None):
+        """有轨迹数据的日期列表（按时间顺序）"""
+        dates = set()
+        for name in os.listdir(self.root):
+            stem, ext = os.path.splitext(name)
+            if ext not in ('.csv', '.dtk'):
+                continue
+            try:
+                dates.add(datetime.date.fromisoformat(stem))
+            except ValueError:
+                continue
+        dates.update(_day_of(fix.timestamp) for fix in list(self._buffer))
+
+        return sorted(d for d in dates
+                      if (start_date is None or d >= start_date)
+                      and (end_date is None or d <= end_date))
+
+    def iter_day(self, date, include_buffer=True):
+        """逐个读取某天的定位点（include_buffer为False时不包括还没写入文件的点）"""
+        archive_path = self.archive_file(date)
+        if os.path.exists(archive_path):
+            try:
+                yield from TrackArchive(archive_path)
+            except Exception as e:
+                print(f"Failed to read track archive {date}: {e}")
+
+        path = self.day_file(date)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split(',')
+                    if len(parts) != 4:
+                        continue  # 跳过写了一半的行
+                    try:
+                        yield Fix(float(parts[0]), float(parts[1]), float(parts[2]), float(parts[3]))
+                    except ValueError:
+                        continue
+
+        if not include_buffer:
+            return
+        # 还没写入文件的点
+        for fix in list(self._buffer):
+            if _day_of(fix.timestamp) == date:
+                yield fix
+
+    def iter_range(self, start_ts=None, end_ts=None):
+        """逐个读取时间范围内的定位点"""
+        start_date = _day_of(start_ts) if start_ts is not None else None
+        end_date = _day_of(end_ts) if end_ts is not None else None
+        for date in self.days(start_date, end_date):
+            archive_path = self.archive_file(date)
+            if os.path.exists(archive_path) and not os.path.exists(self.day_file(date)):
+                # 归档按时间索引，只解码范围内的数据块
+                yield from TrackArchive(archive_path).iter_range(start_ts, end_ts)
+                continue
+            for fix in self.iter_day(date):
+                if start_ts is not None and fix.timestamp < start_ts:
+                    continue
+                if end_ts is not None and fix.timestamp > end_ts:
+                    continue
+                yield fix
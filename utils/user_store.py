@@ -0,0 +1,168 @@
+import json
+import os
+import tempfile
+import threading
+from collections.abc import MutableMapping
+
+# 分区定义: 分区名 -> (是否启动时加载, 属于该分区的键)
+# 未列出的键归入settings分区
+SECTIONS = {
+    'settings': (True, ['sleep_time', 'wake_time', 'speed_threshold',
+                        'running_threshold', 'stay_threshold', 'retention_days', 'personalization',
+                        'alarm_timeline', 'alarm_fingerprint', 'fix_pipeline', 'sync_url', 'tile_url']),
+    'places': (True, ['locations']),
+    'history': (False, ['activities']),
+}
+DEFAULT_SECTION = 'settings'
+
+
+class SectionedUserData(MutableMapping):
+    """按分区保存的用户数据，用法与原来的user_data字典相同
+
+    每个分区是 root 目录下独立的JSON文件，带自己的版本号。settings和places
+    启动时加载，history等分区在第一次访问时才读取；保存时只写有改动的分区。
+    """
+
+    def __init__(self, root='user_data', legacy_file='user_data.json'):
+        self.root = root
+        self.legacy_file = legacy_file
+        self._key_section = {}
+        for name, (_, keys) in SECTIONS.items():
+            for key in keys:
+                self._key_section[key] = name
+
+        self._data = {}      # 分区名 -> 数据字典（只包含已加载的分区）
+        self._versions = {}  # 分区名 -> 版本号
+        self._dirty = set()
+        self._write_lock = threading.Lock()  # 后台写线程和退出时的同步保存不能同时写文件
+
+    def exists(self):
+        """是否已有保存的数据（分区文件或旧版单文件）"""
+        return os.path.exists(self._section_file(DEFAULT_SECTION)) or os.path.exists(self.legacy_file)
+
+    def load(self):
+        """迁移旧版文件并加载需要立即使用的分区"""
+        if os.path.exists(self.legacy_file) and not os.path.exists(self._section_file(DEFAULT_SECTION)):
+            self._migrate_legacy()
+
+        for name, (eager, _) in SECTIONS.items():
+            if eager:
+                self._load_section(name)
+
+    def _migrate_legacy(self):
+        """把旧版user_data.json拆分为各分区文件"""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+
+        self.replace(legacy)
+        self.save()
+        os.replace(self.legacy_file, self.legacy_file + '.bak')
+        print(f"Migrated {self.legacy_file} to sectioned storage")
+
+    def _section_file(self, name):
+        return os.path.join(self.root, f'{name}.json')
+
+    def _section_of(self, key):
+        return self._key_section.get(key, DEFAULT_SECTION)
+
+    def _load_section(self, name):
+        """读取单个分区（已加载则直接返回）"""
+        if name in self._data:
+            return self._data[name]
+
+        data, version = {}, 0
+        path = self._section_file(name)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = json.load(f)
+                data = content.get('data', {})
+                version = content.get('version', 0)
+            except Exception as e:
+                print(f"Failed to load section {name}: {e}")
+
+        self._data[name] = data
+        self._versions[name] = version
+        return data
+
+    def __getitem__(self, key):
+        return self._load_section(self._section_of(key))[key]
+
+    def __setitem__(self, key, value):
+        name = self._section_of(key)
+        self._load_section(name)[key] = value
+        self._dirty.add(name)
+
+    def __delitem__(self, key):
+        name = self._section_of(key)
+        del self._load_section(name)[key]
+        self._dirty.add(name)
+
+    def __iter__(self):
+        # 遍历全部键会加载所有分区
+        for name in SECTIONS:
+            yield from list(self._load_section(name))
+        for name in list(self._data):
+            if name not in SECTIONS:
+                yield from list(self._data[name])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def mark_dirty(self, key):
+        """原地修改了嵌套数据（如列表append）后调用，标记所在分区需要保存"""
+        self._dirty.add(self._section_of(key))
+
+    def replace(self, data):
+        """用完整字典替换所有数据（用于恢复默认设置）"""
+        self._data = {name: {} for name in SECTIONS}
+        for name in SECTIONS:
+            self._versions.setdefault(name, 0)
+        for key, value in data.items():
+            self._data[self._section_of(key)][key] = value
+        self._dirty = set(self._data)
+
+    def save(self, section=None):
+        """保存分区：指定section时只保存该分区，否则保存所有改动过的分区"""
+        self.write_prepared(self.prepare_save(section))
+
+    def prepare_save(self, section=None):
+        """在主线程把要保存的分区序列化，返回 [(分区名, 文件路径, 内容)]，之后可在其他线程写入
+
+        分区在这里就清除改动标记，之后的修改会重新标记；写入失败时write_prepared会恢复标记。
+        """
+        names = [section] if section else sorted(self._dirty)
+        prepared = []
+        for name in names:
+            if name not in self._data:
+                continue
+            self._versions[name] = self._versions.get(name, 0) + 1
+            text = json.dumps({'version': self._versions[name], 'data': self._data[name]},
+                              indent=2, ensure_ascii=False)
+            prepared.append((name, self._section_file(name), text))
+            self._dirty.discard(name)
+        return prepared
+
+    def write_prepared(self, prepared):
+        """原子写入prepare_save的结果（可在其他线程调用），失败时分区重新标记为需要保存"""
+        with self._write_lock:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                for name, path, text in prepared:
+                    # 每次写入用独立的临时文件，避免与其他写入共用同名临时文件
+                    fd, tmp_path = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=self.root)
+                    try:
+                        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                            f.write(text)
+                        os.replace(tmp_path, path)
+                    except Exception:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        raise
+            except Exception:
+                self.restore_dirty(prepared)
+                raise
+
+    def restore_dirty(self, prepared):
+        """写入失败后，把这些分区重新标记为需要保存"""
+        self._dirty.update(name for name, _, _ in prepared)
@@ -0,0 +1,160 @@
+import contextlib
+import os
+import time
+
+from kivy.clock import Clock
+
+# 当前启用的监控实例（未启用时为None）
+active_watchdog = None
+
+
+def _callback_name(callback):
+    """回调函数的可读名称，lambda附带文件名和行号"""
+    func = getattr(callback, '__func__', callback)
+    owner = getattr(callback, '__self__', None)
+    name = getattr(func, '__qualname__', None) or repr(func)
+    if owner is not None and '.' not in name:
+        name = f"{type(owner).__name__}.{name}"
+    code = getattr(func, '__code__', None)
+    if code is not None and '<lambda>' in name:
+        name = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+
+@contextlib.contextmanager
+def measure(name):
+    """统计一段主线程代码的耗时（监控未启用时没有开销）"""
+    if active_watchdog is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active_watchdog.record(name, time.perf_counter() - start)
+
+
+class StallWatchdog:
+    """主循环卡顿监控
+
+    包装Clock调度的回调，超过预算（默认16ms）的回调按函数名统计；
+    同时记录帧间隔，应用退出时写出按耗时排序的报告。
+    """
+
+    def __init__(self, budget_ms=16, report_file='stall_report.txt'):
+        self.budget = budget_ms / 1000.0
+        self.report_file = report_file
+        self.stalls = {}  # 名称 -> [超时次数, 总耗时, 最大耗时]
+        self.frames = 0
+        self.slow_frames = 0
+        self.worst_frame = 0.0
+        self.started = None
+        self._originals = None
+        self._frame_event = None
+
+    @classmethod
+    def from_environment(cls):
+        """通过环境变量 DAILYTRACKER_WATCHDOG=<预算毫秒> 开启"""
+        value = os.environ.get('DAILYTRACKER_WATCHDOG')
+        if not value:
+            return None
+        try:
+            budget_ms = float(value)
+        except ValueError:
+            budget_ms = 16
+        if budget_ms <= 1:
+            budget_ms = 16  # DAILYTRACKER_WATCHDOG=1 表示使用默认预算
+        return cls(budget_ms=budget_ms)
+
+    def install(self):
+        """替换Clock的调度方法，开始监控"""
+        global active_watchdog
+        if self._originals is not None:
+            return
+
+        self._originals = {
+            'schedule_once': Clock.schedule_once,
+            'schedule_interval': Clock.schedule_interval,
+            'create_trigger': Clock.create_trigger,
+        }
+        Clock.schedule_once = lambda callback, timeout=0: \
+            self._originals['schedule_once'](self.wrap(callback), timeout)
+        Clock.schedule_interval = lambda callback, timeout: \
+            self._originals['schedule_interval'](self.wrap(callback), timeout)
+        Clock.create_trigger = lambda callback, timeout=0, *args, **kwargs: \
+            self._originals['create_trigger'](self.wrap(callback), timeout, *args, **kwargs)
+
+        self.started = time.perf_counter()
+        self._frame_event = self._originals['schedule_interval'](self._on_frame, 0)
+        active_watchdog = self
+        print(f"Stall watchdog enabled, budget {self.budget * 1000:.0f} ms")
+
+    def uninstall(self):
+        """恢复Clock原有方法"""
+        global active_watchdog
+        if self._originals is None:
+            return
+        for name, method in self._originals.items():
+            setattr(Clock, name, method)
+        self._originals = None
+        if self._frame_event is not None:
+            self._frame_event.cancel()
+        active_watchdog = None
+
+    def wrap(self, callback):
+        """包装回调，统计执行时间
+
+        注意：包装后 Clock.unschedule(原回调) 无法匹配，请使用返回的事件对象 cancel()。
+        """
+        name = _callback_name(callback)
+
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return callback(*args)
+            finally:
+                self.record(name, time.perf_counter() - start)
+
+        return timed
+
+    def record(self, name, elapsed):
+        """记录一次耗时，超过预算才计入卡顿"""
+        if elapsed < self.budget:
+            return
+        entry = self.stalls.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+    def _on_frame(self, dt):
+        """每帧调用，dt为帧间隔"""
+        self.frames += 1
+        if dt > self.budget:
+            self.slow_frames += 1
+            self.worst_frame = max(self.worst_frame, dt)
+
+    def report(self):
+        """生成按总耗时排序的报告文本"""
+        runtime = time.perf_counter() - self.started if self.started else 0
+        lines = [
+            f"Stall report (budget {self.budget * 1000:.0f} ms, runtime {runtime:.1f} s)",
+            f"Frames: {self.frames}, slow frames: {self.slow_frames}, "
+            f"worst frame: {self.worst_frame * 1000:.1f} ms",
+            "",
+            f"{'total ms':>10} {'count':>6} {'max ms':>8}  callback",
+        ]
+        ranked = sorted(self.stalls.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (count, total, worst) in ranked:
+            lines.append(f"{total * 1000:10.1f} {count:6d} {worst * 1000:8.1f}  {name}")
+        if not ranked:
+            lines.append("(no callbacks over budget)")
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self):
+        """写出报告文件"""
+        try:
+            with open(self.report_file, 'w', encoding='utf-8') as f:
+                f.write(self.report())
+            print(f"Stall report written to {self.report_file}")
+        except Exception as e:
+            print(f"Failed to write stall report: {e}")